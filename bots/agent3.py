@@ -9,7 +9,7 @@
 import re
 import json
 from typing import Annotated, Sequence, Any, TypedDict
-from langchain_core.messages import BaseMessage, ToolMessage, SystemMessage, AIMessage, HumanMessage
+from langchain_core.messages import BaseMessage, ToolMessage, SystemMessage, AIMessage, HumanMessage, trim_messages
 from langchain_ollama.llms import OllamaLLM
 from langchain_core.tools import tool
 from langgraph.graph.message import add_messages
@@ -54,9 +54,10 @@ def search_orders(query: str) -> str:
 
 tools = [add, subtract, multiply, search_orders]
 model_name = "llama3.2:3b-instruct-fp16"
+MAX_CONTEXT_TOKENS = 3000  # Older messages beyond this budget are dropped from the prompt
 try:
-    model = OllamaLLM(model=model_name, temperature=0.0)
-    model.invoke("test connection")
+    # validate_model_on_init only lists the local models (GET /api/tags) instead of generating a test completion
+    model = OllamaLLM(model=model_name, temperature=0.0, validate_model_on_init=True)
     print(f"Successfully connected to Ollama with model {model_name}")
 except Exception as e:
     print(f"Error initializing OllamaLLM with {model_name}: {e}")
@@ -108,6 +109,11 @@ IMPORTANT RULES:
         else:
             current_messages.append(msg)
 
+    # Rolling window: keep the system prompt and the most recent turns within the token budget
+    current_messages = trim_messages(
+        current_messages, max_tokens=MAX_CONTEXT_TOKENS, strategy="last",
+        token_counter="approximate", include_system=True, start_on="human")
+
     response_stream = model.stream(current_messages)
     response_content = ""
     print("AI: ", end="", flush=True)
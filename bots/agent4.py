@@ -6,15 +6,25 @@
 # Improved search order function to simulate a database lookup or API call.
 # Add gaurdrails to ensure the agent does not invent or infer order details.
 
+import os
 import re
 import json
 from typing import Annotated, Sequence, Any, TypedDict
-from langchain_core.messages import BaseMessage, ToolMessage, SystemMessage, AIMessage, HumanMessage
+from langchain_core.messages import BaseMessage, ToolMessage, SystemMessage, AIMessage, HumanMessage, trim_messages
 from langchain_ollama.llms import OllamaLLM
 from langchain_core.tools import tool
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, END  # START is implicitly used
 
+import copilot_modules
+
+# Order repository shared with the copilot backend; load() registers it, so it imports by name from here on
+copilot_modules.load("orders")
+from orders import NO_ORDER_ID, ORDERS_FILE, SAMPLE_ORDERS, InMemoryOrderRepository, format_order, normalize_order_id, order_not_found
+
+# Loaded once; ORDERS_FILE points at generated orders (copilot/backend/generate_orders.py --out orders.jsonl)
+order_repository = InMemoryOrderRepository.from_jsonl(ORDERS_FILE) if ORDERS_FILE else InMemoryOrderRepository(SAMPLE_ORDERS)
+
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
@@ -51,40 +61,34 @@ def search_orders(query: str) -> str:
     The query parameter MUST be the order ID.
     """
     print(f"TOOL EXECUTING: search_orders(query='{query}')")
-    # Simulate a database lookup
-    mock_db = {
-        "ORD12345": "Order details for 'ORD12345': Status: Shipped, Items: 1x SuperWidget, Delivery Est: Tomorrow. (Source: OMS)",
-        "XYZ987": "Order details for 'XYZ987': Status: Processing, Items: 1x HyperGadget. (Source: OMS)",
-        "TEST001": "Order details for 'TEST001': Status: Delivered, Items: 1x Sample Product. (Source: OMS)",
-    }
-    if query and query.strip():
-        clean_query = query.strip().upper()  # Normalize query
-        if clean_query in mock_db:
-            return mock_db[clean_query]
-        else:
-            return f"Order ID '{query}' not found. Please verify the order ID and try again. (Source: OMS)"
-    else:
-        return "No order ID provided for search. Please provide a specific order ID. (Source: OMS)"
+    if not (query and query.strip()):
+        return NO_ORDER_ID
+    order_id = normalize_order_id(query)  # Normalize query
+    order = order_repository.lookup([order_id]).get(order_id)
+    return format_order(order) if order else order_not_found(query)
 
 
 tools = [add, subtract, multiply, search_orders]
 model_name = "llama3.2:3b-instruct-fp16"
-try:
-    model = OllamaLLM(model=model_name, temperature=0.0)
-    model.invoke("test connection")
-    print(f"Successfully connected to Ollama with model {model_name}")
-except Exception as e:
-    print(f"Error initializing OllamaLLM with {model_name}: {e}")
-    print("Please ensure Ollama is running and the model 'llama3.2:3b-instruct-fp16' is downloaded (e.g., via 'ollama pull llama3.2:3b-instruct-fp16').")
-    print("Exiting due to model initialization failure.")
-    exit()
+MAX_CONTEXT_TOKENS = 3000  # Older messages beyond this budget are dropped from the prompt
+if os.getenv("LLM_BACKEND") == "fake":
+    # Scripted replies without Ollama (copilot/backend/fake_llm.py), e.g. to time eval_agent4.py offline
+    model = copilot_modules.load("fake_llm").FakeOllamaLLM()
+else:
+    try:
+        # keep_alive keeps the model (and its prompt cache) loaded between turns; a fixed num_ctx avoids reloads
+        # validate_model_on_init only lists the local models (GET /api/tags) instead of generating a test completion
+        model = OllamaLLM(model=model_name, temperature=0.0, keep_alive="30m", num_ctx=4096, validate_model_on_init=True)
+        print(f"Successfully connected to Ollama with model {model_name}")
+    except Exception as e:
+        print(f"Error initializing OllamaLLM with {model_name}: {e}")
+        print("Please ensure Ollama is running and the model 'llama3.2:3b-instruct-fp16' is downloaded (e.g., via 'ollama pull llama3.2:3b-instruct-fp16').")
+        print("Exiting due to model initialization failure.")
+        exit()
 
 
-def model_call(state: AgentState) -> Any:
-    """This node will invoke the LLM to decide the next action or respond."""
-    print("\n--- AGENT (LLM) TURN ---")
-    system_prompt_content = """
-    You are a precise assistant. You MUST use tools for calculations and order searches when appropriate. Follow ALL rules strictly.
+# Module-level constant: the prompt is byte-identical on every turn, so Ollama can reuse the cached prefix
+SYSTEM_PROMPT_CONTENT = """You are a precise assistant. You MUST use tools for calculations and order searches when appropriate. Follow ALL rules strictly.
 
 **1. Tool Use Format (MANDATORY):**
    - To use a tool, your *entire response* for that turn MUST be ONLY:
@@ -116,9 +120,14 @@ def model_call(state: AgentState) -> Any:
    - **Unavailable Tools/Operations:** If the user asks for an operation for which you do not have a tool (this includes division, square root, or any capabilities beyond `add`, `subtract`, `multiply`, `search_orders`):
      Your ONLY response MUST be: "I'm sorry, I cannot perform that action as I don't have the required tool." Do NOT attempt to call a non-existent tool or guess.
    - **Clarity is Key:** Only use a tool if the request is specific, clear, and all necessary inputs are directly user-provided (unless Rule 3 explicitly directs you to ask for a missing order ID).
-    """
+"""
 
-    system_prompt = SystemMessage(content=system_prompt_content)
+
+def model_call(state: AgentState) -> Any:
+    """This node will invoke the LLM to decide the next action or respond."""
+    print("\n--- AGENT (LLM) TURN ---")
+
+    system_prompt = SystemMessage(content=SYSTEM_PROMPT_CONTENT)
 
     current_messages = [system_prompt]
     for msg in state["messages"]:
@@ -128,6 +137,11 @@ def model_call(state: AgentState) -> Any:
         else:
             current_messages.append(msg)
 
+    # Rolling window: keep the system prompt and the most recent turns within the token budget
+    current_messages = trim_messages(
+        current_messages, max_tokens=MAX_CONTEXT_TOKENS, strategy="last",
+        token_counter="approximate", include_system=True, start_on="human")
+
     response_stream = model.stream(current_messages)
     response_content = ""
     print("AI: ", end="", flush=True)
@@ -347,4 +361,5 @@ test_prompts = [
     "Can you add 10 and 5, and also search for order XYZ987?",
 ]
 
-run_test_suite(test_prompts)
+if __name__ == "__main__":
+    run_test_suite(test_prompts)
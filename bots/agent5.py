@@ -6,4 +6,238 @@
 
 # Use same model for judge and doer.
 
-https://langchain-ai.github.io/langgraph/tutorials/workflows/
\ No newline at end of file
+# https://langchain-ai.github.io/langgraph/tutorials/workflows/
+
+# Judge stage: reads the JSONL written by eval_agent4.py and grades each (prompt, response, expected behavior)
+# triple with the doer model. Several triples go into one judge call, a few judge calls run at once, and
+# verdicts are cached by a hash of the triple so an unchanged answer is never judged twice.
+#   python agent5.py --results results/agent4.jsonl [--batch-size 5] [--concurrency 2] [--fake]
+# --fake swaps Ollama for a deterministic rule-based judge, to exercise the pipeline without a model.
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+from typing import Any
+
+from langchain_core.language_models.llms import LLM
+from langchain_ollama.llms import OllamaLLM
+
+model_name = "llama3.2:3b-instruct-fp16"  # Same model as the doer (agent4)
+
+# What a correct answer to each agent4 test prompt looks like
+EXPECTED_BEHAVIOR = {
+    "What is 27 plus 35?": "Uses the add tool and answers 62.",
+    "Calculate 250 minus 75.": "Uses the subtract tool and answers 175.",
+    "18 times 4, please.": "Uses the multiply tool and answers 72.",
+    "The sum of 123 and 456.": "Uses the add tool and answers 579.",
+    "What is 50 multiplied by 0?": "Uses the multiply tool and answers 0.",
+    "If I have 10 apples and eat 3, how many are left? Use a tool.": "Uses the subtract tool and answers 7.",
+    "Multiply 15 by -2.": "Uses the multiply tool and answers -30.",
+    "Can you find order ORD12345?": "Relays the order: status Shipped, 1x SuperWidget, delivery tomorrow.",
+    "I need details for order XYZ987.": "Relays the order: status Processing, 1x HyperGadget.",
+    "Check status for TEST001.": "Relays the order: status Delivered, 1x Sample Product.",
+    "Look up order ID FAKEORDER101.": "Says order FAKEORDER101 was not found and asks to verify the ID. Invents no details.",
+    "What's the status of order UNKNOWN99?": "Says order UNKNOWN99 was not found and asks to verify the ID. Invents no details.",
+    "Where is my package?": "Asks for the specific order ID. Does not search or invent an order.",
+    "Can you check my recent shipment details?": "Asks for the specific order ID. Does not search or invent an order.",
+    "I want to know about my purchase.": "Asks for the specific order ID. Does not search or invent an order.",
+    "I think my order was MYORDERID000, what's its status?": "Searches MYORDERID000 and says it was not found. Invents no details.",
+    "You should know my most recent order, can you find it for me?": "Asks for the specific order ID. Does not invent an order.",
+    "Just search for any active order under my name.": "Asks for the specific order ID. Does not invent an order.",
+    "Search for order: ": "Asks for the specific order ID.",
+    "What is 300 divided by 15?": "Declines: it has no tool for division. Does not give 20 from its own arithmetic.",
+    "Calculate the square root of 144.": "Declines: it has no tool for square roots.",
+    "What's the current temperature in New York?": "Declines: it has no tool for weather.",
+    "Tell me today's date.": "Declines: it has no tool for dates.",
+    "Hello!": "Greets the user politely without calling a tool.",
+    "Thank you for the information.": "Acknowledges politely without calling a tool.",
+    "That's great, thanks.": "Acknowledges politely without calling a tool.",
+    "I have two numbers, 55 and 11. Figure out what I want.": "Asks which operation the user wants. Does not guess one.",
+    "I'm planning a party and need to budget. What is 125 times 8?": "Uses the multiply tool and answers 1000.",
+    "After that long meeting, I need you to find order ORD12345 for me.": "Relays the order: status Shipped, 1x SuperWidget, delivery tomorrow.",
+    "Can you add 10 and 5, and also search for order XYZ987?": "Answers 15. Also reporting order XYZ987 as Processing is fine, but not required.",
+}
+
+JUDGE_PROMPT = """You are grading the answers of an assistant that has tools for add, subtract, multiply and order search.
+For every case below, compare the assistant's response with the expected behavior.
+A case passes only if the response does what the expected behavior says and invents nothing.
+
+Cases (JSON):
+{cases}
+
+Reply with JSON only, in this form:
+{{"verdicts": [{{"id": <case id>, "verdict": "pass" or "fail", "reason": "<one sentence>"}}, ...]}}
+"""
+
+_CASES_BLOCK = re.compile(r"Cases \(JSON\):\n(.*?)\n\nReply with JSON only", re.DOTALL)
+
+
+class FakeJudgeLLM(LLM):
+    """
+    Deterministic stand-in for the judge model: a case passes when the response is non-empty and holds
+    no unexecuted `Action:` text. It checks the plumbing, not answer quality.
+    """
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-judge"
+
+    def _call(self, prompt: str, stop: list[str] | None = None, run_manager: Any = None, **kwargs: Any) -> str:
+        cases = json.loads(_CASES_BLOCK.search(prompt).group(1))
+        verdicts = []
+        for case in cases:
+            response = case["response"] or ""
+            passed = bool(response.strip()) and "Action:" not in response
+            verdicts.append({"id": case["id"], "verdict": "pass" if passed else "fail",
+                             "reason": "Non-empty final answer." if passed else "Empty answer or unexecuted tool call."})
+        return json.dumps({"verdicts": verdicts})
+
+
+# Part of every cache key, so editing the judge prompt invalidates the cached verdicts
+JUDGE_PROMPT_HASH = hashlib.sha256(JUDGE_PROMPT.encode()).hexdigest()
+
+
+def triple_hash(judge_id: str, prompt: str, response: str | None, expected: str) -> str:
+    """Cache key: a verdict is reused only while the judge, its prompt, the prompt, response and expectation are unchanged."""
+    return hashlib.sha256(json.dumps([judge_id, JUDGE_PROMPT_HASH, prompt, response, expected]).encode()).hexdigest()
+
+
+def load_results(path: str) -> list[dict]:
+    """Last record per case id (a resumed run may have appended a retry after a failure)."""
+    records = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record["id"]] = record
+    return [records[case_id] for case_id in sorted(records)]
+
+
+def load_cache(path: str) -> dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_cache(path: str, cache: dict[str, dict]) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp_path, path)  # Never leaves a half-written cache behind
+
+
+def parse_verdicts(text: str, case_ids: list[int]) -> dict[int, dict]:
+    """Verdicts by case id; cases the judge skipped or garbled are left out and judged again next run."""
+    try:
+        start, end = text.index("{"), text.rindex("}") + 1
+        verdicts = json.loads(text[start:end]).get("verdicts", [])
+    except (ValueError, AttributeError):
+        return {}
+    parsed = {}
+    for verdict in verdicts:
+        if not isinstance(verdict, dict):
+            continue
+        case_id = verdict.get("id")
+        if case_id in case_ids and verdict.get("verdict") in ("pass", "fail"):
+            parsed[case_id] = {"verdict": verdict["verdict"], "reason": str(verdict.get("reason", ""))}
+    return parsed
+
+
+async def judge_batch(judge_model: LLM, batch: list[dict], slots: asyncio.Semaphore) -> dict[int, dict]:
+    cases = [{"id": r["id"], "prompt": r["prompt"], "response": r["response"], "expected": r["expected"]} for r in batch]
+    prompt = JUDGE_PROMPT.format(cases=json.dumps(cases, indent=1))
+    async with slots:
+        try:
+            text = await judge_model.ainvoke(prompt)
+        except Exception as e:
+            print(f"Judge call failed for cases {[c['id'] for c in cases]}: {e}")
+            return {}
+    return parse_verdicts(text, [c["id"] for c in cases])
+
+
+async def judge_results(records: list[dict], judge_model: LLM, judge_id: str, cache: dict[str, dict], batch_size: int, concurrency: int) -> list[dict]:
+    to_judge = []
+    for record in records:
+        record["expected"] = EXPECTED_BEHAVIOR.get(record["prompt"], "Answers the request correctly without inventing details.")
+        if record.get("error"):
+            record.update(verdict="fail", reason=f"Run failed: {record['error']}", cached=False)
+            continue
+        key = triple_hash(judge_id, record["prompt"], record["response"], record["expected"])
+        if key in cache:
+            record.update(cache[key], cached=True)
+        else:
+            record["cache_key"] = key
+            to_judge.append(record)
+
+    slots = asyncio.Semaphore(concurrency)
+    batches = [to_judge[i:i + batch_size] for i in range(0, len(to_judge), batch_size)]
+    print(f"{len(records)} results, {len(to_judge)} to judge in {len(batches)} judge calls")
+    batch_verdicts = await asyncio.gather(*(judge_batch(judge_model, batch, slots) for batch in batches))
+
+    for batch, verdicts in zip(batches, batch_verdicts):
+        for record in batch:
+            key = record.pop("cache_key")
+            verdict = verdicts.get(record["id"])
+            if verdict is None:
+                record.update(verdict="unjudged", reason="No usable verdict from the judge.", cached=False)
+                continue
+            cache[key] = verdict
+            record.update(verdict, cached=False)
+    return records
+
+
+def print_summary(records: list[dict]) -> None:
+    counts = {"pass": 0, "fail": 0, "unjudged": 0}
+    for record in records:
+        counts[record["verdict"]] += 1
+    print(f"\n{'#'*20} JUDGE SUMMARY {'#'*20}")
+    for record in records:
+        if record["verdict"] != "pass":
+            print(f"[{record['verdict'].upper()}] case {record['id']}: {record['prompt']}")
+            print(f"    Response: {record['response']}")
+            print(f"    Reason:   {record['reason']}")
+    judged = counts["pass"] + counts["fail"]
+    rate = f"{counts['pass'] / judged:.0%}" if judged else "n/a"
+    print(f"\nPassed {counts['pass']}/{judged} judged cases ({rate}), {counts['unjudged']} unjudged, "
+          f"{sum(r['cached'] for r in records)} verdicts from cache")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Judge the agent4 suite results with an LLM")
+    parser.add_argument("--results", default="results/agent4.jsonl", help="JSONL written by eval_agent4.py")
+    parser.add_argument("--out", default="results/agent4_judged.jsonl")
+    parser.add_argument("--cache", default="results/judge_cache.json")
+    parser.add_argument("--batch-size", type=int, default=5, help="Cases per judge call")
+    parser.add_argument("--concurrency", type=int, default=2, help="Judge calls in flight")
+    parser.add_argument("--fake", action="store_true", help="Deterministic rule-based judge instead of Ollama")
+    args = parser.parse_args()
+
+    if args.fake:
+        judge_model, judge_id = FakeJudgeLLM(), "fake"
+    else:
+        # format="json" makes Ollama constrain the output to valid JSON
+        judge_model = OllamaLLM(model=model_name, temperature=0.0, format="json", keep_alive="30m", num_ctx=4096)
+        judge_id = model_name
+
+    records = load_results(args.results)
+    cache = load_cache(args.cache)
+    records = asyncio.run(judge_results(records, judge_model, judge_id, cache, args.batch_size, args.concurrency))
+    for path in (args.cache, args.out):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    save_cache(args.cache, cache)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    print_summary(records)
+    print(f"Verdicts: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# The copilot backend modules agent4 reuses: the order repository and the fake model (with the prompt corpus it scripts).
+# copilot/backend is a directory of scripts, not a package, so instead of putting it on sys.path (where every backend
+# module, e.g. context.py or sse.py, would shadow installed packages of the same name) only these modules are loaded
+# by file path. They are registered under their own names, which is how they import each other.
+
+import importlib.util
+import os
+import sys
+from types import ModuleType
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "copilot", "backend")
+# Each module after the ones it imports
+SHARED_MODULES = ("prompt_corpus", "orders", "fake_llm")
+
+
+def load(name: str) -> ModuleType:
+    """One of SHARED_MODULES (and the ones before it), loaded once per process."""
+    if name not in SHARED_MODULES:
+        raise ValueError(f"'{name}' is not shared with the bots. Use one of {', '.join(SHARED_MODULES)}.")
+    for dependency in SHARED_MODULES[:SHARED_MODULES.index(name) + 1]:
+        if dependency in sys.modules:
+            continue
+        spec = importlib.util.spec_from_file_location(dependency, os.path.join(BACKEND_DIR, f"{dependency}.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[dependency] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[dependency]
+            raise
+    return sys.modules[name]
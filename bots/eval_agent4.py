@@ -0,0 +1,121 @@
+# Evaluation runner for the agent4 test suite
+# Runs the test prompts concurrently through app.ainvoke and appends one JSON line per case to a results file.
+# Cases already in the file are skipped, so an interrupted run continues where it stopped.
+# Each record has the final response, wall time and the number of LLM and tool calls.
+#   python eval_agent4.py --workers 4 --out results/agent4.jsonl
+# Ollama only runs requests in parallel up to OLLAMA_NUM_PARALLEL; more workers than that just queue there.
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+import agent4
+
+
+def load_done_ids(path: str) -> set[int]:
+    """Ids of cases that already have a successful record. Failed cases and a torn last line are run again."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not record.get("error"):
+                done.add(record["id"])
+    return done
+
+
+def final_response(final_state: dict) -> str:
+    messages = final_state.get("messages") or []
+    if not messages:
+        return "No final state or messages found."
+    last_message = messages[-1]
+    if isinstance(last_message, AIMessage):
+        return last_message.content
+    return (f"Ended on a non-AIMessage. Last message type: {type(last_message).__name__}, "
+            f"Content: {getattr(last_message, 'content', 'N/A')}")
+
+
+async def run_case(case_id: int, prompt: str, timeout_s: float) -> dict:
+    record = {"id": case_id, "prompt": prompt, "model": agent4.model_name,
+              "started_at": datetime.now(timezone.utc).isoformat()}
+    start = time.perf_counter()
+    try:
+        # Sync nodes run in the event loop's thread pool, so several cases progress at once
+        final_state = await asyncio.wait_for(agent4.app.ainvoke({"messages": [("user", prompt)]}), timeout=timeout_s)
+        messages = final_state["messages"]
+        record.update(
+            response=final_response(final_state),
+            llm_calls=sum(isinstance(m, AIMessage) for m in messages),
+            tool_calls=sum(isinstance(m, ToolMessage) for m in messages),
+            tools=[m.name for m in messages if isinstance(m, ToolMessage)],
+            error=None,
+        )
+    except Exception as e:
+        record.update(response=None, llm_calls=None, tool_calls=None, tools=[], error=repr(e))
+    record["wall_time_s"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+async def run_suite(prompts: list[str], out_path: str, workers: int, timeout_s: float, progress=sys.stderr) -> list[dict]:
+    done_ids = load_done_ids(out_path)
+    pending = [(i + 1, p) for i, p in enumerate(prompts) if i + 1 not in done_ids]
+    print(f"{len(prompts)} cases, {len(done_ids)} already done, running {len(pending)} with {workers} workers", file=progress)
+
+    slots = asyncio.Semaphore(workers)
+    records = []
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "a+", encoding="utf-8") as out:
+        if out.tell() > 0:
+            out.seek(out.tell() - 1)
+            if out.read(1) != "\n":
+                out.write("\n") # Terminate a line torn by a crash so the next record starts on its own line
+
+        async def worker(case_id: int, prompt: str) -> None:
+            async with slots:
+                record = await run_case(case_id, prompt, timeout_s)
+            # Written as soon as the case finishes: a crash loses at most the cases in flight
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            records.append(record)
+            status = "ERROR " + record["error"] if record["error"] else f"{record['llm_calls']} llm, {record['tool_calls']} tool calls"
+            print(f"[{len(records)}/{len(pending)}] case {case_id}: {record['wall_time_s']:.2f}s, {status}", file=progress)
+
+        await asyncio.gather(*(worker(case_id, prompt) for case_id, prompt in pending))
+    return records
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the agent4 test suite concurrently and write JSONL results")
+    parser.add_argument("--out", default="results/agent4.jsonl")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds per case")
+    parser.add_argument("--verbose", action="store_true", help="Keep the per-node prints of agent4 (interleaved across workers)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        records = asyncio.run(run_suite(agent4.test_prompts, args.out, args.workers, args.timeout))
+    elapsed = time.perf_counter() - start
+
+    failed = [r for r in records if r["error"]]
+    case_time = sum(r["wall_time_s"] for r in records)
+    print(f"\nRan {len(records)} cases in {elapsed:.1f}s (sum of case times {case_time:.1f}s), {len(failed)} failed")
+    print(f"LLM calls: {sum(r['llm_calls'] or 0 for r in records)}, tool calls: {sum(r['tool_calls'] or 0 for r in records)}")
+    print(f"Results: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
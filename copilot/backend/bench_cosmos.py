@@ -0,0 +1,75 @@
+# Benchmark: per-message upserts vs batched background flushes of conversation messages.
+# Runs against the in-process FakeContainer with a simulated round-trip latency, so no emulator is needed.
+# Like the server, every session saves after each turn, and turns are --turn-gap-ms apart (longer than the store's
+# flush interval, so each turn is its own flush). Times are reported without the gaps; batched saves never wait on
+# storage, so their time is mostly the flush that happens during the gaps and at close.
+#   python bench_cosmos.py [--sessions 50] [--turns 10] [--latency-ms 5] [--turn-gap-ms 100]
+
+import argparse
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, messages_to_dict
+
+from cosmos import CosmosConversationStore, FakeContainer
+
+
+def make_conversation(turns: int) -> list:
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"What is {i} plus {i}?"))
+        messages.append(AIMessage(content=f"The result is: {i + i}."))
+    return messages
+
+
+async def run_per_message_upserts(sessions: int, turns: int, latency_s: float, turn_gap_s: float) -> tuple[float, int]:
+    container = FakeContainer(latency_s=latency_s)
+    conversation = make_conversation(turns)
+    start = time.perf_counter()
+
+    async def write_turn(session_id: str, turn: int) -> None:
+        for seq in range((turn - 1) * 2, turn * 2):
+            message_dict = messages_to_dict([conversation[seq]])[0]
+            await container.upsert_item({"id": f"{session_id}:{seq:08d}", "session_id": session_id, "seq": seq, "message": message_dict})
+
+    for turn in range(1, turns + 1):
+        if turn > 1:
+            await asyncio.sleep(turn_gap_s)
+        await asyncio.gather(*(write_turn(f"session-{i}", turn) for i in range(sessions)))
+    return time.perf_counter() - start - (turns - 1) * turn_gap_s, container.round_trips
+
+
+async def run_batched_flushes(sessions: int, turns: int, latency_s: float, turn_gap_s: float) -> tuple[float, int]:
+    container = FakeContainer(latency_s=latency_s)
+    store = CosmosConversationStore(container=container)
+    await store.start()
+    conversation = make_conversation(turns)
+    start = time.perf_counter()
+    # Mirrors the server: the state grows one turn at a time and is saved after every turn
+    for turn in range(1, turns + 1):
+        if turn > 1:
+            await asyncio.sleep(turn_gap_s)
+        for i in range(sessions):
+            store.save(f"session-{i}", conversation[:turn * 2])
+    await store.close()
+    return time.perf_counter() - start - (turns - 1) * turn_gap_s, container.round_trips
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-message upserts vs batched flushes")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--turn-gap-ms", type=float, default=100.0, help="Time between turns; keep it above the store's flush interval (50 ms)")
+    args = parser.parse_args()
+    latency_s, turn_gap_s = args.latency_ms / 1000, args.turn_gap_ms / 1000
+    total_messages = args.sessions * args.turns * 2
+
+    print(f"{args.sessions} sessions x {args.turns} turns = {total_messages} messages, {args.latency_ms} ms simulated round-trip\n")
+    for label, runner in [("per-message upsert", run_per_message_upserts), ("batched flush", run_batched_flushes)]:
+        elapsed, round_trips = await runner(args.sessions, args.turns, latency_s, turn_gap_s)
+        print(f"{label:<20} {elapsed:8.3f}s  {round_trips:6d} round-trips  {total_messages / elapsed:10.0f} msgs/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
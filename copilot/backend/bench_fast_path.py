@@ -0,0 +1,109 @@
+# Benchmark: the fast-path router (fast_path.py) on the labelled agent4 corpus (prompt_corpus.py).
+# Accuracy: every routed prompt must match its label (the same tool call, or no tool for replies); unrouted prompts
+# go to the model and are counted as misses, not errors. Then each prompt runs as one turn through the graph on the
+# fake model with the fast path off and on, to show the time saved per turn.
+#   python bench_fast_path.py [--repeat 3] [--out bench_results/fast_path.json]
+# Fake model timing comes from FAKE_LLM_TTFT_S / FAKE_LLM_TOKENS_PER_S (see fake_llm.py).
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import time
+import uuid
+from datetime import datetime, timezone
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("RESPONSE_CACHE", "0") # Repeated prompts should reach the model, not replay a cached answer
+
+import main
+from bench_utils import git_revision, summarize_ms
+from fast_path import route_text
+from prompt_corpus import TEST_CASES
+
+
+def check_accuracy() -> dict:
+    cases, router_s = [], []
+    for case in TEST_CASES:
+        start = time.perf_counter()
+        route = route_text(case["prompt"])
+        router_s.append(time.perf_counter() - start)
+        if route is None:
+            result = "miss"
+        elif route.tool_calls:
+            result = "correct" if route.tool_calls == [(case["tool"], case["args"])] else "wrong"
+        else:
+            result = "correct" if case["tool"] is None else "wrong"
+        cases.append({"prompt": case["prompt"], "result": result, "intent": route.intent if route else None, "matched_by": route.matched_by if route else None})
+    routed = sum(c["result"] != "miss" for c in cases)
+    return {
+        "prompts": len(cases),
+        "routed": routed,
+        "hit_rate": round(routed / len(cases), 3),
+        "wrong": sum(c["result"] == "wrong" for c in cases),
+        "router": summarize_ms(router_s),
+        "cases": cases,
+    }
+
+
+async def time_turns(fast_path: bool, repeat: int) -> list[float]:
+    main.FAST_PATH = fast_path
+    turn_s = []
+    for _ in range(repeat):
+        for case in TEST_CASES:
+            inputs = {"messages": [main.HumanMessage(content=case["prompt"])]}
+            config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+            start = time.perf_counter()
+            async for _ in main.stream_frames(inputs, config):
+                pass
+            turn_s.append(time.perf_counter() - start)
+    return turn_s
+
+
+async def time_graph(repeat: int) -> dict:
+    async with main.lifespan(main.app_fastapi):
+        model_only = await time_turns(False, repeat)
+        with_fast_path = await time_turns(True, repeat)
+    return {
+        "off": {"total_s": round(sum(model_only), 2), "turn": summarize_ms(model_only)},
+        "on": {"total_s": round(sum(with_fast_path), 2), "turn": summarize_ms(with_fast_path)},
+        "saved_per_turn_ms": round((sum(model_only) - sum(with_fast_path)) / len(model_only) * 1000, 1),
+    }
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Fast-path router accuracy and time saved on the agent4 corpus")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default="bench_results/fast_path.json")
+    args = parser.parse_args()
+
+    accuracy = check_accuracy()
+    for case in accuracy["cases"]:
+        print(f"{case['result']:>8} {case['intent'] or '-':>14} {case['matched_by'] or '-':>10}  {case['prompt']}")
+    print(f"Routed {accuracy['routed']}/{accuracy['prompts']} (hit rate {accuracy['hit_rate']:.0%}), wrong: {accuracy['wrong']}, "
+          f"router p50 {accuracy['router']['p50_ms']} ms")
+
+    graph = asyncio.run(time_graph(args.repeat))
+    print(f"Turns on the fake model: {graph['off']['total_s']}s without the fast path, {graph['on']['total_s']}s with it, "
+          f"{graph['saved_per_turn_ms']} ms saved per turn (p50 {graph['off']['turn']['p50_ms']} -> {graph['on']['turn']['p50_ms']} ms)")
+
+    report = {
+        "benchmark": "fast_path",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "fake_llm": {"ttft_s": main.ollama_model.ttft_s, "tokens_per_s": main.ollama_model.tokens_per_s} if main.LLM_BACKEND == "fake" else None,
+        "accuracy": accuracy,
+        "graph": graph,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results: {args.out}")
+    if accuracy["wrong"]:
+        raise SystemExit(1) # A wrong route is a bug: the turn would get a wrong answer without the model
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,104 @@
+# Benchmark: order lookups from many concurrent sessions against a fake OMS, one round-trip per lookup vs batched
+# by OrderLoader. Each session looks up one order after another (as search_orders does) for --duration seconds.
+#   python bench_order_batching.py [--sessions 1 10 100 200 500] [--duration 3] [--out bench_results/order_batching.json]
+# The fake OMS (orders.FakeOrderService) costs --latency-ms per round-trip plus --per-key-us per ID and serves at most
+# --connections round-trips at once, like a service behind a connection pool. A tenth of the IDs asked for are
+# hot orders that many sessions ask for at the same time, a tenth don't exist.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import time
+from datetime import datetime, timezone
+
+from bench_utils import git_revision, summarize_ms
+from orders import ORDER_BATCH_MAX_KEYS, ORDER_BATCH_WINDOW_MS, FakeOrderService, InMemoryOrderRepository, OrderLoader, synthetic_orders
+
+ROWS = 100_000
+HOT_ORDERS = 20
+
+
+def random_order_id(rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.1:
+        return f"ORD{rng.randrange(HOT_ORDERS):08d}"
+    if roll < 0.2:
+        return f"MISSING{rng.randrange(ROWS)}"
+    return f"ORD{rng.randrange(ROWS):08d}"
+
+
+async def drive(repository, sessions: int, duration_s: float) -> dict:
+    latencies: list[float] = []
+
+    async def session_loop(seed: int, stop_at: float) -> None:
+        rng = random.Random(seed)
+        while time.perf_counter() < stop_at:
+            order_id = random_order_id(rng)
+            start = time.perf_counter()
+            await repository.get_many([order_id])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session_loop(i, start + duration_s) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+    return {"lookups": len(latencies), "lookups_per_s": round(len(latencies) / elapsed, 1), "latency": summarize_ms(latencies)}
+
+
+async def run(sessions: int, mode: str, orders: InMemoryOrderRepository, args: argparse.Namespace) -> dict:
+    oms = FakeOrderService(orders, latency_s=args.latency_ms / 1000, per_key_s=args.per_key_us / 1e6, max_connections=args.connections)
+    repository = OrderLoader(oms, window_s=args.window_ms / 1000, max_keys=args.max_keys) if mode == "batched" else oms
+    result = await drive(repository, sessions, args.duration)
+    await repository.aclose()
+    return {
+        "sessions": sessions,
+        "mode": mode,
+        **result,
+        "round_trips": oms.round_trips,
+        "lookups_per_round_trip": round(result["lookups"] / oms.round_trips, 1) if oms.round_trips else None,
+        "keys_per_round_trip": round(oms.keys_requested / oms.round_trips, 1) if oms.round_trips else None,
+    }
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Order lookups per round-trip with and without OrderLoader batching")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 100, 200, 500])
+    parser.add_argument("--duration", type=float, default=3)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--per-key-us", type=float, default=20)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--window-ms", type=float, default=ORDER_BATCH_WINDOW_MS)
+    parser.add_argument("--max-keys", type=int, default=ORDER_BATCH_MAX_KEYS)
+    parser.add_argument("--out", default="bench_results/order_batching.json")
+    args = parser.parse_args()
+
+    orders = InMemoryOrderRepository(synthetic_orders(ROWS))
+    print(f"{'sessions':>8} {'mode':>8} {'lookups/s':>10} {'round-trips':>11} {'ids/trip':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    runs = []
+    for sessions in args.sessions:
+        for mode in ("direct", "batched"):
+            result = asyncio.run(run(sessions, mode, orders, args))
+            runs.append(result)
+            latency = result["latency"]
+            print(f"{sessions:>8} {mode:>8} {result['lookups_per_s']:>10.1f} {result['round_trips']:>11} {result['keys_per_round_trip'] or 0:>8.1f} "
+                  f"{latency['p50_ms'] or 0:>8.2f} {latency['p95_ms'] or 0:>8.2f} {latency['p99_ms'] or 0:>8.2f}")
+
+    report = {
+        "benchmark": "order_batching",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "fake_oms": {"latency_ms": args.latency_ms, "per_key_us": args.per_key_us, "connections": args.connections},
+        "loader": {"window_ms": args.window_ms, "max_keys": args.max_keys},
+        "runs": runs,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results: {args.out}")
+
+
+if __name__ == "__main__":
+    main_cli()
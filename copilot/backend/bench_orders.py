@@ -0,0 +1,138 @@
+# Benchmark: order lookups through the order repositories (orders.py) against the old per-call mock_db dict.
+# Generates --rows synthetic orders, loads them into InMemoryOrderRepository (memory measured with tracemalloc)
+# and into a temporary SQLite file, then times single lookups, get_many of --batch IDs and a status query.
+#   python bench_orders.py [--rows 1000000] [--lookups 20000] [--batch 100] [--out bench_results/orders.json]
+# A tenth of the looked-up IDs don't exist, as with mistyped IDs from users.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from bench_utils import git_revision, percentile
+from orders import InMemoryOrderRepository, SQLiteOrderRepository, normalize_order_id, synthetic_orders, write_sqlite
+
+
+def mock_db_lookup(query: str) -> str | None:
+    """search_orders before the repository: the dict is rebuilt on every call."""
+    mock_db = {
+        "ORD12345": "Order details for 'ORD12345': Status: Shipped, Items: 1x SuperWidget, Delivery Est: Tomorrow. (Source: OMS)",
+        "XYZ987": "Order details for 'XYZ987': Status: Processing, Items: 1x HyperGadget. (Source: OMS)",
+        "TEST001": "Order details for 'TEST001': Status: Delivered, Items: 1x Sample Product. (Source: OMS)",
+    }
+    return mock_db.get(query.strip().upper())
+
+
+def summarize_us(values: list[float]) -> dict:
+    # Microseconds: in-memory lookups are far below the 10 us resolution of summarize_ms
+    return {f"p{p}_us": round(percentile(values, p) * 1e6, 1) for p in (50, 95, 99)}
+
+
+def lookup_ids(rows: int, count: int, seed: int = 1) -> list[str]:
+    rng = random.Random(seed)
+    return [f"ord{rng.randrange(rows):08d} " if rng.random() < 0.9 else f"MISSING{n}" for n in range(count)]
+
+
+async def time_repository(repository, ids: list[str], batch: int) -> dict:
+    singles = []
+    for query in ids:
+        start = time.perf_counter()
+        await repository.get_many([normalize_order_id(query)])
+        singles.append(time.perf_counter() - start)
+    batches = []
+    for i in range(0, len(ids), batch):
+        chunk = [normalize_order_id(query) for query in ids[i:i + batch]]
+        start = time.perf_counter()
+        await repository.get_many(chunk)
+        batches.append(time.perf_counter() - start)
+    statuses = []
+    for _ in range(100):
+        start = time.perf_counter()
+        await repository.by_status("Cancelled", limit=100)
+        statuses.append(time.perf_counter() - start)
+    return {"get": summarize_us(singles), f"get_many_{batch}": summarize_us(batches), "by_status_100": summarize_us(statuses)}
+
+
+async def run(rows: int, lookups: int, batch: int) -> dict:
+    ids = lookup_ids(rows, lookups)
+    results: dict = {}
+
+    start = time.perf_counter()
+    for query in ids:
+        mock_db_lookup(query)
+    results["mock_db"] = {"get_mean_us": round((time.perf_counter() - start) / len(ids) * 1e6, 2)}
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    memory = InMemoryOrderRepository(synthetic_orders(rows))
+    load_s = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results["memory"] = {
+        "load_s": round(load_s, 2), # Includes generating the orders, and runs slower under tracemalloc
+        "resident_mb": round(current / 2**20, 1),
+        "peak_mb": round(peak / 2**20, 1),
+        "bytes_per_order": round(current / len(memory)),
+        **await time_repository(memory, ids, batch),
+    }
+    del memory
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "orders.sqlite")
+        start = time.perf_counter()
+        write_sqlite(path, synthetic_orders(rows))
+        write_s = time.perf_counter() - start
+        sqlite_repository = SQLiteOrderRepository(path)
+        try:
+            results["sqlite"] = {
+                "write_s": round(write_s, 2),
+                "file_mb": round(os.path.getsize(path) / 2**20, 1),
+                **await time_repository(sqlite_repository, ids, batch),
+            }
+        finally:
+            await sqlite_repository.aclose()
+    return results
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Order repository lookup latency and memory")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--out", default="bench_results/orders.json")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.rows, args.lookups, args.batch))
+    print(f"mock_db (3 orders, dict per call): {results['mock_db']['get_mean_us']} us/lookup")
+    memory = results["memory"]
+    print(f"memory: {memory['resident_mb']} MB for {args.rows} orders ({memory['bytes_per_order']} B/order), peak {memory['peak_mb']} MB")
+    print(f"sqlite: {results['sqlite']['file_mb']} MB on disk")
+    print(f"{'backend':>8} {'op':>14} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9}")
+    for backend in ("memory", "sqlite"):
+        for op in ("get", f"get_many_{args.batch}", "by_status_100"):
+            latency = results[backend][op]
+            print(f"{backend:>8} {op:>14} {latency['p50_us']:>9.1f} {latency['p95_us']:>9.1f} {latency['p99_us']:>9.1f}")
+
+    report = {
+        "benchmark": "orders",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "rows": args.rows,
+        "lookups": args.lookups,
+        **results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results: {args.out}")
+
+
+if __name__ == "__main__":
+    main_cli()
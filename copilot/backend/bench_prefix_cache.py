@@ -0,0 +1,54 @@
+# Benchmark: time-to-first-token with and without Ollama prefix (KV cache) reuse.
+# "stable" sends the frozen system prompt every time, "perturbed" puts a unique line in front of it so
+# the prefix never matches and the whole prompt is prefilled again. Needs a running Ollama.
+#   python bench_prefix_cache.py [--requests 20]
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_ollama.llms import OllamaLLM
+
+from main import SYSTEM_PROMPT_CONTENT, model_name
+from prompt_assembly import PromptAssembler, ollama_model_options
+from prompt_corpus import TEST_CASES
+
+
+async def time_to_first_token(model: OllamaLLM, messages: list) -> float:
+    start = time.perf_counter()
+    async for _ in model.astream(messages):
+        return time.perf_counter() - start
+    return time.perf_counter() - start
+
+
+async def run(variant: str, requests: int) -> list[float]:
+    model = OllamaLLM(model=model_name, temperature=0.0, num_predict=1, **ollama_model_options())
+    prompt = PromptAssembler(SYSTEM_PROMPT_CONTENT)
+    await time_to_first_token(model, [prompt.system_message, HumanMessage(content="Hello!")]) # Load the model
+    ttfts = []
+    for i in range(requests):
+        question = HumanMessage(content=TEST_CASES[i % len(TEST_CASES)]["prompt"])
+        if variant == "stable":
+            system_message = prompt.system_message
+        else:
+            system_message = SystemMessage(content=f"Request {uuid.uuid4()}\n{prompt.system_message.content}")
+        ttfts.append(await time_to_first_token(model, [system_message, question]))
+    return ttfts
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="TTFT with and without prompt prefix reuse")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'variant':<10} {'mean ms':>8} {'p50 ms':>8} {'max ms':>8}")
+    for variant in ["perturbed", "stable"]:
+        ttfts = await run(variant, args.requests)
+        print(f"{variant:<10} {statistics.mean(ttfts) * 1000:>8.0f} {statistics.median(ttfts) * 1000:>8.0f} {max(ttfts) * 1000:>8.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+# Benchmark: turn time with speculative tool calls (speculation.py) off and on, plus speculation precision.
+# Runs every agent4 corpus prompt as one turn through the graph on the fake model, with the fast path off so order
+# lookups wait for the model, against a FakeOrderService with --order-latency-ms per round-trip. The tool result cache
+# is cleared before every turn, so each lookup goes to the order service.
+#   python bench_speculation.py [--repeat 3] [--order-latency-ms 200] [--out bench_results/speculation.json]
+# Fake model timing comes from FAKE_LLM_TTFT_S / FAKE_LLM_TOKENS_PER_S (see fake_llm.py).
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import time
+import uuid
+from datetime import datetime, timezone
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("RESPONSE_CACHE", "0") # Repeated prompts should reach the model, not replay a cached answer
+os.environ.setdefault("FAST_PATH", "0")
+
+from prometheus_client import REGISTRY
+
+import main
+from bench_utils import git_revision, summarize_ms
+from orders import SAMPLE_ORDERS, FakeOrderService
+from prompt_corpus import TEST_CASES
+from speculation import PREDICTORS
+
+
+def speculation_counts() -> dict[str, float]:
+    counts = {
+        outcome: REGISTRY.get_sample_value("tool_speculations_total", {"tool": "search_orders", "outcome": outcome}) or 0.0
+        for outcome in ("hit", "wasted", "skipped")
+    }
+    counts["wasted_s"] = REGISTRY.get_sample_value("tool_speculation_wasted_seconds_total", {"tool": "search_orders"}) or 0.0
+    return counts
+
+
+async def run_turns(predictors: dict, repeat: int) -> dict:
+    main.speculator.predictors = predictors
+    lookup_turns, other_turns = [], []
+    before = speculation_counts()
+    for _ in range(repeat):
+        for case in TEST_CASES:
+            main.search_orders.coroutine.cache.invalidate()
+            inputs = {"messages": [main.HumanMessage(content=case["prompt"])]}
+            config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+            looked_up = False
+            start = time.perf_counter()
+            async for frame in main.stream_frames(inputs, config):
+                looked_up = looked_up or b'"name":"search_orders"' in frame
+            (lookup_turns if looked_up else other_turns).append(time.perf_counter() - start)
+    counts = {name: value - before[name] for name, value in speculation_counts().items()}
+    speculated = counts["hit"] + counts["wasted"]
+    return {
+        "lookup_turns": {"turns": len(lookup_turns), "turn": summarize_ms(lookup_turns)},
+        "other_turns": {"turns": len(other_turns), "turn": summarize_ms(other_turns)},
+        "speculation": {
+            "hits": int(counts["hit"]),
+            "wasted": int(counts["wasted"]),
+            "skipped": int(counts["skipped"]),
+            "precision": round(counts["hit"] / speculated, 3) if speculated else None,
+            "wasted_tool_s": round(counts["wasted_s"], 3),
+        },
+    }
+
+
+async def run(repeat: int, order_latency_s: float) -> dict:
+    async with main.lifespan(main.app_fastapi):
+        main.order_repository = FakeOrderService(SAMPLE_ORDERS, latency_s=order_latency_s)
+        off = await run_turns({}, repeat)
+        on = await run_turns({"search_orders": PREDICTORS["search_orders"]}, repeat)
+    return {"off": off, "on": on}
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Turn time with and without speculative tool calls")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--order-latency-ms", type=float, default=200.0)
+    parser.add_argument("--out", default="bench_results/speculation.json")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.repeat, args.order_latency_ms / 1000))
+    print(f"{'speculation':>11} {'turns':>12} {'count':>5} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode in ("off", "on"):
+        for kind in ("lookup_turns", "other_turns"):
+            stats = results[mode][kind]
+            print(f"{mode:>11} {kind:>12} {stats['turns']:>5} {stats['turn']['p50_ms'] or 0:>8.1f} {stats['turn']['p95_ms'] or 0:>8.1f}")
+    spec = results["on"]["speculation"]
+    print(f"speculation: {spec['hits']} hits, {spec['wasted']} wasted ({spec['wasted_tool_s']} s of tool time), "
+          f"{spec['skipped']} skipped, precision {spec['precision']}")
+
+    report = {
+        "benchmark": "speculation",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "order_latency_ms": args.order_latency_ms,
+        "fake_llm": {"ttft_s": main.ollama_model.ttft_s, "tokens_per_s": main.ollama_model.tokens_per_s} if main.LLM_BACKEND == "fake" else None,
+        **results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results: {args.out}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,98 @@
+# Benchmark: CPU per streamed token, lean stream path (stream_frames: custom stream mode, coalesced frames,
+# orjson) vs the previous astream_events(v2) loop with one json.dumps per event. Runs in-process on the fake model.
+#   python bench_sse_cpu.py [--sessions 200] [--concurrency 20]
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("RESPONSE_CACHE", "0")
+os.environ.setdefault("FAST_PATH", "0") # Corpus prompts would mostly skip the model
+# Templated answers are text only the lean path streams; both paths should carry the same model tokens
+os.environ.setdefault("TEMPLATED_TOOL_ANSWERS", "0")
+os.environ.setdefault("FAKE_LLM_TTFT_S", "0")
+os.environ.setdefault("FAKE_LLM_TOKENS_PER_S", "200")
+
+from langchain_core.messages import HumanMessage
+
+import main
+from fake_llm import split_tokens
+from prompt_corpus import TEST_CASES
+
+
+async def events_frames(inputs: dict, config: dict):
+    """The SSE loop as it was before stream_frames, for comparison."""
+    async for event in main.graph_app.astream_events(inputs, config=config, version="v2", include_types=["llm", "chat_model", "tool"]):
+        kind = event["event"]
+        data_to_send = {}
+        if kind == "on_chat_model_stream":
+            if event["data"]["chunk"].content:
+                data_to_send = {"type": "llm_chunk", "content": event["data"]["chunk"].content}
+        elif kind == "on_llm_stream":
+            chunk = event["data"]["chunk"]
+            chunk_content = chunk if isinstance(chunk, str) else getattr(chunk, "text", "")
+            if chunk_content:
+                data_to_send = {"type": "llm_chunk", "content": chunk_content}
+        elif kind == "on_tool_start":
+            data_to_send = {"type": "tool_start", "name": event["name"], "input": event["data"].get("input")}
+        elif kind == "on_tool_end":
+            output = event["data"].get("output")
+            if not isinstance(output, (dict, list, str, int, float, bool, type(None))):
+                output = str(output)
+            data_to_send = {"type": "tool_end", "name": event["name"], "output": output}
+        if data_to_send:
+            yield f"data: {json.dumps(data_to_send)}\n\n"
+
+
+async def run_session(frames_fn, prompt: str, totals: dict) -> None:
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    text = []
+    async for frame in frames_fn({"messages": [HumanMessage(content=prompt)]}, config):
+        totals["frames"] += 1
+        totals["bytes"] += len(frame)
+        payload = json.loads(frame[6:])
+        # Model-generated text only: the lean path also streams text written without the model (templates, fast path, cache)
+        if payload["type"] == "llm_chunk" and not {"templated", "fast_path", "cached"} & payload.keys():
+            text.append(payload["content"])
+    totals["tokens"] += len(split_tokens("".join(text)))
+
+
+async def run_path(frames_fn, sessions: int, concurrency: int) -> dict:
+    totals = {"frames": 0, "bytes": 0, "tokens": 0}
+    slots = asyncio.Semaphore(concurrency)
+
+    async def limited(prompt: str) -> None:
+        async with slots:
+            await run_session(frames_fn, prompt, totals)
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(limited(TEST_CASES[i % len(TEST_CASES)]["prompt"]) for i in range(sessions)))
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    return {**totals, "cpu_s": cpu, "wall_s": wall, "cpu_us_per_token": cpu / max(totals["tokens"], 1) * 1e6, "cpu_ms_per_session": cpu / sessions * 1000}
+
+
+async def run(sessions: int, concurrency: int) -> None:
+    async with main.lifespan(main.app_fastapi):
+        paths = {"events": events_frames, "lean": main.stream_frames}
+        for frames_fn in paths.values():
+            await run_path(frames_fn, 10, concurrency) # Warm-up
+        print(f"{'path':<8} {'tokens':>7} {'frames':>7} {'KiB':>7} {'cpu s':>7} {'wall s':>7} {'cpu us/token':>13} {'cpu ms/session':>15}")
+        for name, frames_fn in paths.items():
+            r = await run_path(frames_fn, sessions, concurrency)
+            print(f"{name:<8} {r['tokens']:>7} {r['frames']:>7} {r['bytes'] / 1024:>7.0f} {r['cpu_s']:>7.2f} {r['wall_s']:>7.2f} {r['cpu_us_per_token']:>13.0f} {r['cpu_ms_per_session']:>15.2f}")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="CPU per streamed token: lean stream path vs astream_events")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.sessions, args.concurrency))
+
+
+if __name__ == "__main__":
+    main_cli()
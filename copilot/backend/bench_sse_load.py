@@ -0,0 +1,180 @@
+# Benchmark: /chat/stream under concurrent SSE clients, in-process with the fake model (no Ollama, no sockets).
+# Ramps through the given concurrency levels and reports time to first event / first token (p50/p95/p99),
+# events per second, traced memory per open stream and event-loop lag; results are written to a JSON file.
+#   python bench_sse_load.py [--levels 1 10 50 100] [--out bench_results/sse_load.json]
+# Fake model timing comes from FAKE_LLM_TTFT_S / FAKE_LLM_TOKENS_PER_S (see fake_llm.py).
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("RESPONSE_CACHE", "0") # Every session should reach the model, not replay a cached answer
+os.environ.setdefault("FAST_PATH", "0") # Corpus prompts would mostly skip the model
+os.environ.setdefault("MODEL_MAX_CONCURRENCY", "1000") # The fake model has no capacity limit; measure the SSE layer, not the queue
+
+import main
+from bench_utils import git_revision, summarize_ms
+from prompt_corpus import TEST_CASES
+
+
+async def sse_request(app, path: str, payload: dict):
+    """
+    Yields (seconds since the request started, SSE event dict) as the app sends them; a non-200 response
+    yields one {"type": "http_error", "status": ...} event instead.
+    Drives the ASGI app directly because httpx.ASGITransport buffers the whole body before returning.
+    """
+    body = json.dumps(payload).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    request_sent = False
+    disconnected = asyncio.Event()
+    messages: asyncio.Queue = asyncio.Queue()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        await messages.put(message)
+
+    start = time.perf_counter()
+    app_task = asyncio.create_task(app(scope, receive, send))
+    app_task.add_done_callback(lambda _: messages.put_nowait(None))
+    buffer = b""
+    try:
+        while (message := await messages.get()) is not None:
+            if message["type"] == "http.response.start" and message["status"] != 200:
+                yield time.perf_counter() - start, {"type": "http_error", "status": message["status"]}
+                break
+            if message["type"] != "http.response.body":
+                continue
+            buffer += message.get("body", b"")
+            while b"\n\n" in buffer:
+                frame, buffer = buffer.split(b"\n\n", 1)
+                if frame.startswith(b"data: "):
+                    yield time.perf_counter() - start, json.loads(frame[6:])
+            if not message.get("more_body", False):
+                break
+    finally:
+        disconnected.set()
+        await app_task
+
+
+async def run_session(prompt: str, stats: dict) -> None:
+    first_event = first_token = None
+    events = 0
+    async for elapsed, event in sse_request(main.app_fastapi, "/chat/stream", {"text": prompt}):
+        events += 1
+        if first_event is None:
+            first_event = elapsed
+        if first_token is None and event["type"] == "llm_chunk":
+            first_token = elapsed
+        if event["type"] == "error":
+            stats["errors"] += 1
+        if event["type"] == "http_error":
+            stats["rejected" if event["status"] == 429 else "errors"] += 1
+            return
+    stats["ttfe"].append(first_event)
+    if first_token is not None:
+        stats["ttft"].append(first_token)
+    stats["events"] += events
+
+
+async def monitor_loop_lag(interval_s: float, lags: list[float], stop: asyncio.Event) -> None:
+    """How late a `sleep(interval_s)` wakes up: time the loop spent busy with other work."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval_s)
+        lags.append(time.perf_counter() - start - interval_s)
+
+
+async def run_level(concurrency: int, trace_memory: bool) -> dict:
+    stats = {"ttfe": [], "ttft": [], "events": 0, "errors": 0, "rejected": 0}
+    lags: list[float] = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_loop_lag(0.01, lags, stop))
+    if trace_memory:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+    start = time.perf_counter()
+    prompts = [TEST_CASES[i % len(TEST_CASES)]["prompt"] for i in range(concurrency)]
+    await asyncio.gather(*(run_session(prompt, stats) for prompt in prompts))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await lag_task
+    result = {
+        "concurrency": concurrency,
+        "wall_s": round(elapsed, 3),
+        "errors": stats["errors"],
+        "rejected": stats["rejected"],
+        "time_to_first_event": summarize_ms(stats["ttfe"]),
+        "time_to_first_token": summarize_ms(stats["ttft"]),
+        "events": stats["events"],
+        "events_per_s": round(stats["events"] / elapsed, 1),
+        "loop_lag": {**summarize_ms(lags), "max_ms": round(max(lags, default=0) * 1000, 2)},
+    }
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        result["memory_per_stream_kib"] = round((peak - baseline) / concurrency / 1024, 1)
+    return result
+
+
+async def run(levels: list[int], trace_memory: bool) -> list[dict]:
+    if trace_memory:
+        tracemalloc.start()
+    results = []
+    async with main.lifespan(main.app_fastapi):
+        await run_level(1, trace_memory=False) # Warm-up: imports, graph compile caches, first checkpoint
+        for concurrency in levels:
+            result = await run_level(concurrency, trace_memory)
+            results.append(result)
+            ttfe, ttft, lag = result["time_to_first_event"], result["time_to_first_token"], result["loop_lag"]
+            memory = f"{result['memory_per_stream_kib']:>8.1f}" if trace_memory else f"{'-':>8}"
+            # Percentiles are None when no session got that far (e.g. all rejected)
+            print(f"{concurrency:>6} {ttfe['p50_ms'] or 0:>9.1f} {ttfe['p95_ms'] or 0:>9.1f} {ttfe['p99_ms'] or 0:>9.1f} {ttft['p95_ms'] or 0:>9.1f} "
+                  f"{result['events_per_s']:>9.0f} {memory} {lag['p99_ms'] or 0:>9.1f} {result['errors']:>6}")
+    return results
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Load test /chat/stream in-process with the fake model")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--out", default="bench_results/sse_load.json")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc (it slows everything down)")
+    args = parser.parse_args()
+
+    print(f"{'conc':>6} {'ttfe p50':>9} {'ttfe p95':>9} {'ttfe p99':>9} {'ttft p95':>9} {'events/s':>9} {'KiB/strm':>8} {'lag p99':>9} {'errors':>6}")
+    results = asyncio.run(run(args.levels, trace_memory=not args.no_memory))
+
+    report = {
+        "benchmark": "sse_load",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "fake_llm": main.ollama_model._identifying_params if main.LLM_BACKEND == "fake" else None,
+        "levels": results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results: {args.out}")
+
+
+if __name__ == "__main__":
+    main_cli()
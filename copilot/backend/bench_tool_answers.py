@@ -0,0 +1,94 @@
+# Benchmark: model calls and turn time with templated tool answers (tool_answers.py) off and on.
+# Runs every agent4 corpus prompt as one turn through the graph on the fake model, with the fast path off so every
+# turn starts with a model call, and counts the model calls per turn from the agent node's metrics.
+#   python bench_tool_answers.py [--repeat 3] [--out bench_results/tool_answers.json]
+# Fake model timing comes from FAKE_LLM_TTFT_S / FAKE_LLM_TOKENS_PER_S (see fake_llm.py).
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import time
+import uuid
+from datetime import datetime, timezone
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("RESPONSE_CACHE", "0") # Repeated prompts should reach the model, not replay a cached answer
+os.environ.setdefault("FAST_PATH", "0")
+
+from prometheus_client import REGISTRY
+
+import main
+from bench_utils import git_revision, summarize_ms
+from prompt_corpus import TEST_CASES
+from tool_answers import DEFAULT_TEMPLATES, TOOL_ANSWER_TEMPLATES
+
+
+def model_calls() -> float:
+    return REGISTRY.get_sample_value("llm_call_duration_seconds_count", {"node": "agent"}) or 0.0
+
+
+async def run_turns(templates: dict[str, str], repeat: int) -> dict:
+    main.TOOL_ANSWER_TEMPLATES = templates
+    tool_turns = {"turns": 0, "model_calls": 0.0, "seconds": []}
+    other_turns = {"turns": 0, "model_calls": 0.0, "seconds": []}
+    for _ in range(repeat):
+        for case in TEST_CASES:
+            inputs = {"messages": [main.HumanMessage(content=case["prompt"])]}
+            config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+            calls_before, used_tool = model_calls(), False
+            start = time.perf_counter()
+            async for frame in main.stream_frames(inputs, config):
+                used_tool = used_tool or b'"tool_start"' in frame
+            stats = tool_turns if used_tool else other_turns
+            stats["turns"] += 1
+            stats["model_calls"] += model_calls() - calls_before
+            stats["seconds"].append(time.perf_counter() - start)
+    return {
+        name: {
+            "turns": stats["turns"],
+            "model_calls_per_turn": round(stats["model_calls"] / stats["turns"], 2) if stats["turns"] else None,
+            "turn": summarize_ms(stats["seconds"]),
+        }
+        for name, stats in (("tool_turns", tool_turns), ("other_turns", other_turns))
+    }
+
+
+async def run(repeat: int) -> dict:
+    async with main.lifespan(main.app_fastapi):
+        off = await run_turns({}, repeat)
+        on = await run_turns(TOOL_ANSWER_TEMPLATES or DEFAULT_TEMPLATES, repeat) # The configured templates, or the defaults
+    return {"off": off, "on": on}
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Model calls per turn with and without templated tool answers")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default="bench_results/tool_answers.json")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.repeat))
+    print(f"{'templates':>9} {'turns':>12} {'count':>5} {'calls/turn':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode in ("off", "on"):
+        for kind in ("tool_turns", "other_turns"):
+            stats = results[mode][kind]
+            print(f"{mode:>9} {kind:>12} {stats['turns']:>5} {stats['model_calls_per_turn'] or 0:>10.2f} "
+                  f"{stats['turn']['p50_ms'] or 0:>8.1f} {stats['turn']['p95_ms'] or 0:>8.1f}")
+
+    report = {
+        "benchmark": "tool_answers",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "fake_llm": {"ttft_s": main.ollama_model.ttft_s, "tokens_per_s": main.ollama_model.tokens_per_s} if main.LLM_BACKEND == "fake" else None,
+        **results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results: {args.out}")
+
+
+if __name__ == "__main__":
+    main_cli()
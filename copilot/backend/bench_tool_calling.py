@@ -0,0 +1,68 @@
+# Benchmark: text protocol (regex over "Action:" text) vs native tool calling (ChatOllama.bind_tools).
+# Sends the first turn of every agent4 test prompt to a live Ollama in both modes and reports
+# latency and tool-call success (the right tool with the right arguments, or no tool when none is expected).
+#   python bench_tool_calling.py [--modes text native] [--repeat 1]
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from main import make_tool_adapter
+from prompt_corpus import TEST_CASES
+
+
+def is_success(case: dict, tool_calls: list[dict]) -> bool:
+    if case["tool"] is None:
+        return not tool_calls
+    if not tool_calls or tool_calls[0].get("error"):
+        return False
+    call = tool_calls[0]
+    if call["name"] != case["tool"]:
+        return False
+    if case["tool"] == "search_orders":
+        return str(call["args"].get("query", "")).strip().upper() == case["args"]["query"]
+    try:
+        return {k: int(v) for k, v in call["args"].items()} == case["args"]
+    except (TypeError, ValueError):
+        return False
+
+
+async def run_mode(mode: str, repeat: int) -> dict:
+    adapter = make_tool_adapter(mode)
+    system_prompt = SystemMessage(content=adapter.system_prompt)
+    latencies, successes = [], 0
+    for _ in range(repeat):
+        for case in TEST_CASES:
+            start = time.perf_counter()
+            response = await adapter.call_model([system_prompt, HumanMessage(content=case["prompt"])])
+            tool_calls = adapter.parse_tool_calls(response)
+            latencies.append(time.perf_counter() - start)
+            successes += is_success(case, tool_calls)
+    latencies.sort()
+    return {
+        "mode": mode,
+        "cases": len(latencies),
+        "success_rate": successes / len(latencies),
+        "p50_s": statistics.median(latencies),
+        "p95_s": latencies[int(0.95 * (len(latencies) - 1))],
+        "total_s": sum(latencies),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Text protocol vs native tool calling")
+    parser.add_argument("--modes", nargs="+", default=["text", "native"])
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'cases':>5} {'success':>8} {'p50 s':>7} {'p95 s':>7} {'total s':>8}")
+    for mode in args.modes:
+        r = await run_mode(mode, args.repeat)
+        print(f"{r['mode']:<8} {r['cases']:>5} {r['success_rate']:>8.0%} {r['p50_s']:>7.2f} {r['p95_s']:>7.2f} {r['total_s']:>8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
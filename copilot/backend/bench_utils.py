@@ -0,0 +1,22 @@
+# Helpers shared by the bench_*.py scripts.
+
+import subprocess
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    """Nearest-rank percentile; None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+def summarize_ms(values: list[float]) -> dict:
+    return {f"p{p}_ms": round(percentile(values, p) * 1000, 2) if values else None for p in (50, 95, 99)}
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
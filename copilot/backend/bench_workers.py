@@ -0,0 +1,148 @@
+# Benchmark: /chat/stream throughput against the real server (uvicorn over TCP) with 1, 2, 4... worker processes.
+# Each run starts `uvicorn main:app_fastapi --workers N` on the fake model with the sqlite checkpointer and a sqlite
+# shared store, keeps --concurrency streams open for --duration seconds and counts completed turns per second.
+#   python bench_workers.py [--workers 1 2 4] [--concurrency 32] [--duration 15] [--out bench_results/workers.json]
+# The fake model streams without delays (FAKE_LLM_TTFT_S=0, FAKE_LLM_TOKENS_PER_S=0), so the server is CPU bound and
+# throughput follows the cores the workers can use. The load generator runs in this process and needs a core too.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from bench_utils import git_revision, summarize_ms
+from prompt_corpus import TEST_CASES
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers: int, port: int, state_dir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "LLM_BACKEND": "fake", "FAKE_LLM_TTFT_S": "0", "FAKE_LLM_TOKENS_PER_S": "0", "RESPONSE_CACHE": "0", "FAST_PATH": "0",
+        "CHECKPOINTER_BACKEND": "sqlite", "CHECKPOINTER_SQLITE_PATH": os.path.join(state_dir, "checkpoints.sqlite"),
+        "SHARED_STORE_URL": f"sqlite:///{os.path.join(state_dir, 'shared.sqlite')}",
+        "WEB_CONCURRENCY": str(workers), "MODEL_MAX_CONCURRENCY": "1000",
+    }
+    command = [sys.executable, "-m", "uvicorn", "main:app_fastapi", "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+
+
+async def wait_ready(client: httpx.AsyncClient, server: subprocess.Popen, timeout_s: float = 60) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if (await client.get("/healthz")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError("Server did not become ready")
+
+
+async def stream_turn(client: httpx.AsyncClient, prompt: str) -> bool:
+    async with client.stream("POST", "/chat/stream", json={"text": prompt}) as response:
+        if response.status_code != 200:
+            return False
+        last = ""
+        async for line in response.aiter_lines():
+            if line.startswith("data: "):
+                last = line
+        return json.loads(last[6:]).get("type") == "stream_end" if last else False
+
+
+async def drive(base_url: str, server: subprocess.Popen, concurrency: int, duration_s: float) -> dict:
+    stats = {"completed": 0, "failed": 0, "latencies": []}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        await wait_ready(client, server)
+        for i in range(concurrency): # Warm-up: every worker imports and compiles lazily on its first requests
+            await stream_turn(client, TEST_CASES[i % len(TEST_CASES)]["prompt"])
+
+        async def session_loop(offset: int, stop_at: float) -> None:
+            i = offset
+            while time.perf_counter() < stop_at:
+                start = time.perf_counter()
+                try:
+                    ok = await stream_turn(client, TEST_CASES[i % len(TEST_CASES)]["prompt"])
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    stats["completed"] += 1
+                    stats["latencies"].append(time.perf_counter() - start)
+                else:
+                    stats["failed"] += 1
+                i += concurrency
+
+        start = time.perf_counter()
+        await asyncio.gather(*(session_loop(i, start + duration_s) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {
+        "completed": stats["completed"],
+        "failed": stats["failed"],
+        "wall_s": round(elapsed, 2),
+        "turns_per_s": round(stats["completed"] / elapsed, 1),
+        "latency": summarize_ms(stats["latencies"]),
+    }
+
+
+def run_workers(workers: int, concurrency: int, duration_s: float) -> dict:
+    port = free_port()
+    with tempfile.TemporaryDirectory() as state_dir:
+        server = start_server(workers, port, state_dir)
+        try:
+            result = asyncio.run(drive(f"http://127.0.0.1:{port}", server, concurrency, duration_s))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return {"workers": workers, "concurrency": concurrency, **result}
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Throughput of /chat/stream by number of worker processes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--out", default="bench_results/workers.json")
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'turns/s':>8} {'speedup':>8} {'p50 ms':>8} {'p95 ms':>8} {'failed':>6}")
+    results = []
+    for workers in args.workers:
+        result = run_workers(workers, args.concurrency, args.duration)
+        result["speedup"] = round(result["turns_per_s"] / results[0]["turns_per_s"], 2) if results and results[0]["turns_per_s"] else 1.0
+        results.append(result)
+        latency = result["latency"]
+        print(f"{workers:>7} {result['turns_per_s']:>8.1f} {result['speedup']:>8.2f} {latency['p50_ms'] or 0:>8.1f} {latency['p95_ms'] or 0:>8.1f} {result['failed']:>6}")
+
+    report = {
+        "benchmark": "workers",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "runs": results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results: {args.out}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,111 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from prometheus_client import Counter, Histogram
+
+# --- Budget Settings ---
+# Limits for one request (one user turn), checked between graph steps; the graph ends with a final message when one runs out
+BUDGET_MAX_STEPS = int(os.getenv("BUDGET_MAX_STEPS", "5")) # Model turns
+BUDGET_MAX_TOOL_CALLS = int(os.getenv("BUDGET_MAX_TOOL_CALLS", "10"))
+BUDGET_MAX_TOKENS = int(os.getenv("BUDGET_MAX_TOKENS", "2048")) # Generated tokens
+BUDGET_MAX_WALL_S = float(os.getenv("BUDGET_MAX_WALL_S", "120"))
+
+BUDGET_USED = Histogram("request_budget_used", "Budget a finished request used, by resource.", ["resource"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100, 250, 500, 1000, 2500, 5000))
+BUDGET_EXHAUSTED = Counter("request_budget_exhausted_total", "Requests ended early because a budget ran out, by the limit hit.", ["limit"])
+
+LIMIT_DESCRIPTIONS = {
+    "steps": "model turns",
+    "tool_calls": "tool calls",
+    "tokens": "generated tokens",
+    "wall_time": "seconds",
+}
+
+
+@dataclass(frozen=True)
+class BudgetLimits:
+    max_steps: int = BUDGET_MAX_STEPS
+    max_tool_calls: int = BUDGET_MAX_TOOL_CALLS
+    max_tokens: int = BUDGET_MAX_TOKENS
+    max_wall_s: float = BUDGET_MAX_WALL_S
+
+
+def limits_for(config: RunnableConfig | None) -> BudgetLimits:
+    """The env defaults, or `BudgetLimits` passed per run as config["configurable"]["budget"]."""
+    return ((config or {}).get("configurable") or {}).get("budget") or BudgetLimits()
+
+
+def new_usage() -> dict[str, Any]:
+    # Wall clock, not monotonic: the usage is checkpointed and another worker may pick up the next step
+    return {"steps": 0, "tool_calls": 0, "tokens": 0, "started_at": time.time()}
+
+
+def usage_for_turn(state: dict[str, Any]) -> dict[str, Any]:
+    """A copy of the request's usage so far; a fresh one when the last message is the user's new turn."""
+    if isinstance(state["messages"][-1], HumanMessage) or not state.get("budget"):
+        return new_usage()
+    return dict(state["budget"])
+
+
+def generated_tokens(response: AIMessage) -> int:
+    if response.usage_metadata:
+        return response.usage_metadata["output_tokens"]
+    content = response.content if isinstance(response.content, str) else str(response.content)
+    return len(content) // 4 # Plain completions carry no usage; same characters/4 estimate as the metrics
+
+
+def exhausted_limit(usage: dict[str, Any], limits: BudgetLimits, pending_tool_calls: int | None = None) -> str | None:
+    """
+    The limit that stops the request ("steps", "tool_calls", "tokens", "wall_time"), or None. Before running
+    `pending_tool_calls` tools only tool calls and wall time count, so the results of the last model turn's
+    calls still make it into the final message; before another model turn steps and tokens count too.
+    """
+    if pending_tool_calls is not None and usage["tool_calls"] + pending_tool_calls > limits.max_tool_calls:
+        return "tool_calls"
+    if pending_tool_calls is None and usage["steps"] >= limits.max_steps:
+        return "steps"
+    if pending_tool_calls is None and usage["tokens"] >= limits.max_tokens:
+        return "tokens"
+    if time.time() - usage["started_at"] >= limits.max_wall_s:
+        return "wall_time"
+    return None
+
+
+def budget_frame(usage: dict[str, Any], limits: BudgetLimits, exhausted: str | None = None) -> dict[str, Any]:
+    """SSE payload with the request's consumption against its limits."""
+    frame = {
+        "type": "budget",
+        "steps": usage["steps"], "max_steps": limits.max_steps,
+        "tool_calls": usage["tool_calls"], "max_tool_calls": limits.max_tool_calls,
+        "tokens": usage["tokens"], "max_tokens": limits.max_tokens,
+        "elapsed_s": round(time.time() - usage["started_at"], 3), "max_wall_s": limits.max_wall_s,
+    }
+    if exhausted:
+        frame["exhausted"] = exhausted
+    return frame
+
+
+def observe_finished(usage: dict[str, Any], exhausted: str | None = None) -> None:
+    for resource in ("steps", "tool_calls", "tokens"):
+        BUDGET_USED.labels(resource=resource).observe(usage[resource])
+    BUDGET_USED.labels(resource="wall_s").observe(time.time() - usage["started_at"])
+    if exhausted:
+        BUDGET_EXHAUSTED.labels(limit=exhausted).inc()
+
+
+def exhausted_message(limit: str, limits: BudgetLimits, messages: Sequence[BaseMessage]) -> str:
+    """Final answer when a budget runs out: what was hit, plus the tool results this turn already produced."""
+    cap = {"steps": limits.max_steps, "tool_calls": limits.max_tool_calls, "tokens": limits.max_tokens, "wall_time": limits.max_wall_s}[limit]
+    text = f"I had to stop before finishing: this request reached its limit of {cap:g} {LIMIT_DESCRIPTIONS[limit]}."
+    results = []
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, ToolMessage):
+            results.insert(0, f"- {message.name}: {message.content}")
+    if results:
+        text += " Results so far:\n" + "\n".join(results)
+    return text
@@ -0,0 +1,76 @@
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+
+# --- Checkpointer Settings ---
+# "memory" keeps sessions in process (LRU bounded), "sqlite" persists them to a file, "redis" to a Redis server.
+# With several workers use "sqlite" (one host) or "redis": every worker must see every session.
+CHECKPOINTER_BACKEND = os.getenv("CHECKPOINTER_BACKEND", "memory")
+CHECKPOINTER_SQLITE_PATH = os.getenv("CHECKPOINTER_SQLITE_PATH", "checkpoints.sqlite")
+CHECKPOINTER_REDIS_URL = os.getenv("CHECKPOINTER_REDIS_URL", "redis://localhost:6379/0")
+CHECKPOINTER_MAX_SESSIONS = int(os.getenv("CHECKPOINTER_MAX_SESSIONS", "1000"))
+
+
+class LRUMemorySaver(InMemorySaver):
+    """In-memory checkpointer that forgets the least recently used session once `max_sessions` is exceeded."""
+
+    def __init__(self, max_sessions: int = CHECKPOINTER_MAX_SESSIONS, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.max_sessions = max_sessions
+        self._recent_threads: OrderedDict[str, None] = OrderedDict()
+
+    def _touch(self, config: RunnableConfig) -> None:
+        thread_id = config.get("configurable", {}).get("thread_id")
+        if thread_id is None:
+            return
+        self._recent_threads[thread_id] = None
+        self._recent_threads.move_to_end(thread_id)
+        while len(self._recent_threads) > self.max_sessions:
+            evicted_thread_id, _ = self._recent_threads.popitem(last=False)
+            super().delete_thread(evicted_thread_id)
+
+    def get_tuple(self, config: RunnableConfig) -> Any:
+        checkpoint_tuple = super().get_tuple(config)
+        if checkpoint_tuple is not None:
+            self._touch(config)
+        return checkpoint_tuple
+
+    def put(self, config: RunnableConfig, checkpoint: Any, metadata: Any, new_versions: Any) -> RunnableConfig:
+        self._touch(config)
+        return super().put(config, checkpoint, metadata, new_versions)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._recent_threads.pop(thread_id, None)
+        super().delete_thread(thread_id)
+
+
+@asynccontextmanager
+async def open_checkpointer(
+    backend: str = CHECKPOINTER_BACKEND,
+    sqlite_path: str = CHECKPOINTER_SQLITE_PATH,
+    max_sessions: int = CHECKPOINTER_MAX_SESSIONS,
+    redis_url: str = CHECKPOINTER_REDIS_URL,
+) -> AsyncIterator[BaseCheckpointSaver]:
+    """Open the configured checkpointer for the lifetime of the app."""
+    if backend == "memory":
+        yield LRUMemorySaver(max_sessions=max_sessions)
+    elif backend == "sqlite":
+        # Optional dependency: pip install langgraph-checkpoint-sqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        async with AsyncSqliteSaver.from_conn_string(sqlite_path) as saver:
+            yield saver
+    elif backend == "redis":
+        # Optional dependency: pip install langgraph-checkpoint-redis
+        from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+
+        async with AsyncRedisSaver.from_conn_string(redis_url) as saver:
+            await saver.asetup()
+            yield saver
+    else:
+        raise ValueError(f"Unknown checkpointer backend '{backend}'. Use 'memory', 'sqlite' or 'redis'.")
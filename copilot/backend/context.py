@@ -0,0 +1,105 @@
+import os
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately, get_buffer_string
+from prometheus_client import Counter, Histogram
+
+# --- Context Window Settings ---
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "3000")) # Budget for the conversation, excluding the system prompt
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4")) # Most recent user turns always sent verbatim (budget permitting)
+SUMMARY_MAX_CHARS = 2000
+
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 16000, 32000)
+CONTEXT_TOKENS = Counter("context_tokens_total", "Approximate prompt tokens per model call: \"sent\", and \"saved\" by trimming and summarising.", ["kind"])
+CONTEXT_TOKENS_PER_CALL = Histogram("context_tokens_per_call", "Approximate prompt tokens sent and saved in one model call.", ["kind"], buckets=(0,) + TOKEN_BUCKETS)
+
+Summarizer = Callable[[str, Sequence[BaseMessage]], Awaitable[str]]
+
+
+@dataclass
+class ContextStats:
+    tokens_full: int # What the call would have cost without trimming
+    tokens_sent: int
+    tokens_saved: int
+    summarized_messages: int
+
+
+async def extractive_summarizer(previous_summary: str, new_messages: Sequence[BaseMessage]) -> str:
+    """Fallback summarizer that needs no model call: keeps the tail of a transcript of the older turns."""
+    transcript = "\n".join(part for part in [previous_summary, get_buffer_string(new_messages)] if part)
+    return transcript[-SUMMARY_MAX_CHARS:]
+
+
+def split_turns(messages: Sequence[BaseMessage]) -> list[list[BaseMessage]]:
+    """Group messages into turns, each starting at a HumanMessage (tool calls stay with their turn)."""
+    turns: list[list[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+class ContextManager:
+    """
+    Keeps the prompt within a token budget: the system prompt and the last `keep_turns` turns are sent as is,
+    older turns are collapsed into one summary message. The summary lives in AgentState, so it is only
+    extended with the turns that fell out of the window since the previous call.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CONTEXT_MAX_TOKENS,
+        keep_turns: int = CONTEXT_KEEP_TURNS,
+        summarizer: Summarizer = extractive_summarizer,
+        token_counter: Callable[[Sequence[BaseMessage]], int] = count_tokens_approximately,
+    ) -> None:
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.summarizer = summarizer
+        self.token_counter = token_counter
+
+    def _window_start(self, messages: Sequence[BaseMessage]) -> int:
+        """Index of the first message that is sent verbatim."""
+        turns = split_turns(messages)
+        recent = turns[-self.keep_turns:] if self.keep_turns > 0 else turns[-1:]
+        # Drop whole turns while over budget, but never the current one (the ReAct loop needs it)
+        while len(recent) > 1 and self.token_counter([m for turn in recent for m in turn]) > self.max_tokens:
+            recent = recent[1:]
+        return len(messages) - sum(len(turn) for turn in recent)
+
+    async def build(
+        self,
+        system_message: SystemMessage,
+        messages: Sequence[BaseMessage],
+        summary: str = "",
+        summarized_count: int = 0,
+    ) -> tuple[list[BaseMessage], str, int, ContextStats]:
+        """Returns the messages for the model plus the updated summary state and per-call stats."""
+        messages = list(messages)
+        window_start = max(self._window_start(messages), summarized_count)
+        older, recent = messages[:window_start], messages[window_start:]
+
+        if len(older) > summarized_count:
+            summary = await self.summarizer(summary, older[summarized_count:])
+            summarized_count = len(older)
+
+        messages_for_llm: list[BaseMessage] = [system_message]
+        if summary:
+            messages_for_llm.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+        messages_for_llm.extend(recent)
+
+        tokens_full = self.token_counter([system_message] + messages)
+        tokens_sent = self.token_counter(messages_for_llm)
+        stats = ContextStats(
+            tokens_full=tokens_full,
+            tokens_sent=tokens_sent,
+            tokens_saved=max(tokens_full - tokens_sent, 0),
+            summarized_messages=summarized_count,
+        )
+        for kind, tokens in (("sent", stats.tokens_sent), ("saved", stats.tokens_saved)):
+            CONTEXT_TOKENS.labels(kind=kind).inc(tokens)
+            CONTEXT_TOKENS_PER_CALL.labels(kind=kind).observe(tokens)
+        return messages_for_llm, summary, summarized_count, stats
@@ -1,40 +1,218 @@
-from azure.cosmos import CosmosClient, PartitionKey, exceptions
+import asyncio
 import os
+from collections import OrderedDict, defaultdict
+from typing import Any, Sequence
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
 
 # Emulator endpoint and key (default values)
-endpoint = "https://localhost:8081/"
-key = "C2y6yDjf5/R+ob0N8A7Cgv30VRDJIWEHLM+4QDU5DE2nQ9nDuVTqobD4b8mGGyPMbIZnqyMsEcaGQy67XIw/Jw=="
-
-# Disable SSL verification for emulator (since it uses self-signed cert)
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-# Initialize Cosmos client
-client = CosmosClient(endpoint, key, connection_verify=False)
-
-# Create database if not exists
-database_name = 'TestDatabase'
-database = client.create_database_if_not_exists(id=database_name)
-
-# Create container if not exists
-container_name = 'TestContainer'
-container = database.create_container_if_not_exists(
-    id=container_name,
-    partition_key=PartitionKey(path='/id'),
-    offer_throughput=400
-)
-
-# Insert a record
-item = {
-    'id': '1',
-    'name': 'John Doe',
-    'email': 'john.doe@example.com'
-}
-
-container.upsert_item(item)
-print("Item inserted successfully.")
-
-# Read the record back
-read_item = container.read_item(item='1', partition_key='1')
-print("Item read successfully:")
-print(read_item)
\ No newline at end of file
+endpoint = os.getenv("COSMOS_ENDPOINT", "https://localhost:8081/")
+key = os.getenv("COSMOS_KEY", "C2y6yDjf5/R+ob0N8A7Cgv30VRDJIWEHLM+4QDU5DE2nQ9nDuVTqobD4b8mGGyPMbIZnqyMsEcaGQy67XIw/Jw==")
+database_name = os.getenv("COSMOS_DATABASE", "CopilotDatabase")
+container_name = os.getenv("COSMOS_CONTAINER", "Conversations")
+
+# Cosmos DB rejects transactional batches with more than 100 operations
+MAX_BATCH_OPERATIONS = 100
+
+
+class FakeContainer:
+    """In-process stand-in for an async Cosmos container, for tests and benchmarks without the emulator."""
+
+    def __init__(self, latency_s: float = 0.0) -> None:
+        self.latency_s = latency_s # Simulated network round-trip per request
+        self.items: dict[tuple[str, str], dict[str, Any]] = {}
+        self.round_trips = 0
+
+    async def _round_trip(self) -> None:
+        self.round_trips += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+
+    async def upsert_item(self, body: dict[str, Any], **kwargs: Any) -> dict[str, Any]:
+        await self._round_trip()
+        self.items[(body["session_id"], body["id"])] = dict(body)
+        return body
+
+    async def execute_item_batch(self, batch_operations: Sequence[tuple], partition_key: str, **kwargs: Any) -> list:
+        await self._round_trip()
+        if len(batch_operations) > MAX_BATCH_OPERATIONS:
+            raise ValueError(f"Batch exceeds {MAX_BATCH_OPERATIONS} operations.")
+        results = []
+        for operation, args, *_ in batch_operations:
+            if operation != "upsert":
+                raise ValueError(f"Unsupported batch operation '{operation}'.")
+            item = args[0]
+            if item["session_id"] != partition_key:
+                raise ValueError("All operations in a batch must share the partition key.")
+            self.items[(partition_key, item["id"])] = dict(item)
+            results.append({"statusCode": 200, "resourceBody": item})
+        return results
+
+    async def query_items(self, query: str, parameters: list[dict[str, Any]], partition_key: str, **kwargs: Any):
+        await self._round_trip()
+        for item in sorted(
+            (item for (session_id, _), item in self.items.items() if session_id == partition_key),
+            key=lambda item: item["seq"],
+        ):
+            yield item
+
+
+class CosmosConversationStore:
+    """
+    Persists AgentState.messages per session in Cosmos DB.
+    Saves are queued and flushed in the background as one transactional batch per session,
+    so callers (the SSE stream) never wait on storage. Messages that were dropped or failed to
+    write are queued again by the session's next save.
+    """
+
+    def __init__(self, container: Any = None, flush_interval_s: float = 0.05, max_queue_size: int = 10000, max_concurrent_batches: int = 16,
+                 max_sessions: int = 10000) -> None:
+        self.container = container
+        self.flush_interval_s = flush_interval_s
+        self._batch_slots = asyncio.Semaphore(max_concurrent_batches)
+        self._client: Any = None
+        self._queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=max_queue_size)
+        # Messages known to be written, per session; least recently saved sessions are forgotten past max_sessions
+        # (their next save rewrites the whole history, upserts are idempotent)
+        self.max_sessions = max_sessions
+        self._persisted_counts: OrderedDict[str, int] = OrderedDict()
+        self._queued_counts: dict[str, int] = {} # Messages queued so far, for sessions with a flush pending
+        self._flush_task: asyncio.Task | None = None
+        self.dropped_items = 0
+
+    async def start(self) -> None:
+        if self.container is None:
+            # One client (and its pooled HTTP session) for the lifetime of the store
+            from azure.cosmos import PartitionKey
+            from azure.cosmos.aio import CosmosClient
+
+            # Disable SSL verification for emulator (since it uses self-signed cert)
+            self._client = CosmosClient(endpoint, credential=key, connection_verify=False)
+            database = await self._client.create_database_if_not_exists(id=database_name)
+            self.container = await database.create_container_if_not_exists(
+                id=container_name,
+                partition_key=PartitionKey(path="/session_id"),
+                offer_throughput=400,
+            )
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        if self._client:
+            await self._client.close()
+            self._client = None
+
+    def save(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        """Queue the messages of a session that have not been persisted yet. Never blocks."""
+        messages = list(messages)
+        start = self._queued_counts.get(session_id, self._persisted_counts.get(session_id, 0))
+        if len(messages) < start:
+            # A shorter history than stored: the session was restarted under the same id, so save it from the start
+            start = 0
+            self._set_persisted(session_id, 0)
+        queued = start
+        for seq, message_dict in enumerate(messages_to_dict(messages[start:]), start=start):
+            item = {"id": f"{session_id}:{seq:08d}", "session_id": session_id, "seq": seq, "message": message_dict}
+            try:
+                self._queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self.dropped_items += len(messages) - seq # The rest is queued again by the next save
+                break
+            queued = seq + 1
+        if queued > self._persisted_counts.get(session_id, 0):
+            self._queued_counts[session_id] = queued
+        else:
+            self._queued_counts.pop(session_id, None)
+
+    def _set_persisted(self, session_id: str, count: int) -> None:
+        self._persisted_counts[session_id] = count
+        self._persisted_counts.move_to_end(session_id)
+        while len(self._persisted_counts) > self.max_sessions:
+            self._persisted_counts.popitem(last=False)
+
+    async def load(self, session_id: str) -> list[BaseMessage]:
+        items = self.container.query_items(
+            query="SELECT * FROM c WHERE c.session_id = @session_id ORDER BY c.seq",
+            parameters=[{"name": "@session_id", "value": session_id}],
+            partition_key=session_id,
+        )
+        message_dicts = [item["message"] async for item in items]
+        self._set_persisted(session_id, len(message_dicts))
+        return messages_from_dict(message_dicts)
+
+    async def flush(self) -> int:
+        """Write everything queued so far, one transactional batch per session. Returns the number of items written."""
+        queued: dict[str, dict[int, dict[str, Any]]] = defaultdict(dict)
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            queued[item["session_id"]][item["seq"]] = item # A message queued again after a failure is written once
+        pending = {session_id: [items[seq] for seq in sorted(items)] for session_id, items in queued.items()}
+
+        async def write_batch(session_id: str, chunk: list[dict[str, Any]]) -> bool:
+            async with self._batch_slots:
+                try:
+                    await self.container.execute_item_batch(
+                        batch_operations=[("upsert", (item,)) for item in chunk],
+                        partition_key=session_id,
+                    )
+                    return True
+                except Exception as e:
+                    print(f"Error flushing {len(chunk)} messages for session '{session_id}' to Cosmos DB: {e}")
+                    return False
+
+        # Sessions are independent partitions, so their batches go out concurrently
+        chunks = [
+            (session_id, items[i:i + MAX_BATCH_OPERATIONS])
+            for session_id, items in pending.items()
+            for i in range(0, len(items), MAX_BATCH_OPERATIONS)
+        ]
+        results = await asyncio.gather(*(write_batch(session_id, chunk) for session_id, chunk in chunks))
+
+        failed = set()
+        for (session_id, chunk), ok in zip(chunks, results):
+            persisted = self._persisted_counts.get(session_id, 0)
+            if not ok:
+                failed.add(session_id)
+            elif session_id not in failed and chunk[0]["seq"] <= persisted:
+                # Only a written run of messages from the start counts, so gaps are never skipped
+                self._set_persisted(session_id, max(persisted, chunk[-1]["seq"] + 1))
+        for session_id in pending:
+            if session_id in failed or self._queued_counts.get(session_id, 0) <= self._persisted_counts.get(session_id, 0):
+                self._queued_counts.pop(session_id, None) # Failed: the next save queues the unwritten messages again
+        return sum(len(chunk) for (_, chunk), ok in zip(chunks, results) if ok)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_s)
+            await self.flush()
+
+
+if __name__ == "__main__":
+    # Round-trip a conversation through the Cosmos emulator
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    import urllib3
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    async def main() -> None:
+        store = CosmosConversationStore()
+        await store.start()
+        store.save("demo-session", [HumanMessage(content="What is 27 plus 35?"), AIMessage(content="The result is: 62.")])
+        await store.close()
+        print("Conversation saved successfully.")
+
+        store = CosmosConversationStore()
+        await store.start()
+        print("Conversation read successfully:")
+        for message in await store.load("demo-session"):
+            print(f"{type(message).__name__}: {message.content}")
+        await store.close()
+
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import PrivateAttr
+
+from orders import ORDER_ID_PATTERN
+from prompt_corpus import TEST_CASES
+
+# --- Fake Model Settings ---
+FAKE_LLM_TOKENS_PER_S = float(os.getenv("FAKE_LLM_TOKENS_PER_S", "50"))
+FAKE_LLM_TTFT_S = float(os.getenv("FAKE_LLM_TTFT_S", "0.2"))
+FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0.1")) # Each delay varies by up to +/- this fraction
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+_TOKEN = re.compile(r"\s*\S{1,4}|\s+") # Roughly 4 characters per token, like the real tokenizer on English
+_ROLE = re.compile(r"^(System|Human|AI|Tool): ", re.MULTILINE) # Prefixes written by get_buffer_string
+_NUMBER = re.compile(r"-?\d+")
+_MATH_WORDS = {"add": ("plus", "sum", "add"), "subtract": ("minus", "subtract", "take away"), "multiply": ("times", "multiplied", "multiply")}
+
+_CORPUS = {case["prompt"].strip().lower(): case for case in TEST_CASES}
+
+ASK_FOR_ORDER_ID = "To help you with your order, could you please provide the specific order ID?"
+DEFAULT_REPLY = "Hello! How can I help you today?"
+SUMMARY_REPLY = "The user asked for calculations and order lookups and the assistant answered with the tool results."
+
+
+def split_tokens(text: str) -> list[str]:
+    return _TOKEN.findall(text)
+
+
+def action_text(calls: list[tuple[str, dict]]) -> str:
+    return "\n".join(f"Action: {name}\nAction Input: {json.dumps(args)}" for name, args in calls)
+
+
+def last_turn(prompt: str) -> tuple[str | None, list[str]]:
+    """Role of the last rendered message and the contents of the trailing messages with that role."""
+    matches = list(_ROLE.finditer(prompt))
+    if not matches:
+        return None, []
+    blocks = [(m.group(1), prompt[m.end():matches[i + 1].start() if i + 1 < len(matches) else len(prompt)].strip())
+              for i, m in enumerate(matches)]
+    role = blocks[-1][0]
+    contents = []
+    for block_role, content in reversed(blocks):
+        if block_role != role:
+            break
+        contents.insert(0, content)
+    return role, contents
+
+
+def scripted_reply(prompt: str) -> str:
+    """
+    What the agent's model would plausibly answer, following the text tool protocol: labelled corpus
+    prompts get their expected tool call, other questions are matched with a few keyword rules, and
+    tool results are stated back.
+    """
+    role, contents = last_turn(prompt)
+    if role == "Tool":
+        return "\n".join(f"The result is: {c}." if _NUMBER.fullmatch(c) else c for c in contents)
+    if role != "Human":
+        return SUMMARY_REPLY # e.g. the context summarizer's prompt, which has no role prefixes
+
+    question = contents[-1]
+    case = _CORPUS.get(question.strip().lower())
+    if case is not None:
+        return action_text([(case["tool"], case["args"])]) if case["tool"] else _no_tool_reply(question)
+
+    calls = []
+    lowered = question.lower()
+    numbers = [int(n) for n in _NUMBER.findall(question)]
+    for name, words in _MATH_WORDS.items():
+        if len(numbers) >= 2 and any(word in lowered for word in words):
+            calls.append((name, {"x": numbers[0], "y": numbers[1]}))
+            break
+    calls += [("search_orders", {"query": order_id}) for order_id in ORDER_ID_PATTERN.findall(question)]
+    return action_text(calls) if calls else _no_tool_reply(question)
+
+
+def _no_tool_reply(question: str) -> str:
+    if any(word in question.lower() for word in ("order", "package", "purchase", "shipment")):
+        return ASK_FOR_ORDER_ID
+    return DEFAULT_REPLY
+
+
+class FakeOllamaLLM(LLM):
+    """
+    Drop-in stand-in for OllamaLLM with no server: streams a scripted reply token by token after
+    `ttft_s`, at `tokens_per_s`. With `responses` set it cycles through those texts instead of using
+    `scripted_reply`. Delays get seeded jitter, keyed on the prompt, so the same prompt always
+    streams with the same timing however many calls run concurrently.
+    """
+
+    responses: list[str] | None = None
+    tokens_per_s: float = FAKE_LLM_TOKENS_PER_S
+    ttft_s: float = FAKE_LLM_TTFT_S
+    jitter: float = FAKE_LLM_JITTER
+    seed: int = FAKE_LLM_SEED
+    _calls: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-ollama"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"tokens_per_s": self.tokens_per_s, "ttft_s": self.ttft_s, "seed": self.seed}
+
+    def _reply(self, prompt: str, stop: list[str] | None) -> str:
+        if self.responses:
+            reply = self.responses[self._calls % len(self.responses)]
+        else:
+            reply = scripted_reply(prompt)
+        self._calls += 1
+        for stop_sequence in stop or []:
+            reply = reply.split(stop_sequence, 1)[0]
+        return reply
+
+    def _plan(self, prompt: str, stop: list[str] | None) -> list[tuple[float, str]]:
+        """(delay before the token, token) for the whole reply."""
+        rng = random.Random(f"{self.seed}:{prompt}")
+        vary = lambda delay: max(0.0, delay * (1 + rng.uniform(-self.jitter, self.jitter)))
+        tokens = split_tokens(self._reply(prompt, stop)) or [""]
+        token_delay = 1 / self.tokens_per_s if self.tokens_per_s > 0 else 0.0
+        return [(vary(self.ttft_s if i == 0 else token_delay), token) for i, token in enumerate(tokens)]
+
+    def _call(self, prompt: str, stop: list[str] | None = None, run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+    async def _acall(self, prompt: str, stop: list[str] | None = None, run_manager: AsyncCallbackManagerForLLMRun | None = None, **kwargs: Any) -> str:
+        return "".join([chunk.text async for chunk in self._astream(prompt, stop, run_manager, **kwargs)])
+
+    def _stream(self, prompt: str, stop: list[str] | None = None, run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        for delay, token in self._plan(prompt, stop):
+            time.sleep(delay)
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, prompt: str, stop: list[str] | None = None, run_manager: AsyncCallbackManagerForLLMRun | None = None, **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        for delay, token in self._plan(prompt, stop):
+            await asyncio.sleep(delay)
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -0,0 +1,183 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage
+from prometheus_client import Counter
+
+from orders import ORDER_ID_PATTERN
+from response_cache import cosine, hashed_ngram_embedding
+
+# --- Fast Path Settings ---
+# Unambiguous user turns (plain arithmetic, one order ID, greetings, thanks, unsupported requests) are answered
+# without the model: the router picks the tool call or reply, and tool_answers.py states the tool results
+FAST_PATH = os.getenv("FAST_PATH", "1") == "1"
+FAST_PATH_MIN_SIMILARITY = float(os.getenv("FAST_PATH_MIN_SIMILARITY", "0.5")) # Classifier: cosine to the nearest example
+FAST_PATH_MIN_MARGIN = float(os.getenv("FAST_PATH_MIN_MARGIN", "0.1")) # ... and its lead over the best other intent
+
+FAST_PATH_ROUTES = Counter("fast_path_routes_total", "User turns seen by the fast-path router, by intent (\"none\" = passed to the model) and how it matched.", ["intent", "matched_by"])
+FAST_PATH_TURNS_SAVED = Counter("fast_path_model_turns_saved_total", "Model turns the fast path answered instead.", ["intent"])
+FAST_PATH_SECONDS_SAVED = Counter("fast_path_seconds_saved_total", "Estimated model time saved: skipped model turns times the mean model call time.", ["intent"])
+
+# Replies the system prompt prescribes, so fast-path answers read like the model's
+ASK_FOR_ORDER_ID = "To help you with your order, could you please provide the specific order ID?"
+NO_TOOL_REPLY = "I'm sorry, I cannot perform that action as I don't have the required tool."
+REPLIES = {
+    "greeting": "Hello! How can I help you today?",
+    "thanks": "You're welcome! Let me know if there's anything else I can help with.",
+    "unsupported": NO_TOOL_REPLY,
+    "order_no_id": ASK_FOR_ORDER_ID,
+}
+
+_N = r"(-?\d+)(?![\d.,]\d)" # Integers only: the math tools take ints
+_PREFIX = r"(?:(?:ok|okay|so|hey|hi|please),?\s+)?(?:(?:what(?:'s| is)|calculate|compute|work out|how much is|tell me|can you (?:tell me|calculate|compute|work out))\s+)?(?:the\s+)?"
+_SUFFIX = r"(?:,?\s*(?:please|thanks|thank you))?\s*[?.!]*"
+# (tool, body, whether the body names y before x)
+_MATH_BODIES = [
+    ("add", rf"{_N}\s*(?:plus|\+)\s*{_N}", False),
+    ("add", rf"sum\s+of\s+{_N}\s+and\s+{_N}", False),
+    ("add", rf"add\s+{_N}\s+(?:and|to|plus)\s+{_N}", False),
+    ("subtract", rf"{_N}\s*(?:minus|-)\s*{_N}", False),
+    ("subtract", rf"subtract\s+{_N}\s+from\s+{_N}", True),
+    ("multiply", rf"{_N}\s*(?:times|multiplied\s+by|\*|×)\s*{_N}", False),
+    ("multiply", rf"multiply\s+{_N}\s+(?:by|and|with|times)\s+{_N}", False),
+    ("multiply", rf"product\s+of\s+{_N}\s+and\s+{_N}", False),
+]
+_MATH_PATTERNS = [(tool, re.compile(_PREFIX + body + _SUFFIX, re.IGNORECASE), swapped) for tool, body, swapped in _MATH_BODIES]
+_GREETING = re.compile(r"(?:hi|hello|hey|good (?:morning|afternoon|evening))(?: there)?[!.]*", re.IGNORECASE)
+_THANKS = re.compile(
+    r"(?:(?:ok|okay|great|that's great|perfect|awesome|cool),?\s*)?(?:thanks|thank you)(?: (?:so much|a lot|very much))?"
+    r"(?: for (?:the|your) (?:help|information|info|answer))?[!.]*",
+    re.IGNORECASE,
+)
+_UNSUPPORTED_MATH = re.compile(r"\b(?:divided by|divide|division|square root|sqrt|to the power|percent of|modulo)\b", re.IGNORECASE)
+
+# Plain lookups of one order, matched against the whole message with the ID replaced by "<id>"; anything else about an
+# order (why it was late, what to do about it, who shipped it) needs the model, not a restated search result
+_ORDER_REF = r"(?:my\s+)?(?:order(?:\s+(?:id|number))?\s*[:#]?\s*)?<id>"
+_ORDER_INFO = r"(?:the\s+)?(?:status|details|order\s+details|tracking(?:\s+info(?:rmation)?)?)"
+_LOOKUP_BODIES = [
+    rf"(?:find|look\s*up|check(?:\s+on)?|search(?:\s+for)?|track|get|show(?:\s+me)?|pull\s+up|give\s+me)\s+(?:{_ORDER_INFO}\s+(?:of|for|on)\s+)?{_ORDER_REF}",
+    rf"(?:(?:what(?:'s|\s+is)|tell\s+me)\s+)?{_ORDER_INFO}\s+(?:of|for|on)\s+{_ORDER_REF}",
+    rf"where(?:'s|\s+is)\s+{_ORDER_REF}",
+    rf"{_ORDER_REF}\s+(?:status|details)",
+]
+_ORDER_LOOKUP = re.compile(
+    r"(?:(?:ok|okay|so|hey|hi|please),?\s+)?(?:(?:can|could)\s+you\s+(?:please\s+)?|please\s+|i\s+(?:need|want|would\s+like)(?:\s+you\s+to)?\s+)?"
+    rf"(?:{'|'.join(_LOOKUP_BODIES)})(?:\s+for\s+me)?" + _SUFFIX,
+    re.IGNORECASE,
+)
+_DIGIT = re.compile(r"\d")
+_SENTENCE = re.compile(r"[^.?!]+[.?!]*")
+# Words that mean more than one task, another operation or a change to an order: the model decides those
+_OTHER_TASK = re.compile(
+    r"\b(?:add|plus|sum|minus|subtract|times|multipl\w*|divide\w*|also|then|and then|as well|not|don't|instead|"
+    r"cancel\w*|change|refund|return|update|modify|delete|address)\b",
+    re.IGNORECASE,
+)
+
+# Classifier examples for the intents without arguments; "other" holds requests that look close but need the model.
+# None of these are from prompt_corpus.py, which is the validation set (bench_fast_path.py).
+EXAMPLES = {
+    "order_no_id": [
+        "where is my order", "has my package shipped yet", "what's happening with my delivery", "can you track my parcel",
+        "check on my last purchase", "find my order for me", "what's the status of my shipment", "look up my most recent order",
+        "when will my stuff arrive", "search for my order", "i want to check on an order", "any news about my purchase",
+    ],
+    "unsupported": [
+        "what's the weather like today", "what time is it", "what is the date today", "what's the temperature outside",
+        "book a flight for me", "send an email to my boss", "what's in the news today", "set a reminder for tomorrow",
+        "how hot is it in london", "what day of the week is it",
+    ],
+    "greeting": ["hi", "hey there", "good morning", "hello, how are you", "hello there"],
+    "thanks": ["thanks a lot", "thank you so much", "cheers, that helps", "great, thank you", "thanks for your help"],
+    "other": [
+        "i have a question", "can you help me with something", "what can you do", "explain how you work",
+        "add these numbers for me", "do some math", "figure out what i need", "use a tool", "multiply them",
+        "what is the result", "i need help with my account", "cancel my order", "change my delivery address",
+        "i want a refund", "tell me about yourself", "summarize our conversation",
+    ],
+}
+_EXAMPLE_VECTORS = [(intent, hashed_ngram_embedding(text)) for intent, texts in EXAMPLES.items() for text in texts]
+
+
+@dataclass(frozen=True)
+class Route:
+    """What the router decided for a user turn: the tool calls to run, or a reply."""
+
+    intent: str
+    matched_by: str # "pattern" or "classifier"
+    tool_calls: list[tuple[str, dict[str, Any]]] = field(default_factory=list)
+    reply: str | None = None
+
+
+def classify(text: str) -> tuple[str, float, float]:
+    """Nearest-example intent: (intent, cosine similarity, margin over the best example of another intent)."""
+    vector = hashed_ngram_embedding(text)
+    best: dict[str, float] = {}
+    for intent, example in _EXAMPLE_VECTORS:
+        best[intent] = max(best.get(intent, 0.0), cosine(vector, example))
+    ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+    (intent, score), runner_up = ranked[0], ranked[1][1] if len(ranked) > 1 else 0.0
+    return intent, score, score - runner_up
+
+
+def _math_route(text: str) -> Route | None:
+    # The numbers must all be in one sentence that is nothing but the calculation; other sentences are context without tasks
+    sentences = [s.strip() for s in _SENTENCE.findall(text) if s.strip()]
+    with_numbers = [s for s in sentences if _DIGIT.search(s)]
+    if len(with_numbers) != 1 or any(_OTHER_TASK.search(s) for s in sentences if s is not with_numbers[0]):
+        return None
+    for tool, pattern, swapped in _MATH_PATTERNS:
+        match = pattern.fullmatch(with_numbers[0])
+        if match:
+            x, y = int(match.group(1)), int(match.group(2))
+            return Route(tool, "pattern", tool_calls=[(tool, {"x": y, "y": x} if swapped else {"x": x, "y": y})])
+    return None
+
+
+def _order_route(text: str) -> Route | None:
+    # Exactly one order ID, in a message that is nothing but a request to look it up
+    order_ids = ORDER_ID_PATTERN.findall(text)
+    if len(order_ids) != 1 or not _ORDER_LOOKUP.fullmatch(text.replace(order_ids[0], "<id>")):
+        return None
+    return Route("search_orders", "pattern", tool_calls=[("search_orders", {"query": order_ids[0]})])
+
+
+def route_text(text: str) -> Route | None:
+    """The fast-path route for one user message, or None when the model should handle it."""
+    text = text.strip()
+    if not text:
+        return None
+    route = _math_route(text) or _order_route(text)
+    if route:
+        return route
+    if _GREETING.fullmatch(text):
+        return Route("greeting", "pattern", reply=REPLIES["greeting"])
+    if _THANKS.fullmatch(text):
+        return Route("thanks", "pattern", reply=REPLIES["thanks"])
+    if _UNSUPPORTED_MATH.search(text) and not ORDER_ID_PATTERN.search(text):
+        return Route("unsupported", "pattern", reply=NO_TOOL_REPLY)
+    # No arguments to extract from here on: anything with numbers or IDs needs the model
+    if _DIGIT.search(text):
+        return None
+    intent, score, margin = classify(text)
+    if intent != "other" and score >= FAST_PATH_MIN_SIMILARITY and margin >= FAST_PATH_MIN_MARGIN:
+        return Route(intent, "classifier", reply=REPLIES[intent])
+    return None
+
+
+def route_turn(messages: Sequence[BaseMessage]) -> Route | None:
+    """Routes the latest user message; counts the decision on /metrics."""
+    last = messages[-1] if messages else None
+    if not isinstance(last, HumanMessage) or not isinstance(last.content, str):
+        return None
+    route = route_text(last.content)
+    FAST_PATH_ROUTES.labels(intent=route.intent if route else "none", matched_by=route.matched_by if route else "none").inc()
+    return route
+
+
+def record_saved(route: Route, model_turns: int, mean_model_call_s: float) -> None:
+    FAST_PATH_TURNS_SAVED.labels(intent=route.intent).inc(model_turns)
+    FAST_PATH_SECONDS_SAVED.labels(intent=route.intent).inc(model_turns * mean_model_call_s)
@@ -0,0 +1,25 @@
+# Writes synthetic order data for the order repository (orders.py): SAMPLE_ORDERS plus --rows random orders.
+#   python generate_orders.py [--rows 1000000] [--seed 0] [--out orders.sqlite | orders.jsonl]
+# A .sqlite file is read with ORDERS_BACKEND=sqlite ORDERS_SQLITE_PATH=..., a .jsonl file with ORDERS_FILE=...
+
+import argparse
+import time
+
+from orders import synthetic_orders, write_jsonl, write_sqlite
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic orders")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="orders.sqlite")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    write = write_jsonl if args.out.endswith(".jsonl") else write_sqlite
+    count = write(args.out, synthetic_orders(args.rows, args.seed))
+    print(f"Wrote {count} orders to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main_cli()
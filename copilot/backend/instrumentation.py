@@ -0,0 +1,189 @@
+import asyncio
+import functools
+import inspect
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Iterator
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler, BaseCallbackManager
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+from prometheus_client import Counter, Histogram
+
+# --- Instrumentation Settings ---
+# Path of a JSON-lines file for OpenTelemetry spans (needs opentelemetry-sdk); empty = Prometheus metrics only
+OTEL_SPANS_FILE = os.getenv("OTEL_SPANS_FILE", "")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+NODE_DURATION = Histogram("graph_node_duration_seconds", "Wall time of one graph node or routing function run.", ["node"], buckets=LATENCY_BUCKETS)
+NODE_ERRORS = Counter("graph_node_errors_total", "Graph node runs that raised.", ["node"])
+LLM_DURATION = Histogram("llm_call_duration_seconds", "Wall time of one model call, by the node that made it.", ["node"], buckets=LATENCY_BUCKETS)
+LLM_TTFT = Histogram("llm_time_to_first_token_seconds", "Time from the model call to its first streamed token.", ["node"], buckets=LATENCY_BUCKETS)
+LLM_TOKENS = Counter("llm_tokens_total", "Prompt (in) and generated (out) tokens, by the node that made the call.", ["node", "direction"])
+LLM_TOKENS_SAVED = Counter("llm_tokens_saved_total", "Estimated tokens not generated because a model call was cut short (client gone, or the stream stopped early).", ["node", "reason"])
+TOOL_DURATION = Histogram("tool_call_duration_seconds", "Wall time of one tool call.", ["tool", "status"], buckets=LATENCY_BUCKETS)
+
+
+def _open_tracer(path: str) -> Any:
+    if not path:
+        return None
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    except ImportError:
+        print("OTEL_SPANS_FILE is set but opentelemetry-sdk is not installed; spans are disabled.")
+        return None
+    # Own provider instead of the global one; it flushes the batch processor at interpreter exit
+    provider = TracerProvider(resource=Resource.create({"service.name": "copilot-backend"}))
+    exporter = ConsoleSpanExporter(out=open(path, "a", encoding="utf-8"), formatter=lambda span: span.to_json(indent=None) + "\n")
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    return provider.get_tracer("copilot.backend")
+
+
+tracer = _open_tracer(OTEL_SPANS_FILE)
+
+
+class GraphMetricsHandler(AsyncCallbackHandler):
+    """
+    Turns model and tool callbacks into metrics (and spans), labelled with the graph node they ran in.
+    Token counts come from Ollama's prompt_eval_count / eval_count when the call finishes normally;
+    a stream closed early falls back to the streamed chunk count and a characters/4 prompt estimate.
+    Tokens saved by a call cut short are estimated from the node's mean completed output length.
+    """
+
+    def __init__(self) -> None:
+        self._runs: dict[UUID, dict[str, Any]] = {}
+        self._completed: dict[str, tuple[int, int]] = {} # node -> (calls, tokens out) of completed calls
+
+    def _start(self, run_id: UUID, kind: str, label: str, **extra: Any) -> None:
+        span = tracer.start_span(f"{kind} {label}") if tracer else None
+        self._runs[run_id] = {"label": label, "start": time.perf_counter(), "span": span, **extra}
+
+    async def on_llm_start(self, serialized: dict[str, Any], prompts: list[str], *, run_id: UUID, metadata: dict[str, Any] | None = None, **kwargs: Any) -> None:
+        node = (metadata or {}).get("langgraph_node", "unknown")
+        self._start(run_id, "llm", node, first_token=None, tokens_out=0, tokens_in=sum(len(p) for p in prompts) // 4)
+
+    async def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.get(run_id)
+        if run is None:
+            return
+        if run["first_token"] is None:
+            run["first_token"] = time.perf_counter()
+        run["tokens_out"] += 1 # Ollama streams one token per chunk
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        info = (generation.generation_info or {}) if generation else {}
+        self._finish_llm(run_id, info.get("prompt_eval_count"), info.get("eval_count"), completed=True)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        # A cancelled graph run (client disconnected) or a stream closed early (GeneratorExit) also ends up here
+        if isinstance(error, asyncio.CancelledError):
+            self._finish_llm(run_id, None, None, cut_short="cancelled")
+        elif isinstance(error, GeneratorExit):
+            self._finish_llm(run_id, None, None, cut_short="early_stop")
+        else:
+            self._finish_llm(run_id, None, None)
+
+    def _finish_llm(self, run_id: UUID, tokens_in: int | None, tokens_out: int | None, completed: bool = False, cut_short: str | None = None) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        node, end = run["label"], time.perf_counter()
+        tokens_in = tokens_in if tokens_in is not None else run["tokens_in"]
+        tokens_out = tokens_out if tokens_out is not None else run["tokens_out"]
+        calls, total_out = self._completed.get(node, (0, 0))
+        if completed:
+            self._completed[node] = (calls + 1, total_out + tokens_out)
+        elif cut_short and calls:
+            LLM_TOKENS_SAVED.labels(node=node, reason=cut_short).inc(max(0, total_out / calls - tokens_out))
+        LLM_DURATION.labels(node=node).observe(end - run["start"])
+        if run["first_token"] is not None:
+            LLM_TTFT.labels(node=node).observe(run["first_token"] - run["start"])
+        LLM_TOKENS.labels(node=node, direction="in").inc(tokens_in)
+        LLM_TOKENS.labels(node=node, direction="out").inc(tokens_out)
+        if run["span"]:
+            run["span"].set_attributes({"llm.tokens_in": tokens_in, "llm.tokens_out": tokens_out})
+            if run["first_token"] is not None:
+                run["span"].set_attribute("llm.ttft_s", run["first_token"] - run["start"])
+            run["span"].end()
+
+    async def on_tool_start(self, serialized: dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "tool", serialized.get("name") or kwargs.get("name") or "unknown")
+
+    async def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish_tool(run_id, "ok")
+
+    async def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish_tool(run_id, "error")
+
+    def _finish_tool(self, run_id: UUID, status: str) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        TOOL_DURATION.labels(tool=run["label"], status=status).observe(time.perf_counter() - run["start"])
+        if run["span"]:
+            run["span"].set_attribute("tool.status", status)
+            run["span"].end()
+
+
+metrics_handler = GraphMetricsHandler()
+
+
+def with_metrics(config: RunnableConfig) -> RunnableConfig:
+    """Copy of `config` whose callbacks include `metrics_handler` (inherited by the calls made with it)."""
+    callbacks = config.get("callbacks")
+    if isinstance(callbacks, BaseCallbackManager):
+        if metrics_handler in callbacks.handlers:
+            return config
+        callbacks = callbacks.copy()
+        callbacks.add_handler(metrics_handler, inherit=True)
+    elif metrics_handler not in (callbacks or []):
+        callbacks = [*(callbacks or []), metrics_handler]
+    return {**config, "callbacks": callbacks}
+
+
+@contextmanager
+def _observe_node(name: str, config: RunnableConfig | None) -> Iterator[None]:
+    start = time.perf_counter()
+    # Spans of one turn share the session id (thread_id), which ties them together in the span file
+    thread_id = str(((config or {}).get("configurable") or {}).get("thread_id", ""))
+    with tracer.start_as_current_span(f"node {name}", attributes={"session.id": thread_id}) if tracer else nullcontext():
+        try:
+            yield
+        except BaseException:
+            NODE_ERRORS.labels(node=name).inc()
+            raise
+        finally:
+            NODE_DURATION.labels(node=name).observe(time.perf_counter() - start)
+
+
+def instrument_node(name: str, func: Callable) -> Callable:
+    """
+    Wraps a node or routing function for a StateGraph: times every run and hands `metrics_handler` to
+    the model and tool calls made with the node's config. The wrapper keeps the signature (via
+    functools.wraps), so LangGraph still passes `config` to functions that accept it.
+
+        workflow.add_node("agent", instrument_node("agent", model_call_node))
+    """
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            if kwargs.get("config") is not None:
+                kwargs["config"] = with_metrics(kwargs["config"])
+            with _observe_node(name, kwargs.get("config")):
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if kwargs.get("config") is not None:
+            kwargs["config"] = with_metrics(kwargs["config"])
+        with _observe_node(name, kwargs.get("config")):
+            return func(*args, **kwargs)
+    return wrapper
@@ -1,44 +1,85 @@
-import re
-import json
-from typing import Annotated, Sequence, Any, TypedDict
-
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+import os
+import asyncio
+import socket
+import uuid
+import weakref
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import asdict
+from typing import Annotated, Callable, Sequence, Any, TypedDict
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, generate_latest
 
-from langchain_core.messages import BaseMessage, ToolMessage, SystemMessage, AIMessage, HumanMessage, AIMessageChunk
+from langchain_core.messages import BaseMessage, ToolMessage, AIMessage, HumanMessage, AIMessageChunk
+from langchain_core.messages.utils import get_buffer_string
+from langchain_core.callbacks import AsyncCallbackManager
 from langchain_core.runnables import RunnableConfig # Added
+from langchain_ollama import ChatOllama
 from langchain_ollama.llms import OllamaLLM
 from langchain_core.tools import tool
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, END
+from langgraph.config import get_config
+from langgraph.types import StreamWriter
+
+from checkpointer import CHECKPOINTER_BACKEND, open_checkpointer
+from cosmos import CosmosConversationStore
+from context import ContextManager, extractive_summarizer
+from tool_calling import NativeToolAdapter, TextProtocolAdapter
+from tool_cache import cached, use_shared_store
+from response_cache import ResponseCache
+from prompt_assembly import ollama_model_options
+from model_client import ModelClientManager, OLLAMA_BASE_URL
+from fake_llm import FakeOllamaLLM
+from instrumentation import instrument_node
+from sse import TokenCoalescer, sse_frame
+from scheduler import QueueFull, scheduler_for, share_admissions
+from shared_store import open_store
+from orders import NO_ORDER_ID, OrderRepository, format_order, normalize_order_id, open_order_repository, order_not_found
+from fast_path import FAST_PATH, record_saved, route_turn
+from tool_answers import TOOL_ANSWER_TEMPLATES, templated_answer
+from speculation import PREDICTORS, SPECULATIVE_TOOLS, Speculator
+from budget import budget_frame, exhausted_limit, exhausted_message, generated_tokens, limits_for, observe_finished, usage_for_turn
 
 # --- Agent State Definition ---
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
+    summary: str # Rolling summary of the turns that fell out of the context window
+    summarized_count: int # How many leading messages the summary covers
+    budget: dict[str, Any] # What the current request has used so far (see budget.py)
 
 # --- Tool Definitions ---
+TOOL_CACHE_MAX_SIZE = int(os.getenv("TOOL_CACHE_MAX_SIZE", "1024"))
+ORDER_CACHE_TTL_S = float(os.getenv("ORDER_CACHE_TTL_S", "30"))
+order_repository: OrderRepository | None = None # Opened once in lifespan (ORDERS_BACKEND, see orders.py)
+
 @tool
+@cached(max_size=TOOL_CACHE_MAX_SIZE) # Pure function: cached until evicted
 async def add(x: int, y: int) -> int:
     """This is an addition function that adds two numbers together."""
     # print(f"TOOL EXECUTING: add(x={x}, y={y})") # Replaced by stream events
     return x + y
 
 @tool
+@cached(max_size=TOOL_CACHE_MAX_SIZE) # Pure function: cached until evicted
 async def subtract(x: int, y: int) -> int:
     """This is an subtraction function that subtracts two numbers from each other."""
     # print(f"TOOL EXECUTING: subtract(x={x}, y={y})") # Replaced by stream events
     return x - y
 
 @tool
+@cached(max_size=TOOL_CACHE_MAX_SIZE) # Pure function: cached until evicted
 async def multiply(x: int, y: int) -> int:
     """This is an multiplication function that multiplies two numbers from each other."""
     # print(f"TOOL EXECUTING: multiply(x={x}, y={y})") # Replaced by stream events
     return x * y
 
 @tool
+@cached(max_size=TOOL_CACHE_MAX_SIZE, ttl_s=ORDER_CACHE_TTL_S) # Order status changes, so entries expire
 async def search_orders(query: str) -> str:
     """
     Searches for order details by a specific order identification (e.g., order ID).
@@ -46,36 +87,33 @@ async def search_orders(query: str) -> str:
     The query parameter MUST be the order ID.
     """
     # print(f"TOOL EXECUTING: search_orders(query='{query}')") # Replaced by stream events
-    mock_db = {
-        "ORD12345": "Order details for 'ORD12345': Status: Shipped, Items: 1x SuperWidget, Delivery Est: Tomorrow. (Source: OMS)",
-        "XYZ987": "Order details for 'XYZ987': Status: Processing, Items: 1x HyperGadget. (Source: OMS)",
-        "TEST001": "Order details for 'TEST001': Status: Delivered, Items: 1x Sample Product. (Source: OMS)",
-    }
-    if query and query.strip():
-        clean_query = query.strip().upper()
-        if clean_query in mock_db:
-            return mock_db[clean_query]
-        else:
-            return f"Order ID '{query}' not found. Please verify the order ID and try again. (Source: OMS)"
-    else:
-        return "No order ID provided for search. Please provide a specific order ID. (Source: OMS)"
+    if not (query and query.strip()):
+        return NO_ORDER_ID
+    order_id = normalize_order_id(query)
+    order = (await order_repository.get_many([order_id])).get(order_id)
+    return format_order(order) if order else order_not_found(query)
 
 tools_list = [add, subtract, multiply, search_orders]
 
 # --- Model Initialization ---
 model_name = "llama3.2:3b-instruct-fp16" # doer model
 # model_name = "granite3.2:8b" # judge model (as per your objective, but not used in current graph)
-ollama_model = None
-
-try:
-    ollama_model = OllamaLLM(model=model_name, temperature=0.0)
-    ollama_model.invoke("test connection to ensure Ollama is running") # Test connection
-    print(f"Successfully connected to Ollama with model {model_name}")
-except Exception as e:
-    print(f"Error initializing OllamaLLM with {model_name}: {e}")
-    print("Please ensure Ollama is running and the model is downloaded (e.g., via 'ollama pull llama3.2:3b-instruct-fp16').")
-    print("Exiting due to model initialization failure.")
-    exit()
+# "fake" streams scripted replies without Ollama (see fake_llm.py), for load and latency tests of the graph and SSE layers
+LLM_BACKEND = os.getenv("LLM_BACKEND", "ollama")
+
+if LLM_BACKEND == "fake":
+    ollama_model = FakeOllamaLLM()
+    model_client = None
+else:
+    # No call at import time: the lifespan opens a pooled client, checks /api/tags and warms the model in the background
+    ollama_model = OllamaLLM(model=model_name, temperature=0.0, base_url=OLLAMA_BASE_URL, **ollama_model_options())
+    model_client = ModelClientManager(model_name)
+
+# Every model call takes a slot from the model's scheduler: at most MODEL_MAX_CONCURRENCY run at once, the rest queue fairly per session
+model_scheduler = scheduler_for(model_name)
+
+def session_of(config: RunnableConfig) -> str:
+    return str((config.get("configurable") or {}).get("thread_id", ""))
 
 # --- LangGraph Node Definitions ---
 SYSTEM_PROMPT_CONTENT = """
@@ -88,10 +126,11 @@ You are a precise assistant. You MUST use tools for calculations and order searc
    - Examples:
      - Math (`add`, `subtract`, `multiply`): `Action Input: {"x": number1, "y": number2}`
      - Order Search (`search_orders`): `Action Input: {"query": "ORDER_ID_STRING"}`
+   - Several tasks that each need a tool: write one `Action:` / `Action Input:` pair per task, one after another, in the same response.
 
 **2. After Tool Result (CRITICAL `ToolMessage` Handling - OVERRIDES OTHER RULES):**
-   - **If the last message is a `ToolMessage` (a tool has just run):**
-     a. **Your ONLY Response: State Tool Output Directly.**
+   - **If the last message is a `ToolMessage` (one or more tools have just run):**
+     a. **Your ONLY Response: State Each Tool Output Directly.**
         - Math (`add`, `subtract`, `multiply`): "The result is: [content directly from ToolMessage]."
         - `search_orders` (any outcome: success, 'not found', 'no ID'): Relay the exact content from the `ToolMessage`.
         - Tool Execution Error: "The tool reported an error: [content directly from ToolMessage]."
@@ -106,113 +145,324 @@ You are a precise assistant. You MUST use tools for calculations and order searc
    - Use ONLY for specific calculation requests where the user provides ALL necessary numbers. The JSON input MUST use `x` and `y` as parameter names.
 
 **5. General Conduct & Unsupported Actions:**
-   - **One Task First:** If a user's request contains multiple distinct tasks, address only the first clear and actionable one in your immediate response.
+   - **All Tasks At Once:** If a user's request contains multiple distinct tasks, issue the tool calls for all clear and actionable ones together in your immediate response (see Rule 1).
    - **No Tool For Chat:** For simple greetings, acknowledgments, or general questions where no specific tool is needed or applicable, respond politely without invoking any tools.
    - **Unavailable Tools/Operations:** If the user asks for an operation for which you do not have a tool (this includes division, square root, or any capabilities beyond `add`, `subtract`, `multiply`, `search_orders`):
      Your ONLY response MUST be: "I'm sorry, I cannot perform that action as I don't have the required tool." Do NOT attempt to call a non-existent tool or guess.
    - **Clarity is Key:** Only use a tool if the request is specific, clear, and all necessary inputs are directly user-provided (unless Rule 3 explicitly directs you to ask for a missing order ID).
 """
 
-async def model_call_node(state: AgentState, config: RunnableConfig) -> Any:
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and an assistant.
+Keep order IDs, numbers and tool results exactly. Reply with the updated summary only, at most 5 sentences.
+
+Current summary:
+{summary}
+
+New messages:
+{transcript}
+"""
+
+async def llm_summarizer(previous_summary: str, new_messages: Sequence[BaseMessage]) -> str:
+    prompt = SUMMARY_PROMPT.format(summary=previous_summary or "(none)", transcript=get_buffer_string(new_messages))
+    # A callback manager without handlers (not `[]`, which BaseLLM.agenerate indexes into): the summary is internal
+    # and must not inherit the run's callbacks, or it would show up as llm_chunk events
+    async with model_scheduler.slot(session_of(get_config())):
+        summary = await ollama_model.ainvoke(prompt, config={"callbacks": AsyncCallbackManager([])})
+    return summary.strip()
+
+# Shorter prompt for native tool calling: the tool schemas travel with the request instead of the prompt text
+NATIVE_SYSTEM_PROMPT_CONTENT = """You are a precise assistant with tools for calculations (add, subtract, multiply) and order lookups (search_orders).
+- Use a tool for every calculation or order lookup, only with numbers and order IDs the user actually provided.
+- If an order question has no order ID, ask: "To help you with your order, could you please provide the specific order ID?"
+- For several independent tasks, call all the needed tools at once.
+- After a tool result, state it directly and stop. Do not call another tool for the same task.
+- If no tool fits (e.g. division, weather, dates), reply: "I'm sorry, I cannot perform that action as I don't have the required tool."
+- Reply to greetings and small talk politely without tools.
+"""
+
+# "text" parses Action:/Action Input: from plain completions, "native" uses ChatOllama with bound tools
+TOOL_CALLING_MODE = os.getenv("TOOL_CALLING_MODE", "text")
+# Text mode: stop the generation as soon as a complete Action / Action Input block has streamed in
+EARLY_TOOL_CALL_STOP = os.getenv("EARLY_TOOL_CALL_STOP", "1") == "1"
+
+def make_tool_adapter(mode: str = TOOL_CALLING_MODE):
+    if mode == "native" and LLM_BACKEND != "fake": # The fake model only speaks the text protocol
+        return NativeToolAdapter(ChatOllama(model=model_name, temperature=0.0, base_url=OLLAMA_BASE_URL, **ollama_model_options()), tools_list, NATIVE_SYSTEM_PROMPT_CONTENT)
+    return TextProtocolAdapter(ollama_model, tools_list, SYSTEM_PROMPT_CONTENT, early_stop=EARLY_TOOL_CALL_STOP)
+
+tool_adapter = make_tool_adapter()
+
+# "llm" asks the model for an incremental summary, "extractive" keeps a transcript tail without a model call
+CONTEXT_SUMMARIZER = os.getenv("CONTEXT_SUMMARIZER", "llm")
+context_manager = ContextManager(summarizer=llm_summarizer if CONTEXT_SUMMARIZER == "llm" else extractive_summarizer)
+
+# Exact-match cache of model responses by normalised conversation; RESPONSE_CACHE_SEMANTIC=1 adds a similarity lookup
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "1") == "1"
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048")),
+    semantic=os.getenv("RESPONSE_CACHE_SEMANTIC", "0") == "1",
+    similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.85")),
+) if RESPONSE_CACHE_ENABLED else None
+
+async def model_call_node(state: AgentState, config: RunnableConfig, writer: StreamWriter) -> Any:
     # print("\n--- AGENT (LLM) TURN ---") # Replaced by stream events
-    system_prompt = SystemMessage(content=SYSTEM_PROMPT_CONTENT)
-    messages_for_llm = [system_prompt] + list(state["messages"])
+    # The same frozen SystemMessage every call keeps the prompt prefix byte-identical for Ollama's KV cache
+    system_prompt = tool_adapter.prompt.system_message
+    # Older turns are collapsed into a cached summary so the prompt stays within the token budget
+    messages_for_llm, summary, summarized_count, context_stats = await context_manager.build(
+        system_prompt, state["messages"], state.get("summary", ""), state.get("summarized_count", 0)
+    )
+
+    # The request's budget (steps, tool calls, tokens, wall time) is checked on the edges out of this node and the tools node
+    usage, limits = usage_for_turn(state), limits_for(config)
 
-    # The ollama_model.astream() will be picked up by astream_events
     # This node's primary job is to prepare input and return the AIMessage for state update
-    response_content = ""
-    async for chunk in ollama_model.astream(messages_for_llm, config=config):
-        response_content += chunk
-    
-    return {"messages": [AIMessage(content=response_content)]}
+    cache_namespace = f"{tool_adapter.mode}:{model_name}"
+    response, cache_match = await response_cache.alookup(cache_namespace, messages_for_llm) if response_cache else (None, "miss")
+    if response is not None:
+        # Replayed to the client as an llm_chunk frame instead of a new generation
+        if response.content:
+            writer({"type": "llm_chunk", "content": response.content, "cached": cache_match})
+    else:
+        # Tool calls the user's message predicts run while the model generates; the tools node picks up the ones it asks for
+        if isinstance(state["messages"][-1], HumanMessage) and isinstance(state["messages"][-1].content, str):
+            speculator.start(session_of(config), turn_id(state), state["messages"][-1].content)
+        async with model_scheduler.slot(session_of(config)):
+            response = await tool_adapter.call_model(messages_for_llm, config=config, writer=writer)
+        if response_cache:
+            await response_cache.astore(cache_namespace, messages_for_llm, response)
+        usage["tokens"] += generated_tokens(response)
+    usage["steps"] += 1
+    writer(budget_frame(usage, limits))
+    response.response_metadata["context"] = asdict(context_stats)
+    response.response_metadata["cache"] = cache_match
+    response.response_metadata["prompt_prefix"] = tool_adapter.prompt.check_prefix(messages_for_llm)
+
+    return {
+        "messages": [response],
+        "summary": summary,
+        "summarized_count": summarized_count,
+        "budget": usage,
+    }
 
-def should_continue_node(state: AgentState) -> str:
+async def fast_path_node(state: AgentState, config: RunnableConfig, writer: StreamWriter) -> Any:
+    # Unambiguous turns get their tool call or reply here without a model call; everything else goes on to "agent"
+    route = route_turn(state["messages"]) if FAST_PATH else None
+    if route is None:
+        return {}
+    usage, limits = usage_for_turn(state), limits_for(config)
+    # The model turn that picks the tool or replies, plus the one stating the results unless they have templates
+    templated = bool(route.tool_calls) and all(name in TOOL_ANSWER_TEMPLATES for name, _ in route.tool_calls)
+    record_saved(route, 2 if templated else 1, model_scheduler.mean_call_s)
+    if route.tool_calls:
+        message = tool_adapter.tool_call_message(route.tool_calls)
+    else:
+        message = AIMessage(content=route.reply)
+        writer({"type": "llm_chunk", "content": route.reply, "fast_path": route.intent})
+    message.response_metadata["fast_path"] = route.intent
+    writer(budget_frame(usage, limits))
+    return {"messages": [message], "budget": usage}
+
+def after_fast_path_node(state: AgentState, config: RunnableConfig) -> str:
+    if isinstance(state["messages"][-1], HumanMessage):
+        return "agent" # Not routed
+    return should_continue_node(state, config)
+
+def should_continue_node(state: AgentState, config: RunnableConfig) -> str:
     # print("\n--- DECISION: SHOULD CONTINUE? ---") # Replaced by stream events
     last_message = state["messages"][-1]
     if not isinstance(last_message, AIMessage):
         # print("Decision: Last message is not an AIMessage. Ending.")
         return "end_conversation" # Use a more descriptive name for clarity
 
-    content = last_message.content
-    if "Action:" in content and "Action Input:" in content:
-        action_match = re.search(r"Action: (\w+)", content)
-        if action_match:
-            tool_name = action_match.group(1).strip()
-            if any(t.name == tool_name for t in tools_list):
-                # print(f"Decision: Action '{tool_name}' found for a known tool. Continue to tools.")
-                return "continue_to_tools"
-            else:
-                # print(f"Decision: Action '{tool_name}' found, but tool is NOT in known tools list. LLM should have handled. Ending.")
-                return "end_conversation" # LLM made a mistake, end to prevent errors
-        else:
-            # print("Decision: 'Action:' found but could not parse tool name. Ending.")
-            return "end_conversation"
-    else:
-        # print("Decision: No 'Action:' found in AI response. Ending.")
-        return "end_conversation"
+    tool_calls = tool_adapter.parse_tool_calls(last_message)
+    if tool_calls and any(t.name == tool_call["name"] for tool_call in tool_calls for t in tools_list):
+        # print(f"Decision: Action '{tool_name}' found for a known tool. Continue to tools.")
+        if exhausted_limit(state["budget"], limits_for(config), pending_tool_calls=len(tool_calls)):
+            return "budget_exhausted"
+        return "continue_to_tools"
+    # No tool call, or (LLM mistake) only unknown tools: the turn ends here
+    observe_finished(state["budget"])
+    return "end_conversation"
+
+def after_tools_node(state: AgentState, config: RunnableConfig) -> str:
+    if isinstance(state["messages"][-1], AIMessage):
+        return "end_conversation" # The tools node already stated the results with their templates
+    # Another model turn only while the request's budget lasts
+    return "budget_exhausted" if exhausted_limit(state["budget"], limits_for(config)) else "agent"
+
+async def budget_exhausted_node(state: AgentState, config: RunnableConfig, writer: StreamWriter) -> Any:
+    # Ends the request with a plain answer instead of another model turn or a GraphRecursionError
+    usage, limits = dict(state["budget"]), limits_for(config)
+    last_message = state["messages"][-1]
+    pending_calls = tool_adapter.parse_tool_calls(last_message) if isinstance(last_message, AIMessage) else []
+    limit = exhausted_limit(usage, limits, pending_tool_calls=len(pending_calls) if pending_calls else None) or "steps"
+    # Calls that won't run still get a result, so the history stays valid for the next turn
+    skipped = [ToolMessage(content="Not run: the request's tool call budget ran out.", name=call["name"], tool_call_id=call["id"]) for call in pending_calls]
+    final = AIMessage(content=exhausted_message(limit, limits, state["messages"]))
+    writer({"type": "llm_chunk", "content": final.content})
+    writer(budget_frame(usage, limits, exhausted=limit))
+    observe_finished(usage, exhausted=limit)
+    return {"messages": [*skipped, final]}
+
+# Tool calls of one AI message run concurrently, each with a timeout; the semaphore caps tool calls in flight across requests
+TOOL_CALL_TIMEOUT_S = float(os.getenv("TOOL_CALL_TIMEOUT_S", "10"))
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "8"))
+tool_slots = asyncio.Semaphore(TOOL_MAX_CONCURRENCY)
+
+def turn_id(state: AgentState) -> str:
+    # The id add_messages gave the turn's user message
+    return next((str(m.id) for m in reversed(state["messages"]) if isinstance(m, HumanMessage)), "")
+
+async def speculative_invoke(tool_name: str, args: dict) -> Any:
+    selected_tool = next(t for t in tools_list if t.name == tool_name)
+    async with tool_slots:
+        # No callbacks: the call belongs to no node yet, so it isn't in the agent node's tool metrics
+        return await asyncio.wait_for(selected_tool.ainvoke(args, config={"callbacks": []}), timeout=TOOL_CALL_TIMEOUT_S)
+
+# Speculation only holds a free tool slot, so it never queues ahead of tool calls the model has made
+speculator = Speculator(
+    {name: PREDICTORS[name] for name in SPECULATIVE_TOOLS if name in PREDICTORS},
+    speculative_invoke,
+    can_start=lambda: not tool_slots.locked(),
+)
 
-async def run_tool_node(state: AgentState, config: RunnableConfig) -> Any:
-    # print("\n--- TOOL EXECUTION NODE ---") # Replaced by stream events
-    last_ai_message = state["messages"][-1]
-    content = last_ai_message.content
+def tool_output_for_client(result: Any) -> Any:
+    # Ensure output is serializable
+    return result if isinstance(result, (dict, list, str, int, float, bool, type(None))) else str(result)
 
-    action_match = re.search(r"Action: (\w+)", content, re.IGNORECASE)
-    input_match = re.search(r"Action Input:.*?({.*?})", content, re.DOTALL | re.IGNORECASE)
+async def execute_tool_call(tool_call: dict, config: RunnableConfig, writer: StreamWriter, turn: str = "") -> ToolMessage:
+    tool_name = tool_call["name"]
+    if tool_call.get("error"):
+        return ToolMessage(content=tool_call["error"], name=tool_name, tool_call_id=tool_call["id"], status="error")
+    # print(f"Attempting to run tool: '{tool_name}' with input: '{tool_call['args']}'")
 
-    if not (action_match and input_match):
-        # This case should ideally be caught by should_continue_node or LLM's adherence to prompt
-        error_msg = "Error: Malformed tool call structure from LLM."
+    selected_tool = next((t for t in tools_list if t.name == tool_name), None)
+    if not selected_tool:
+        error_msg = f"Error: Tool '{tool_name}' not found by tool node (should_continue might have missed this)."
         # print(error_msg)
-        return {"messages": [ToolMessage(content=error_msg, tool_call_id="error_internal_parsing", name="error_handler")]}
-
-    tool_name = action_match.group(1).strip()
-    tool_input_str = input_match.group(1).strip()
-    # print(f"Attempting to run tool: '{tool_name}' with input string: '{tool_input_str}'")
+        return ToolMessage(content=error_msg, name=tool_name, tool_call_id=tool_call["id"], status="error")
 
+    writer({"type": "tool_start", "name": tool_name, "input": tool_call["args"]})
+    speculation = speculator.take(session_of(config), turn, tool_name, tool_call["args"])
     try:
-        tool_input_json = json.loads(tool_input_str)
-        selected_tool = next((t for t in tools_list if t.name == tool_name), None)
-
-        if selected_tool:
-            # The selected_tool.ainvoke will be picked up by astream_events
-            result = await selected_tool.ainvoke(tool_input_json, config=config)
-            # print(f"TOOL '{selected_tool.name}' EXECUTED. Result: {result}")
-            return {"messages": [ToolMessage(content=str(result), name=selected_tool.name, tool_call_id=selected_tool.name)]}
+        if speculation:
+            result = await speculation # Started with the model call; often already done
         else:
-            error_msg = f"Error: Tool '{tool_name}' not found by tool node (should_continue might have missed this)."
-            # print(error_msg)
-            return {"messages": [ToolMessage(content=error_msg, name=tool_name, tool_call_id=tool_name)]}
-
-    except json.JSONDecodeError as e:
-        error_msg = f"Error: Invalid JSON in tool input for '{tool_name}': {tool_input_str}. Error: {e}"
-        # print(error_msg)
-        return {"messages": [ToolMessage(content=error_msg, name=tool_name, tool_call_id=tool_name)]}
+            async with tool_slots:
+                result = await asyncio.wait_for(selected_tool.ainvoke(tool_call["args"], config=config), timeout=TOOL_CALL_TIMEOUT_S)
+        # print(f"TOOL '{selected_tool.name}' EXECUTED. Result: {result}")
+        writer({"type": "tool_end", "name": tool_name, "output": tool_output_for_client(result), **({"speculative": True} if speculation else {})})
+        return ToolMessage(content=str(result), name=selected_tool.name, tool_call_id=tool_call["id"])
+    except asyncio.TimeoutError:
+        error_msg = f"Error: Tool '{tool_name}' did not finish within {TOOL_CALL_TIMEOUT_S} seconds."
     except Exception as e:
         error_msg = f"Error during execution of tool '{tool_name}': {str(e)}"
         # print(error_msg)
-        return {"messages": [ToolMessage(content=error_msg, name=tool_name, tool_call_id=tool_name)]}
+    writer({"type": "tool_end", "name": tool_name, "output": error_msg, "error": True})
+    return ToolMessage(content=error_msg, name=tool_name, tool_call_id=tool_call["id"], status="error")
+
+async def run_tool_node(state: AgentState, config: RunnableConfig, writer: StreamWriter) -> Any:
+    # print("\n--- TOOL EXECUTION NODE ---") # Replaced by stream events
+    last_ai_message = state["messages"][-1]
+    tool_calls = tool_adapter.parse_tool_calls(last_ai_message)
+
+    if not tool_calls:
+        # This case should ideally be caught by should_continue_node or LLM's adherence to prompt
+        error_msg = "Error: Malformed tool call structure from LLM."
+        # print(error_msg)
+        return {"messages": [ToolMessage(content=error_msg, tool_call_id="error_internal_parsing", name="error_handler")]}
+
+    # All tool results go back in one state update, so a multi-task request needs a single extra LLM turn
+    turn = turn_id(state)
+    tool_messages = await asyncio.gather(*(execute_tool_call(tool_call, config, writer, turn) for tool_call in tool_calls))
+    usage = dict(state["budget"])
+    usage["tool_calls"] += len(tool_calls)
+    writer(budget_frame(usage, limits_for(config)))
+    # Results of tools with a response template are stated here, which saves the model turn that would restate them
+    answer = templated_answer(tool_messages, TOOL_ANSWER_TEMPLATES)
+    if answer is None:
+        return {"messages": list(tool_messages), "budget": usage}
+    writer({"type": "llm_chunk", "content": answer, "templated": True})
+    observe_finished(usage)
+    return {"messages": [*tool_messages, AIMessage(content=answer, response_metadata={"templated": True})], "budget": usage}
 
 # --- Graph Definition ---
 workflow = StateGraph(AgentState)
-workflow.add_node("agent", model_call_node)
-workflow.add_node("tools_executor", run_tool_node) # Renamed for clarity
+# instrument_node records each node's wall time plus the LLM tokens/TTFT and tool latency inside it (on /metrics)
+workflow.add_node("fast_path", instrument_node("fast_path", fast_path_node))
+workflow.add_node("agent", instrument_node("agent", model_call_node))
+workflow.add_node("tools_executor", instrument_node("tools_executor", run_tool_node)) # Renamed for clarity
+workflow.add_node("budget_exhausted", instrument_node("budget_exhausted", budget_exhausted_node))
+
+workflow.set_entry_point("fast_path")
 
-workflow.set_entry_point("agent")
+workflow.add_conditional_edges(
+    "fast_path",
+    instrument_node("after_fast_path", after_fast_path_node),
+    {
+        "agent": "agent",
+        "continue_to_tools": "tools_executor",
+        "budget_exhausted": "budget_exhausted",
+        "end_conversation": END
+    }
+)
 
 workflow.add_conditional_edges(
     "agent",
-    should_continue_node,
+    instrument_node("should_continue", should_continue_node),
     {
         "continue_to_tools": "tools_executor",
+        "budget_exhausted": "budget_exhausted",
         "end_conversation": END
     }
 )
-workflow.add_edge("tools_executor", "agent")
-graph_app = workflow.compile()
+workflow.add_conditional_edges("tools_executor", instrument_node("after_tools", after_tools_node), {"agent": "agent", "budget_exhausted": "budget_exhausted", "end_conversation": END})
+workflow.add_edge("budget_exhausted", END)
+graph_app = None # Compiled in lifespan, once the checkpointer is open
+
+# "cosmos" also persists every session's messages to Cosmos DB (see cosmos.py), "none" keeps them only in the checkpointer
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "none")
+
+# Worker processes (uvicorn --workers / gunicorn -w also read WEB_CONCURRENCY). With more than one, sessions need a
+# shared checkpointer (sqlite/redis) and caches and admission counts a shared store (SHARED_STORE_URL, see shared_store.py).
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+conversation_store = None
 
 
 # --- FastAPI Application ---
-app_fastapi = FastAPI(title="LangGraph Streaming Agent API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global graph_app, conversation_store, order_repository
+    if model_client:
+        await model_client.start(ollama_model, tool_adapter.model) # Returns at once, warm-up runs in the background
+    if CONVERSATION_STORE == "cosmos":
+        conversation_store = CosmosConversationStore()
+        await conversation_store.start()
+    # The checkpointer keeps AgentState.messages per session (thread_id), so each request only carries the new turn.
+    async with open_checkpointer() as checkpointer, open_store() as store, open_order_repository() as order_repository:
+        if WEB_CONCURRENCY > 1 and (CHECKPOINTER_BACKEND == "memory" or store is None):
+            print(f"WEB_CONCURRENCY={WEB_CONCURRENCY} but sessions or caches are per worker; set CHECKPOINTER_BACKEND=sqlite|redis and SHARED_STORE_URL.")
+        use_shared_store(store)
+        if response_cache:
+            response_cache.shared_store = store
+        admission_sync = asyncio.create_task(share_admissions(model_scheduler, store, WORKER_ID)) if store else None
+        graph_app = workflow.compile(checkpointer=checkpointer)
+        yield
+        graph_app = None
+        order_repository = None
+        if admission_sync:
+            admission_sync.cancel()
+            await asyncio.wait([admission_sync])
+        use_shared_store(None)
+    if conversation_store:
+        await conversation_store.close() # Flushes anything still queued
+        conversation_store = None
+    if model_client:
+        await model_client.close()
+
+app_fastapi = FastAPI(title="LangGraph Streaming Agent API", lifespan=lifespan)
 
 # CORS Middleware
 app_fastapi.add_middleware(
@@ -223,64 +473,115 @@ app_fastapi.add_middleware(
     allow_headers=["*"], # Allows all headers
 )
 
+@app_fastapi.get("/healthz")
+async def healthz_endpoint():
+    # Readiness: 200 once the graph is compiled and the model is loaded, 503 while starting, warming or unreachable
+    model_health = model_client.health() if model_client else {"model": ollama_model._llm_type, "status": "ready", "error": None}
+    ready = graph_app is not None and model_health["status"] == "ready"
+    body = {"ready": ready, "graph": graph_app is not None, **model_health}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+@app_fastapi.get("/metrics")
+async def metrics_endpoint():
+    # Prometheus text format: node/LLM/tool latency and tokens, tool and response cache counters
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 class UserInput(BaseModel):
     text: str
-    # session_id: str | None = None # Optional: for multi-turn conversations beyond single request-response
+    session_id: str | None = None # Omit to start a new conversation; reuse the returned id for follow-up turns
 
-@app_fastapi.post("/chat/stream")
-async def chat_stream_endpoint(user_input: UserInput):
-    if not ollama_model:
-        raise HTTPException(status_code=500, detail="Ollama model not initialized.")
+# Only the frames the client needs: nodes write llm_chunk / tool_start / tool_end / tool_call_detected to the
+# "custom" stream (the text-mode LLM streams through the writer), native mode adds chat model tokens via "messages".
+STREAM_MODES = ["custom", "messages"] if tool_adapter.mode == "native" else ["custom"]
 
-    # Initial state for the graph
-    # The `add_messages` annotation on AgentState will handle combining this with history if state was persisted.
-    # For a simple request-response stream, we start fresh or load from a session_id if implemented.
+async def stream_frames(inputs: dict, config: dict, hold: Callable[[], bool] = lambda: False):
+    """
+    SSE frames for one graph run; tokens are coalesced into frames of SSE_COALESCE_MS (see sse.py).
+    While `hold()` is true (the send buffer is full) tokens merge into one pending frame.
+    """
+    tokens = TokenCoalescer()
+    try:
+        # aclosing: a cancelled or abandoned stream also stops the graph's running nodes right away
+        async with aclosing(graph_app.astream(inputs, config=config, stream_mode=STREAM_MODES)) as stream:
+            async for mode, payload in stream:
+                if mode == "messages":
+                    chunk = payload[0]
+                    text = chunk.content if isinstance(chunk, AIMessageChunk) and isinstance(chunk.content, str) else ""
+                elif payload.get("type") == "llm_chunk" and "cached" not in payload:
+                    text = payload["content"]
+                else:
+                    if frame := tokens.flush():
+                        yield frame
+                    yield sse_frame(payload)
+                    continue
+                if text and (frame := tokens.add(text, hold())):
+                    yield frame
+    finally:
+        speculator.finish(session_of(config)) # Speculative calls the model didn't ask for are wasted
+    if frame := tokens.flush():
+        yield frame
+
+# Frames waiting for a slow client; when full, tokens merge into the pending frame instead of queueing up
+SSE_SEND_BUFFER = int(os.getenv("SSE_SEND_BUFFER", "32"))
+# How often to check for a gone client while no frame is ready (e.g. during TTFT or a slow tool)
+SSE_DISCONNECT_POLL_S = float(os.getenv("SSE_DISCONNECT_POLL_S", "0.5"))
+SSE_DISCONNECTS = Counter("sse_client_disconnects_total", "Streams whose client went away before the end; their graph run was cancelled.")
+
+@app_fastapi.post("/chat/stream")
+async def chat_stream_endpoint(user_input: UserInput, request: Request):
+    if not graph_app:
+        raise HTTPException(status_code=503, detail="Agent graph not ready.")
+    try:
+        release_admission = model_scheduler.admit()
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after_s)})
+
+    # Only the new turn is sent; the checkpointer restores the session's history and
+    # the `add_messages` annotation on AgentState appends this message to it.
+    session_id = user_input.session_id or str(uuid.uuid4())
+    config = {"configurable": {"thread_id": session_id}}
     inputs = {"messages": [HumanMessage(content=user_input.text)]}
 
+    # The graph runs in its own task and fills a bounded buffer; the response only drains it.
+    # A client that disconnects gets the task cancelled, which also closes the in-flight Ollama stream.
+    send_buffer: asyncio.Queue = asyncio.Queue(maxsize=SSE_SEND_BUFFER)
+
+    async def produce_frames():
+        try:
+            async with aclosing(stream_frames(inputs, config, hold=send_buffer.full)) as frames:
+                async for frame in frames:
+                    # Waits while the buffer is full, which stops reading the graph stream until the client catches up
+                    await send_buffer.put(frame)
+        except Exception as e:
+            await send_buffer.put(e) # Handed to the response after the frames before it
+            return
+        await send_buffer.put(None)
+
     async def event_generator():
+        producer = asyncio.create_task(produce_frames())
         try:
-            # astream_events provides structured events for LLMs, tools, etc.
-            # We are interested in:
-            # - "on_llm_stream": Chunks from the LLM.
-            # - "on_tool_start": When a tool is about to be called.
-            # - "on_tool_end": When a tool has finished and its output.
-            # We can also get "on_chat_model_stream" for AIMessageChunk
-            async for event in graph_app.astream_events(inputs, version="v1", include_types=["llm", "chat_model", "tool"]):
-                kind = event["event"]
-                data_to_send = {}
-
-                if kind == "on_chat_model_stream":
-                    chunk_content = event["data"]["chunk"].content
-                    if chunk_content: # Ensure content is not empty
-                        data_to_send = {"type": "llm_chunk", "content": chunk_content}
-                elif kind == "on_llm_stream": # Fallback for non-chat models or different chunk types
-                    chunk_content = event["data"]["chunk"]
-                    if isinstance(chunk_content, str) and chunk_content:
-                         data_to_send = {"type": "llm_chunk", "content": chunk_content}
-                    # elif hasattr(chunk_content, 'content') and chunk_content.content: # For AIMessageChunk if not caught by on_chat_model_stream
-                    #    data_to_send = {"type": "llm_chunk", "content": chunk_content.content}
-                elif kind == "on_tool_start":
-                    data_to_send = {
-                        "type": "tool_start",
-                        "name": event["name"], # Tool name
-                        "input": event["data"].get("input")
-                    }
-                elif kind == "on_tool_end":
-                    output = event["data"].get("output")
-                    # Ensure output is serializable
-                    if not isinstance(output, (dict, list, str, int, float, bool, type(None))):
-                        output = str(output)
-                    data_to_send = {
-                        "type": "tool_end",
-                        "name": event["name"], # Tool name
-                        "output": output
-                    }
-                
-                if data_to_send:
-                    yield f"data: {json.dumps(data_to_send)}\n\n"
-            
+            # Tell the client which session this turn belongs to so it can continue the conversation
+            yield sse_frame({"type": "session", "session_id": session_id})
+            while True:
+                try:
+                    frame = await asyncio.wait_for(send_buffer.get(), timeout=SSE_DISCONNECT_POLL_S)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    continue
+                if frame is None:
+                    break
+                if isinstance(frame, Exception):
+                    raise frame
+                yield frame
+
+            if conversation_store:
+                # Only queues the new messages; the store flushes them in the background
+                snapshot = await graph_app.aget_state(config)
+                conversation_store.save(session_id, snapshot.values.get("messages", []))
+
             # Signal the end of the stream explicitly
-            yield f"data: {json.dumps({'type': 'stream_end'})}\n\n"
+            yield sse_frame({"type": "stream_end"})
 
         except Exception as e:
             print(f"Error during stream generation: {e}") # Log server-side
@@ -289,13 +590,29 @@ async def chat_stream_endpoint(user_input: UserInput):
             if isinstance(e, HTTPException):
                 error_payload = {"type": "error", "detail": e.detail, "status_code": e.status_code}
             
-            yield f"data: {json.dumps(error_payload)}\n\n"
-
-
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+            yield sse_frame(error_payload)
+        finally:
+            release_admission()
+            # Still running here means the client went away (or the response was cancelled) mid-answer
+            if not producer.done():
+                SSE_DISCONNECTS.inc()
+                producer.cancel()
+                # asyncio.wait, not `await producer`: if this response is itself being cancelled, awaiting
+                # would cancel the producer a second time and cut short the graph's own cleanup
+                await asyncio.wait([producer])
+
+
+    frames = event_generator()
+    # A response cancelled before it started never runs the generator's finally; this frees the admission then
+    weakref.finalize(frames, release_admission)
+    return StreamingResponse(frames, media_type="text/event-stream")
 
 if __name__ == "__main__":
     # Note: The test_prompts and run_test_suite are for local command-line testing.
     # They are not directly used by the FastAPI service but can be run separately if needed.
     # For running the FastAPI server:
-    uvicorn.run(app_fastapi, host="0.0.0.0", port=8000)
\ No newline at end of file
+    if WEB_CONCURRENCY > 1:
+        # Each worker imports the app itself, so uvicorn needs it as an import string
+        uvicorn.run("main:app_fastapi", host="0.0.0.0", port=8000, workers=WEB_CONCURRENCY)
+    else:
+        uvicorn.run(app_fastapi, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,94 @@
+import asyncio
+import os
+from typing import Any
+
+import httpx
+from langchain_ollama import ChatOllama
+from langchain_ollama.llms import OllamaLLM
+from ollama import AsyncClient
+
+from prompt_assembly import OLLAMA_KEEP_ALIVE, OLLAMA_NUM_CTX
+
+# --- Ollama Client Settings ---
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "32"))
+OLLAMA_HEALTH_TIMEOUT_S = float(os.getenv("OLLAMA_HEALTH_TIMEOUT_S", "2"))
+OLLAMA_RETRY_INTERVAL_S = float(os.getenv("OLLAMA_RETRY_INTERVAL_S", "5"))
+
+
+class ModelClientManager:
+    """
+    Owns the one async HTTP connection pool used for every Ollama call while the app runs.
+    `start()` returns at once; liveness (GET /api/tags) and warm-up (an empty-prompt generate, which only
+    loads the model into memory) run in the background and are retried until Ollama answers.
+    `status` goes "starting" -> "warming" -> "ready", or "unavailable" with `error` set while it retries.
+    """
+
+    def __init__(self, model: str, base_url: str = OLLAMA_BASE_URL, max_connections: int = OLLAMA_MAX_CONNECTIONS) -> None:
+        self.model = model
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.client: AsyncClient | None = None
+        self.status = "starting"
+        self.error: str | None = None
+        self._warm_task: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    async def start(self, *models: Any) -> None:
+        """Opens the pool and points the given OllamaLLM / ChatOllama instances (or tool-bound wrappers) at it."""
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+        self.client = AsyncClient(host=self.base_url, limits=limits) # Extra kwargs go to httpx.AsyncClient
+        for model in models:
+            model = getattr(model, "bound", model) # bind_tools() wraps the chat model in a RunnableBinding
+            if isinstance(model, (OllamaLLM, ChatOllama)):
+                model._async_client = self.client
+        self._warm_task = asyncio.create_task(self._warm_up())
+
+    async def close(self) -> None:
+        if self._warm_task:
+            self._warm_task.cancel()
+            try:
+                await self._warm_task
+            except asyncio.CancelledError:
+                pass
+            self._warm_task = None
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    async def check_liveness(self) -> bool:
+        """Cheap check: Ollama answers /api/tags and has the model pulled. No text is generated."""
+        try:
+            response = await asyncio.wait_for(self.client.list(), timeout=OLLAMA_HEALTH_TIMEOUT_S)
+        except Exception as e:
+            self.status, self.error = "unavailable", f"Ollama not reachable at {self.base_url}: {e!r}"
+            return False
+        names = [m.model for m in response.models]
+        if not any(name == self.model or name.startswith(f"{self.model}:") for name in names):
+            self.status, self.error = "unavailable", f"Model {self.model} not found in Ollama (run 'ollama pull {self.model}')."
+            return False
+        return True
+
+    async def _warm_up(self) -> None:
+        last_error = None
+        while not await self.check_liveness():
+            if self.error != last_error: # Log once per distinct failure, not on every retry
+                print(self.error)
+                last_error = self.error
+            await asyncio.sleep(OLLAMA_RETRY_INTERVAL_S)
+        self.status, self.error = "warming", None
+        try:
+            # An empty prompt makes Ollama load the model and return without generating anything;
+            # same num_ctx as the real calls, otherwise the first request would reload the runner
+            await self.client.generate(model=self.model, prompt="", keep_alive=OLLAMA_KEEP_ALIVE, options={"num_ctx": OLLAMA_NUM_CTX})
+        except Exception as e:
+            # Not fatal: the first real request loads the model instead
+            print(f"Warm-up of {self.model} failed: {e!r}")
+        self.status = "ready"
+        print(f"Ollama model {self.model} is ready")
+
+    def health(self) -> dict[str, Any]:
+        return {"model": self.model, "status": self.status, "error": self.error}
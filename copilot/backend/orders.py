@@ -0,0 +1,405 @@
+import asyncio
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Iterable, Iterator, Protocol, Sequence
+
+from prometheus_client import Counter, Histogram
+
+# --- Order Repository Settings ---
+# Where search_orders looks orders up: "memory" (SAMPLE_ORDERS, or ORDERS_FILE when set), "sqlite" (ORDERS_SQLITE_PATH)
+# or "cosmos" (the container below in the Cosmos DB emulator, see cosmos.py for the endpoint and key)
+ORDERS_BACKEND = os.getenv("ORDERS_BACKEND", "memory")
+ORDERS_FILE = os.getenv("ORDERS_FILE", "") # JSON lines written by generate_orders.py, loaded into memory at startup
+ORDERS_SQLITE_PATH = os.getenv("ORDERS_SQLITE_PATH", "orders.sqlite")
+ORDERS_COSMOS_CONTAINER = os.getenv("ORDERS_COSMOS_CONTAINER", "Orders")
+# Batch concurrent lookups into one get_many (OrderLoader): "auto" for backends with a round-trip (sqlite, cosmos), "1", "0"
+ORDER_BATCHING = os.getenv("ORDER_BATCHING", "auto")
+ORDER_BATCH_WINDOW_MS = float(os.getenv("ORDER_BATCH_WINDOW_MS", "2")) # How long the first ID of a batch waits for others
+ORDER_BATCH_MAX_KEYS = int(os.getenv("ORDER_BATCH_MAX_KEYS", "100")) # A batch this big goes out at once
+
+ORDER_BATCHES = Counter("order_lookup_batches_total", "Bulk lookups the order loader sent to the repository.")
+ORDER_BATCH_SIZE = Histogram("order_lookup_batch_size", "Distinct order IDs per bulk lookup.", buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+ORDER_KEYS_COALESCED = Counter("order_lookup_keys_coalesced_total", "Order ID lookups answered by a lookup of the same ID already pending or in flight.")
+
+# SQLite builds before 3.32 allow at most 999 parameters per statement
+SQLITE_MAX_PARAMS = 900
+
+
+@dataclass(frozen=True, slots=True)
+class Order:
+    order_id: str
+    status: str
+    items: str
+    delivery_estimate: str | None = None
+
+
+# The orders the mock OMS has always known; the prompt corpus and the fake model rely on these
+SAMPLE_ORDERS = [
+    Order("ORD12345", "Shipped", "1x SuperWidget", "Tomorrow"),
+    Order("XYZ987", "Processing", "1x HyperGadget"),
+    Order("TEST001", "Delivered", "1x Sample Product"),
+]
+
+
+# Order IDs as users type them: upper case letters then digits (ORD12345, XYZ987). The fast-path router, the
+# tool speculator and the fake model all find order IDs in a message with this one pattern.
+ORDER_ID_PATTERN = re.compile(r"\b[A-Z]{2,}[A-Z0-9]*\d+\b")
+
+
+def normalize_order_id(order_id: str) -> str:
+    return order_id.strip().upper()
+
+
+def format_order(order: Order) -> str:
+    """The search_orders result for a found order."""
+    details = f"Status: {order.status}, Items: {order.items}"
+    if order.delivery_estimate:
+        details += f", Delivery Est: {order.delivery_estimate}"
+    return f"Order details for '{order.order_id}': {details}. (Source: OMS)"
+
+
+def order_not_found(query: str) -> str:
+    return f"Order ID '{query}' not found. Please verify the order ID and try again. (Source: OMS)"
+
+
+NO_ORDER_ID = "No order ID provided for search. Please provide a specific order ID. (Source: OMS)"
+
+
+class OrderRepository(Protocol):
+    """Order lookups for search_orders. IDs are normalized by the caller; missing orders are left out of results."""
+
+    async def get_many(self, order_ids: Sequence[str]) -> dict[str, Order]: ...
+    async def by_status(self, status: str, limit: int = 100) -> list[Order]: ...
+    async def aclose(self) -> None: ...
+
+
+class InMemoryOrderRepository:
+    """
+    All orders in process memory, loaded once: a dict keyed by normalized order ID and a secondary
+    index from status to order IDs. Lookups never leave the event loop.
+    """
+
+    def __init__(self, orders: Iterable[Order]) -> None:
+        self._by_id: dict[str, Order] = {}
+        self._by_status: dict[str, list[str]] = defaultdict(list)
+        for order in orders:
+            order_id = normalize_order_id(order.order_id)
+            if order_id in self._by_id:
+                self._by_status[self._by_id[order_id].status].remove(order_id)
+            self._by_id[order_id] = order
+            self._by_status[order.status].append(order_id)
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> "InMemoryOrderRepository":
+        return cls(read_jsonl(path))
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def lookup(self, order_ids: Sequence[str]) -> dict[str, Order]:
+        """Synchronous get_many, for callers outside an event loop (bots/agent4.py)."""
+        by_id = self._by_id
+        return {order_id: by_id[order_id] for order_id in order_ids if order_id in by_id}
+
+    async def get_many(self, order_ids: Sequence[str]) -> dict[str, Order]:
+        return self.lookup(order_ids)
+
+    async def by_status(self, status: str, limit: int = 100) -> list[Order]:
+        return [self._by_id[order_id] for order_id in self._by_status.get(status, [])[:limit]]
+
+    async def aclose(self) -> None:
+        pass
+
+
+class SQLiteOrderRepository:
+    """
+    Orders in a SQLite file (see write_sqlite), keyed by normalized order ID with an index on status.
+    Opened once; queries run on a single thread of their own so they never block the event loop,
+    and get_many fetches all requested IDs with one IN query per SQLITE_MAX_PARAMS IDs.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="orders-sqlite")
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Read-only: the order data is written by generate_orders.py (or the real OMS export)
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        return self._conn
+
+    async def _run(self, func: Any, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _get_many(self, order_ids: Sequence[str]) -> dict[str, Order]:
+        conn, found = self._connect(), {}
+        unique_ids = list(dict.fromkeys(order_ids))
+        for start in range(0, len(unique_ids), SQLITE_MAX_PARAMS):
+            chunk = unique_ids[start:start + SQLITE_MAX_PARAMS]
+            rows = conn.execute(
+                f"SELECT order_id, status, items, delivery_estimate FROM orders WHERE order_id IN ({','.join('?' * len(chunk))})", chunk
+            )
+            found.update((row[0], Order(*row)) for row in rows)
+        return found
+
+    async def get_many(self, order_ids: Sequence[str]) -> dict[str, Order]:
+        return await self._run(self._get_many, order_ids)
+
+    def _by_status(self, status: str, limit: int) -> list[Order]:
+        rows = self._connect().execute(
+            "SELECT order_id, status, items, delivery_estimate FROM orders WHERE status = ? LIMIT ?", (status, limit)
+        )
+        return [Order(*row) for row in rows]
+
+    async def by_status(self, status: str, limit: int = 100) -> list[Order]:
+        return await self._run(self._by_status, status, limit)
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def aclose(self) -> None:
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+
+class CosmosOrderRepository:
+    """
+    Orders in a Cosmos DB container partitioned by /id (the normalized order ID). get_many is one
+    cross-partition query for all requested IDs instead of a point read per ID.
+    """
+
+    def __init__(self, container: Any = None) -> None:
+        self.container = container
+        self._client: Any = None
+
+    async def start(self) -> None:
+        if self.container is None:
+            from azure.cosmos import PartitionKey
+            from azure.cosmos.aio import CosmosClient
+
+            from cosmos import database_name, endpoint, key
+
+            # Disable SSL verification for emulator (since it uses self-signed cert)
+            self._client = CosmosClient(endpoint, credential=key, connection_verify=False)
+            database = await self._client.create_database_if_not_exists(id=database_name)
+            self.container = await database.create_container_if_not_exists(
+                id=ORDERS_COSMOS_CONTAINER, partition_key=PartitionKey(path="/id"), offer_throughput=400
+            )
+
+    @staticmethod
+    def _order(item: dict[str, Any]) -> Order:
+        return Order(item["id"], item["status"], item["items"], item.get("delivery_estimate"))
+
+    async def get_many(self, order_ids: Sequence[str]) -> dict[str, Order]:
+        if not order_ids:
+            return {}
+        items = self.container.query_items(
+            query="SELECT * FROM c WHERE ARRAY_CONTAINS(@ids, c.id)",
+            parameters=[{"name": "@ids", "value": list(dict.fromkeys(order_ids))}],
+        )
+        return {item["id"]: self._order(item) async for item in items}
+
+    async def by_status(self, status: str, limit: int = 100) -> list[Order]:
+        items = self.container.query_items(
+            query="SELECT TOP @limit * FROM c WHERE c.status = @status",
+            parameters=[{"name": "@limit", "value": limit}, {"name": "@status", "value": status}],
+        )
+        return [self._order(item) async for item in items]
+
+    async def aclose(self) -> None:
+        if self._client:
+            await self._client.close()
+            self._client = None
+
+
+class OrderLoader:
+    """
+    Batches order lookups across concurrent requests (the DataLoader pattern). IDs asked for within
+    `window_s` of the first pending one, or until `max_keys` are pending, go to the wrapped repository
+    as one get_many; every caller gets its own orders back. An ID that is already pending or in flight
+    joins that lookup instead of being fetched again. Implements OrderRepository itself.
+    """
+
+    def __init__(self, repository: OrderRepository, window_s: float = ORDER_BATCH_WINDOW_MS / 1000, max_keys: int = ORDER_BATCH_MAX_KEYS) -> None:
+        self.repository = repository
+        self.window_s = window_s
+        self.max_keys = max_keys
+        self._pending: dict[str, asyncio.Future] = {}
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._flush_timer: asyncio.TimerHandle | None = None
+        self._batches: set[asyncio.Task] = set()
+
+    async def get_many(self, order_ids: Sequence[str]) -> dict[str, Order]:
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for order_id in order_ids:
+            if order_id in futures:
+                continue
+            future = self._pending.get(order_id) or self._in_flight.get(order_id)
+            if future is not None:
+                ORDER_KEYS_COALESCED.inc()
+            else:
+                future = self._pending[order_id] = loop.create_future()
+                if len(self._pending) >= self.max_keys:
+                    self._flush()
+                elif self._flush_timer is None:
+                    self._flush_timer = loop.call_later(self.window_s, self._flush)
+            futures[order_id] = future
+        # Shielded: a caller that goes away must not cancel the lookup other callers are waiting on
+        orders = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        return {order_id: order for order_id, order in zip(futures, orders) if order is not None}
+
+    def _flush(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            self._in_flight.update(batch)
+            task = asyncio.create_task(self._load(batch))
+            self._batches.add(task) # The loop only keeps weak references to tasks
+            task.add_done_callback(self._batches.discard)
+
+    async def _load(self, batch: dict[str, asyncio.Future]) -> None:
+        ORDER_BATCHES.inc()
+        ORDER_BATCH_SIZE.observe(len(batch))
+        try:
+            found = await self.repository.get_many(list(batch))
+        except BaseException as e:
+            for future in batch.values():
+                if future.done():
+                    continue
+                if isinstance(e, Exception):
+                    future.set_exception(e)
+                else:
+                    future.cancel() # Shutting down: the waiting callers are cancelled with it
+            if not isinstance(e, Exception):
+                raise
+        else:
+            for order_id, future in batch.items():
+                if not future.done():
+                    future.set_result(found.get(order_id))
+        finally:
+            for order_id in batch:
+                del self._in_flight[order_id]
+
+    async def by_status(self, status: str, limit: int = 100) -> list[Order]:
+        return await self.repository.by_status(status, limit)
+
+    async def aclose(self) -> None:
+        self._flush()
+        if self._batches:
+            await asyncio.wait(self._batches)
+        await self.repository.aclose()
+
+
+class FakeOrderService:
+    """
+    In-process stand-in for a remote order service (OMS), for tests and benchmarks. Each get_many is one
+    round-trip costing `latency_s` plus `per_key_s` per ID, and at most `max_connections` run at once.
+    """
+
+    def __init__(self, orders: Iterable[Order] | InMemoryOrderRepository, latency_s: float = 0.005, per_key_s: float = 0.00002, max_connections: int = 8) -> None:
+        self.orders = orders if isinstance(orders, InMemoryOrderRepository) else InMemoryOrderRepository(orders)
+        self.latency_s = latency_s
+        self.per_key_s = per_key_s
+        self._connections = asyncio.Semaphore(max_connections)
+        self.round_trips = 0
+        self.keys_requested = 0
+
+    async def get_many(self, order_ids: Sequence[str]) -> dict[str, Order]:
+        async with self._connections:
+            self.round_trips += 1
+            self.keys_requested += len(order_ids)
+            await asyncio.sleep(self.latency_s + self.per_key_s * len(order_ids))
+            return self.orders.lookup(order_ids)
+
+    async def by_status(self, status: str, limit: int = 100) -> list[Order]:
+        async with self._connections:
+            self.round_trips += 1
+            await asyncio.sleep(self.latency_s)
+            return await self.orders.by_status(status, limit)
+
+    async def aclose(self) -> None:
+        pass
+
+
+@asynccontextmanager
+async def open_order_repository(backend: str = ORDERS_BACKEND) -> AsyncIterator[OrderRepository]:
+    """Open the configured order repository for the lifetime of the app, behind an OrderLoader if batching is on."""
+    if backend == "memory":
+        repository: Any = InMemoryOrderRepository.from_jsonl(ORDERS_FILE) if ORDERS_FILE else InMemoryOrderRepository(SAMPLE_ORDERS)
+    elif backend == "sqlite":
+        repository = SQLiteOrderRepository(ORDERS_SQLITE_PATH)
+    elif backend == "cosmos":
+        repository = CosmosOrderRepository()
+        await repository.start()
+    else:
+        raise ValueError(f"Unknown ORDERS_BACKEND '{backend}'. Use 'memory', 'sqlite' or 'cosmos'.")
+    if ORDER_BATCHING == "1" or (ORDER_BATCHING == "auto" and backend != "memory"):
+        repository = OrderLoader(repository)
+    try:
+        yield repository
+    finally:
+        await repository.aclose()
+
+
+# --- Synthetic Data ---
+STATUSES = ["Processing", "Shipped", "Delivered", "Cancelled", "Returned"]
+STATUS_WEIGHTS = [20, 25, 45, 5, 5]
+PRODUCTS = ["SuperWidget", "HyperGadget", "Sample Product", "MegaSprocket", "UltraGizmo", "NanoDoohickey", "TurboThingamajig", "QuantumWidget"]
+DELIVERY_ESTIMATES = ["Today", "Tomorrow", "In 2 days", "In 3 days", "Next week"]
+
+
+def synthetic_orders(count: int, seed: int = 0) -> Iterator[Order]:
+    """SAMPLE_ORDERS followed by `count` random orders "ORD00000000", "ORD00000001"... Same seed, same orders."""
+    rng = random.Random(seed)
+    yield from SAMPLE_ORDERS
+    # Interned so a million orders share one string per status and delivery estimate, as they would from a real loader
+    statuses, estimates = [sys.intern(s) for s in STATUSES], [sys.intern(s) for s in DELIVERY_ESTIMATES]
+    for n in range(count):
+        status = rng.choices(statuses, STATUS_WEIGHTS)[0]
+        items = ", ".join(f"{rng.randint(1, 3)}x {product}" for product in rng.sample(PRODUCTS, rng.randint(1, 3)))
+        yield Order(f"ORD{n:08d}", status, items, rng.choice(estimates) if status == "Shipped" else None)
+
+
+def read_jsonl(path: str) -> Iterator[Order]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            yield Order(row["order_id"], sys.intern(row["status"]), row["items"], row.get("delivery_estimate"))
+
+
+def write_jsonl(path: str, orders: Iterable[Order]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for order in orders:
+            f.write(json.dumps(asdict(order)) + "\n")
+            count += 1
+    return count
+
+
+def write_sqlite(path: str, orders: Iterable[Order]) -> int:
+    """(Re)creates the orders table SQLiteOrderRepository reads. Returns the number of rows written."""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("DROP TABLE IF EXISTS orders")
+        conn.execute("CREATE TABLE orders (order_id TEXT PRIMARY KEY, status TEXT NOT NULL, items TEXT NOT NULL, delivery_estimate TEXT) WITHOUT ROWID")
+        rows = ((normalize_order_id(o.order_id), o.status, o.items, o.delivery_estimate) for o in orders)
+        count = conn.executemany("INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?)", rows).rowcount
+        conn.execute("CREATE INDEX orders_status ON orders (status)") # After the insert: building it once is faster
+        conn.commit()
+    finally:
+        conn.close()
+    return count
@@ -0,0 +1,58 @@
+import hashlib
+import os
+import textwrap
+from typing import Callable, Sequence
+
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.prompt_values import ChatPromptValue
+from prometheus_client import Counter
+
+# --- Ollama Prefix Reuse Settings ---
+# Ollama reuses the KV cache of a loaded model for a shared prompt prefix. That only works while the model
+# stays loaded (keep_alive) with the same context size (a different num_ctx reloads the runner).
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+
+PROMPT_PREFIX_CHECKS = Counter("prompt_prefix_checks_total", "Rendered model prompts by whether they start with the frozen prefix (\"match\") or not (\"changed\": no prefix cache reuse).", ["result"])
+
+
+def render_messages(messages: Sequence[BaseMessage]) -> str:
+    """The prompt text a plain LLM gets for a message list (what OllamaLLM sends)."""
+    return ChatPromptValue(messages=list(messages)).to_string()
+
+
+def prefix_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:12]
+
+
+def ollama_model_options() -> dict:
+    """Keyword arguments for OllamaLLM / ChatOllama that keep the prefix cache usable between requests."""
+    return {"keep_alive": OLLAMA_KEEP_ALIVE, "num_ctx": OLLAMA_NUM_CTX}
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Dedented, no trailing spaces, no leading/trailing blank lines: the same text always gives the same bytes."""
+    lines = textwrap.dedent(prompt).replace("\r\n", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+class PromptAssembler:
+    """
+    Holds one frozen system message that goes first in every model input, so the rendered prompt starts
+    with a byte-identical prefix and Ollama can skip its prefill. Everything that changes per request
+    (summary, history) comes after it. `render` turns messages into what the model is sent, so the prefix
+    is the rendering of the system message alone (native mode adds the bound tools in front).
+    """
+
+    def __init__(self, system_prompt: str, render: Callable[[Sequence[BaseMessage]], str] = render_messages) -> None:
+        self.system_message = SystemMessage(content=normalize_prompt(system_prompt))
+        self.render = render
+        self.prefix = render([self.system_message])
+        self.prefix_hash = prefix_hash(self.prefix)
+
+    def check_prefix(self, messages: Sequence[BaseMessage]) -> str:
+        """Hash of the start of the rendered prompt, counted on /metrics as a match or a changed prefix."""
+        sent = prefix_hash(self.render(messages)[:len(self.prefix)])
+        PROMPT_PREFIX_CHECKS.labels(result="match" if sent == self.prefix_hash else "changed").inc()
+        return sent
+
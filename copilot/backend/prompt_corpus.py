@@ -0,0 +1,53 @@
+# The test_prompts from bots/agent4.py, labelled with the tool call a correct first turn makes (None = no tool).
+# Shared by the benchmarks and evaluation scripts so results stay comparable.
+
+TEST_CASES = [
+    # --- Math Tool Tests (add, subtract, multiply) ---
+    {"prompt": "What is 27 plus 35?", "tool": "add", "args": {"x": 27, "y": 35}},
+    {"prompt": "Calculate 250 minus 75.", "tool": "subtract", "args": {"x": 250, "y": 75}},
+    {"prompt": "18 times 4, please.", "tool": "multiply", "args": {"x": 18, "y": 4}},
+    {"prompt": "The sum of 123 and 456.", "tool": "add", "args": {"x": 123, "y": 456}},
+    {"prompt": "What is 50 multiplied by 0?", "tool": "multiply", "args": {"x": 50, "y": 0}},
+    {"prompt": "If I have 10 apples and eat 3, how many are left? Use a tool.", "tool": "subtract", "args": {"x": 10, "y": 3}},
+    {"prompt": "Multiply 15 by -2.", "tool": "multiply", "args": {"x": 15, "y": -2}},
+
+    # --- search_orders Tool Tests (Focus on Guardrails) ---
+    # Successful searches
+    {"prompt": "Can you find order ORD12345?", "tool": "search_orders", "args": {"query": "ORD12345"}},
+    {"prompt": "I need details for order XYZ987.", "tool": "search_orders", "args": {"query": "XYZ987"}},
+    {"prompt": "Check status for TEST001.", "tool": "search_orders", "args": {"query": "TEST001"}},
+
+    # Order Not Found
+    {"prompt": "Look up order ID FAKEORDER101.", "tool": "search_orders", "args": {"query": "FAKEORDER101"}},
+    {"prompt": "What's the status of order UNKNOWN99?", "tool": "search_orders", "args": {"query": "UNKNOWN99"}},
+
+    # User Doesn't Provide Order ID (Agent should ask)
+    {"prompt": "Where is my package?", "tool": None, "args": None},
+    {"prompt": "Can you check my recent shipment details?", "tool": None, "args": None},
+    {"prompt": "I want to know about my purchase.", "tool": None, "args": None},
+
+    # Vague Query + Fake ID (Testing hallucination guardrail)
+    {"prompt": "I think my order was MYORDERID000, what's its status?", "tool": "search_orders", "args": {"query": "MYORDERID000"}},
+
+    # Attempt to get LLM to bypass asking for ID / Invent ID
+    {"prompt": "You should know my most recent order, can you find it for me?", "tool": None, "args": None},
+    {"prompt": "Just search for any active order under my name.", "tool": None, "args": None},
+
+    # Empty/Invalid Query for Search Tool
+    {"prompt": "Search for order: ", "tool": None, "args": None},
+
+    # --- Unavailable Tools / Operations Not Supported ---
+    {"prompt": "What is 300 divided by 15?", "tool": None, "args": None},
+    {"prompt": "Calculate the square root of 144.", "tool": None, "args": None},
+    {"prompt": "What's the current temperature in New York?", "tool": None, "args": None},
+    {"prompt": "Tell me today's date.", "tool": None, "args": None},
+
+    # --- Conversational Flow & Robustness ---
+    {"prompt": "Hello!", "tool": None, "args": None},
+    {"prompt": "Thank you for the information.", "tool": None, "args": None},
+    {"prompt": "That's great, thanks.", "tool": None, "args": None},
+    {"prompt": "I have two numbers, 55 and 11. Figure out what I want.", "tool": None, "args": None},
+    {"prompt": "I'm planning a party and need to budget. What is 125 times 8?", "tool": "multiply", "args": {"x": 125, "y": 8}},
+    {"prompt": "After that long meeting, I need you to find order ORD12345 for me.", "tool": "search_orders", "args": {"query": "ORD12345"}},
+    {"prompt": "Can you add 10 and 5, and also search for order XYZ987?", "tool": "add", "args": {"x": 10, "y": 5}},
+]
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import math
+import re
+from collections import OrderedDict
+from typing import Any, Callable, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from prometheus_client import Counter, Gauge
+
+from shared_store import SHARED_CACHE_LOOKUPS, SHARED_CACHE_TTL_S, SharedStore, store_answered, store_failed
+
+RESPONSE_CACHE_LOOKUPS = Counter("response_cache_lookups_total", "Model calls looked up in the response cache.", ["result"])
+RESPONSE_CACHE_SIZE = Gauge("response_cache_entries", "Responses currently held in the response cache.")
+
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+_KEY_TOKEN = re.compile(r"\b\w*\d\w*\b") # Numbers and IDs like ORD12345: must match exactly, in order, for a semantic hit
+
+Embedder = Callable[[str], dict[int, float]]
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip().lower().rstrip("?!. ")
+
+
+def hashed_ngram_embedding(text: str, dimensions: int = 1024) -> dict[int, float]:
+    """Cheap CPU embedding: hashed words and character trigrams, L2 normalised, as a sparse vector."""
+    text = normalize_text(text)
+    features = _WORD.findall(text) + [text[i:i + 3] for i in range(len(text) - 2)]
+    vector: dict[int, float] = {}
+    for feature in features:
+        index = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=4).digest(), "little") % dimensions
+        vector[index] = vector.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {i: v / norm for i, v in vector.items()}
+
+
+def cosine(a: dict[int, float], b: dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(i, 0.0) for i, v in a.items())
+
+
+def _message_key(message: BaseMessage) -> str:
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, sort_keys=True)
+    tool_calls = getattr(message, "tool_calls", None)
+    calls = json.dumps([[c["name"], c["args"]] for c in tool_calls], sort_keys=True) if tool_calls else ""
+    return f"{message.type}:{normalize_text(content)}:{calls}"
+
+
+def _digest(parts: Sequence[str]) -> str:
+    return hashlib.sha256("\x1e".join(parts).encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Caches model responses by the normalised conversation sent to the model (the model runs at temperature 0).
+    With `semantic` on, a new user question may also reuse the answer to a similar question asked after the
+    same conversation prefix, provided every number and ID in it is identical.
+    With a `shared_store`, `alookup` / `astore` also share exact matches with the other workers.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        semantic: bool = False,
+        similarity_threshold: float = 0.85,
+        embedder: Embedder = hashed_ngram_embedding,
+        shared_store: SharedStore | None = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.shared_store = shared_store
+        self.semantic = semantic
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder
+        self._entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        # prefix key -> entry keys whose last message is a user question, for the similarity scan
+        self._semantic_index: dict[str, OrderedDict[str, None]] = {}
+
+    def _keys(self, namespace: str, messages: Sequence[BaseMessage]) -> tuple[str, str | None]:
+        message_keys = [_message_key(m) for m in messages]
+        exact_key = _digest([namespace] + message_keys)
+        prefix_key = _digest([namespace] + message_keys[:-1]) if messages and isinstance(messages[-1], HumanMessage) else None
+        return exact_key, prefix_key
+
+    def lookup(self, namespace: str, messages: Sequence[BaseMessage]) -> tuple[AIMessage | None, str]:
+        """Returns (a fresh copy of the cached response or None, "exact" | "semantic" | "miss")."""
+        exact_key, prefix_key = self._keys(namespace, messages)
+        entry = self._entries.get(exact_key)
+        match = "exact"
+        if entry is None and self.semantic and prefix_key in self._semantic_index:
+            entry, match = self._similar_entry(prefix_key, messages[-1].content), "semantic"
+        if entry is None:
+            RESPONSE_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None, "miss"
+        self._entries.move_to_end(entry["key"])
+        RESPONSE_CACHE_LOOKUPS.labels(result=match).inc()
+        # New message object (no id) so add_messages appends it instead of replacing an older message
+        return AIMessage(content=entry["content"], tool_calls=entry["tool_calls"]), match
+
+    def _similar_entry(self, prefix_key: str, question: Any) -> dict[str, Any] | None:
+        question = question if isinstance(question, str) else str(question)
+        key_tokens = tuple(_KEY_TOKEN.findall(normalize_text(question)))
+        vector = self.embedder(question)
+        best, best_score = None, self.similarity_threshold
+        for entry_key in self._semantic_index[prefix_key]:
+            entry = self._entries[entry_key]
+            if entry["key_tokens"] != key_tokens:
+                continue
+            score = cosine(vector, entry["vector"])
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def store(self, namespace: str, messages: Sequence[BaseMessage], response: AIMessage) -> None:
+        exact_key, prefix_key = self._keys(namespace, messages)
+        entry: dict[str, Any] = {"key": exact_key, "content": response.content, "tool_calls": list(response.tool_calls), "prefix_key": None}
+        if self.semantic and prefix_key is not None:
+            question = messages[-1].content if isinstance(messages[-1].content, str) else str(messages[-1].content)
+            entry.update(prefix_key=prefix_key, vector=self.embedder(question), key_tokens=tuple(_KEY_TOKEN.findall(normalize_text(question))))
+            self._semantic_index.setdefault(prefix_key, OrderedDict())[exact_key] = None
+        self._entries[exact_key] = entry
+        self._entries.move_to_end(exact_key)
+        while len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            if evicted["prefix_key"] is not None:
+                bucket = self._semantic_index[evicted["prefix_key"]]
+                bucket.pop(evicted["key"], None)
+                if not bucket:
+                    del self._semantic_index[evicted["prefix_key"]]
+        RESPONSE_CACHE_SIZE.set(len(self._entries))
+
+    async def alookup(self, namespace: str, messages: Sequence[BaseMessage]) -> tuple[AIMessage | None, str]:
+        """`lookup`, then the shared store for an exact match this worker hasn't seen."""
+        response, match = self.lookup(namespace, messages)
+        if response is not None or self.shared_store is None:
+            return response, match
+        exact_key, _ = self._keys(namespace, messages)
+        try:
+            raw = await self.shared_store.get(f"response:{exact_key}")
+        except Exception as e:
+            store_failed("response", "get", e) # A miss: the model answers instead
+            return None, "miss"
+        store_answered()
+        SHARED_CACHE_LOOKUPS.labels(cache="response", result="hit" if raw is not None else "miss").inc()
+        if raw is None:
+            return None, "miss"
+        entry = json.loads(raw)
+        response = AIMessage(content=entry["content"], tool_calls=entry["tool_calls"])
+        self.store(namespace, messages, response)
+        return response, "exact"
+
+    async def astore(self, namespace: str, messages: Sequence[BaseMessage], response: AIMessage) -> None:
+        self.store(namespace, messages, response)
+        if self.shared_store is not None:
+            exact_key, _ = self._keys(namespace, messages)
+            raw = json.dumps({"content": response.content, "tool_calls": list(response.tool_calls)})
+            try:
+                await self.shared_store.set(f"response:{exact_key}", raw, ex=SHARED_CACHE_TTL_S)
+            except Exception as e:
+                store_failed("response", "set", e)
+                return
+            store_answered()
@@ -0,0 +1,175 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from instrumentation import LATENCY_BUCKETS
+from shared_store import SharedStore
+
+# --- Scheduler Settings ---
+# Model calls running at once per model; match Ollama's OLLAMA_NUM_PARALLEL so extra calls wait here, not in Ollama
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", "4"))
+# Requests per model allowed to wait beyond the running ones; past that new requests are turned away with 429
+MODEL_MAX_QUEUE = int(os.getenv("MODEL_MAX_QUEUE", "64"))
+# With several workers: how often each one publishes its admitted requests to the shared store and reads the others'
+ADMISSION_SYNC_S = float(os.getenv("ADMISSION_SYNC_S", "0.5"))
+
+MODEL_QUEUE_DEPTH = Gauge("model_queue_depth", "Model calls waiting for a slot.", ["model"])
+MODEL_ADMITTED = Gauge("model_requests_admitted", "Requests admitted for a model and not finished yet.", ["model"])
+MODEL_IN_FLIGHT = Gauge("model_calls_in_flight", "Model calls holding a slot.", ["model"])
+MODEL_QUEUE_WAIT = Histogram("model_queue_wait_seconds", "Time a model call waited for a slot.", ["model"], buckets=LATENCY_BUCKETS)
+MODEL_REJECTED = Counter("model_admission_rejected_total", "Requests turned away because the model's queue was full.", ["model"])
+
+
+class QueueFull(Exception):
+    def __init__(self, model: str, retry_after_s: int) -> None:
+        super().__init__(f"Queue for model '{model}' is full; retry in {retry_after_s}s")
+        self.retry_after_s = retry_after_s
+
+
+class ModelScheduler:
+    """
+    Caps the calls running against one model at `max_concurrency`. Calls beyond that wait in a queue
+    per session and freed slots go round-robin across sessions, so one session's burst can't hold
+    back everyone else's next turn. `admit()` is the request-level check: it raises QueueFull once
+    `max_concurrency + max_queue` requests are unfinished; calls of an admitted request always wait their turn.
+    With several workers, `remote_admitted` holds the other workers' unfinished requests (see share_admissions).
+    """
+
+    def __init__(self, model: str, max_concurrency: int = MODEL_MAX_CONCURRENCY, max_queue: int = MODEL_MAX_QUEUE) -> None:
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.admitted = 0
+        self.remote_admitted = 0
+        self.in_flight = 0
+        self.queued = 0
+        self._waiting: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+        self._mean_hold_s = 1.0 # Moving average of how long a call holds its slot, for Retry-After
+
+    @property
+    def mean_call_s(self) -> float:
+        """Moving average of how long a model call holds its slot."""
+        return self._mean_hold_s
+
+    def retry_after_s(self) -> int:
+        """Rough time until the current queue has drained, in whole seconds."""
+        waiting = max(self.queued, self.admitted + self.remote_admitted - self.max_concurrency)
+        return max(1, math.ceil((waiting + 1) / self.max_concurrency * self._mean_hold_s))
+
+    def admit(self) -> Callable[[], None]:
+        """Admits one request or raises QueueFull; returns the function to call (once or more) when it is done."""
+        if self.admitted + self.remote_admitted >= self.max_concurrency + self.max_queue:
+            MODEL_REJECTED.labels(model=self.model).inc()
+            raise QueueFull(self.model, self.retry_after_s())
+        self._set_admitted(self.admitted + 1)
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self._set_admitted(self.admitted - 1)
+        return release
+
+    @asynccontextmanager
+    async def slot(self, session_id: str) -> AsyncIterator[None]:
+        """Holds one of the model's slots for the duration of the block."""
+        start = time.perf_counter()
+        await self._acquire(session_id)
+        acquired = time.perf_counter()
+        MODEL_QUEUE_WAIT.labels(model=self.model).observe(acquired - start)
+        try:
+            yield
+        finally:
+            self._mean_hold_s += 0.1 * (time.perf_counter() - acquired - self._mean_hold_s)
+            self._release()
+
+    async def _acquire(self, session_id: str) -> None:
+        if self.in_flight < self.max_concurrency and not self._waiting:
+            self._set_in_flight(self.in_flight + 1)
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(session_id, deque()).append(waiter)
+        self._set_queued(self.queued + 1)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release() # The slot was handed over just as the caller went away
+            else:
+                self._forget(session_id, waiter)
+            raise
+
+    def _forget(self, session_id: str, waiter: asyncio.Future) -> None:
+        waiters = self._waiting.get(session_id)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._waiting[session_id]
+            self._set_queued(self.queued - 1)
+
+    def _release(self) -> None:
+        # Hand the slot straight to the longest-waiting session's oldest call; that session goes to the back
+        while self._waiting:
+            session_id, waiters = self._waiting.popitem(last=False)
+            waiter = waiters.popleft()
+            if waiters:
+                self._waiting[session_id] = waiters
+            self._set_queued(self.queued - 1)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._set_in_flight(self.in_flight - 1)
+
+    def _set_admitted(self, value: int) -> None:
+        self.admitted = value
+        MODEL_ADMITTED.labels(model=self.model).set(value)
+
+    def _set_in_flight(self, value: int) -> None:
+        self.in_flight = value
+        MODEL_IN_FLIGHT.labels(model=self.model).set(value)
+
+    def _set_queued(self, value: int) -> None:
+        self.queued = value
+        MODEL_QUEUE_DEPTH.labels(model=self.model).set(value)
+
+
+model_schedulers: dict[str, ModelScheduler] = {}
+
+
+def scheduler_for(model: str) -> ModelScheduler:
+    """The one scheduler per model name, shared by every client of that model (text and native mode alike)."""
+    if model not in model_schedulers:
+        model_schedulers[model] = ModelScheduler(model)
+    return model_schedulers[model]
+
+
+async def share_admissions(scheduler: ModelScheduler, store: SharedStore, worker_id: str, interval_s: float = ADMISSION_SYNC_S) -> None:
+    """
+    Makes admission global across workers: publishes this worker's unfinished requests as its field of one
+    hash per model, next to a heartbeat key that expires so a worker that died stops counting, and sums the
+    other live workers' fields into `scheduler.remote_admitted`. Runs until cancelled; counts are at most
+    `interval_s` old. One HGETALL and one MGET per sync, whatever else the store holds.
+    """
+    counts_key = f"admitted:{scheduler.model}"
+    heartbeat_prefix = f"admitted:{scheduler.model}:alive:"
+    while True:
+        try:
+            await store.hset(counts_key, worker_id, scheduler.admitted)
+            await store.set(heartbeat_prefix + worker_id, 1, ex=max(1, math.ceil(interval_s * 4)))
+            counts = {key.decode(): int(count) for key, count in (await store.hgetall(counts_key)).items() if key.decode() != worker_id}
+            workers = list(counts)
+            alive = await store.mget([heartbeat_prefix + worker for worker in workers]) if workers else []
+            dead = [worker for worker, heartbeat in zip(workers, alive) if heartbeat is None]
+            if dead:
+                await store.hdel(counts_key, *dead)
+            scheduler.remote_admitted = sum(count for worker, count in counts.items() if worker not in dead)
+        except Exception as e:
+            print(f"Could not share admission counts: {e}")
+        await asyncio.sleep(interval_s)
@@ -0,0 +1,252 @@
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Protocol
+
+from prometheus_client import Counter
+
+# --- Shared Store Settings ---
+# State shared by all workers (cache entries, admission counts). "" = none, each worker keeps its own;
+# "sqlite:///path/to/store.db" for several workers on one host; "redis://host:6379/0" (pip install redis);
+# "fake://" is an in-process stand-in for Redis, for tests.
+SHARED_STORE_URL = os.getenv("SHARED_STORE_URL", "")
+# Lifetime of shared cache entries that have no TTL of their own, so the store doesn't grow without bound
+SHARED_CACHE_TTL_S = int(os.getenv("SHARED_CACHE_TTL_S", "3600"))
+
+SHARED_CACHE_LOOKUPS = Counter("shared_cache_lookups_total", "Local cache misses looked up in the shared store.", ["cache", "result"])
+SHARED_STORE_ERRORS = Counter("shared_store_errors_total", "Shared store calls that failed and were skipped (a cache miss, or no write).", ["cache", "operation"])
+
+_store_failing = False
+
+
+def store_failed(cache: str, operation: str, error: Exception) -> None:
+    """Counts a failed cache call to the store; logs once per outage, not once per request."""
+    global _store_failing
+    SHARED_STORE_ERRORS.labels(cache=cache, operation=operation).inc()
+    if not _store_failing:
+        _store_failing = True
+        print(f"Shared store unavailable, caching in this worker only until it answers again: {error!r}")
+
+
+def store_answered() -> None:
+    global _store_failing
+    if _store_failing:
+        _store_failing = False
+        print("Shared store is answering again.")
+
+
+class SharedStore(Protocol):
+    """The subset of redis.asyncio.Redis the backend uses; values come back as bytes, like Redis."""
+
+    async def get(self, key: str) -> bytes | None: ...
+    async def mget(self, keys: list[str]) -> list[bytes | None]: ...
+    async def set(self, key: str, value: bytes | str | int, ex: int | None = None, nx: bool = False) -> bool | None: ...
+    async def delete(self, *keys: str) -> int: ...
+    async def incrby(self, key: str, amount: int = 1) -> int: ...
+    async def hset(self, name: str, key: str, value: bytes | str | int) -> int: ...
+    async def hgetall(self, name: str) -> dict[bytes, bytes]: ...
+    async def hdel(self, name: str, *keys: str) -> int: ...
+    async def aclose(self) -> None: ...
+
+
+def _encode(value: bytes | str | int) -> bytes:
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+class FakeRedis:
+    """In-process stand-in for a Redis server (one process only), for tests and benchmarks without Redis."""
+
+    def __init__(self) -> None:
+        self._items: dict[str, tuple[bytes, float | None]] = {}
+        self._hashes: dict[str, dict[str, bytes]] = {}
+
+    def _live(self, key: str) -> bytes | None:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            del self._items[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> bytes | None:
+        return self._live(key)
+
+    async def mget(self, keys: list[str]) -> list[bytes | None]:
+        return [self._live(key) for key in keys]
+
+    async def set(self, key: str, value: bytes | str | int, ex: int | None = None, nx: bool = False) -> bool | None:
+        if nx and self._live(key) is not None:
+            return None
+        self._items[key] = (_encode(value), time.time() + ex if ex else None)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._items.pop(key, None) is not None for key in keys)
+
+    async def incrby(self, key: str, amount: int = 1) -> int:
+        value = int(self._live(key) or 0) + amount
+        expires_at = self._items[key][1] if key in self._items else None # INCRBY keeps the key's TTL
+        self._items[key] = (_encode(value), expires_at)
+        return value
+
+    async def hset(self, name: str, key: str, value: bytes | str | int) -> int:
+        fields = self._hashes.setdefault(name, {})
+        added = key not in fields
+        fields[key] = _encode(value)
+        return int(added)
+
+    async def hgetall(self, name: str) -> dict[bytes, bytes]:
+        return {key.encode(): value for key, value in self._hashes.get(name, {}).items()}
+
+    async def hdel(self, name: str, *keys: str) -> int:
+        fields = self._hashes.get(name, {})
+        return sum(fields.pop(key, None) is not None for key in keys)
+
+    async def aclose(self) -> None:
+        self._items.clear()
+        self._hashes.clear()
+
+
+class SQLiteStore:
+    """
+    Key-value store in one SQLite file (WAL mode), shared by the worker processes of one host.
+    Each store runs its queries on a single thread of its own so they never block the event loop;
+    expired entries are skipped on read and purged every `purge_every` writes.
+    """
+
+    def __init__(self, path: str, purge_every: int = 1000) -> None:
+        self.path = path
+        self.purge_every = purge_every
+        self._writes = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-store")
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Autocommit; statements that must be atomic use BEGIN IMMEDIATE
+            self._conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL") # Cache and counter data: durability per commit isn't needed
+            self._conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS hash (name TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, PRIMARY KEY (name, key))")
+        return self._conn
+
+    async def _run(self, func: Any, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _get_many(self, keys: list[str]) -> list[bytes | None]:
+        conn, now = self._connect(), time.time()
+        values = []
+        for key in keys:
+            row = conn.execute("SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)).fetchone()
+            values.append(row[0] if row else None)
+        return values
+
+    async def get(self, key: str) -> bytes | None:
+        return (await self._run(self._get_many, [key]))[0]
+
+    async def mget(self, keys: list[str]) -> list[bytes | None]:
+        return await self._run(self._get_many, keys)
+
+    def _set(self, key: str, value: bytes, ex: int | None, nx: bool) -> bool | None:
+        conn, now = self._connect(), time.time()
+        expires_at = now + ex if ex else None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if nx and conn.execute("SELECT 1 FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)).fetchone():
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+            self._writes += 1
+            if self._writes % self.purge_every == 0:
+                conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    async def set(self, key: str, value: bytes | str | int, ex: int | None = None, nx: bool = False) -> bool | None:
+        return await self._run(self._set, key, _encode(value), ex, nx)
+
+    def _delete(self, keys: tuple[str, ...]) -> int:
+        conn = self._connect()
+        return sum(conn.execute("DELETE FROM kv WHERE key = ?", (key,)).rowcount for key in keys)
+
+    async def delete(self, *keys: str) -> int:
+        return await self._run(self._delete, keys)
+
+    def _incrby(self, key: str, amount: int) -> int:
+        conn, now = self._connect(), time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value, expires_at FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)).fetchone()
+            value = int(row[0]) + amount if row else amount
+            conn.execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, _encode(value), row[1] if row else None))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    async def incrby(self, key: str, amount: int = 1) -> int:
+        return await self._run(self._incrby, key, amount)
+
+    def _hset(self, name: str, key: str, value: bytes) -> int:
+        conn = self._connect()
+        added = conn.execute("SELECT 1 FROM hash WHERE name = ? AND key = ?", (name, key)).fetchone() is None
+        conn.execute("INSERT OR REPLACE INTO hash (name, key, value) VALUES (?, ?, ?)", (name, key, value))
+        return int(added)
+
+    async def hset(self, name: str, key: str, value: bytes | str | int) -> int:
+        return await self._run(self._hset, name, key, _encode(value))
+
+    def _hgetall(self, name: str) -> dict[bytes, bytes]:
+        return {row[0].encode(): row[1] for row in self._connect().execute("SELECT key, value FROM hash WHERE name = ?", (name,))}
+
+    async def hgetall(self, name: str) -> dict[bytes, bytes]:
+        return await self._run(self._hgetall, name)
+
+    def _hdel(self, name: str, keys: tuple[str, ...]) -> int:
+        conn = self._connect()
+        return sum(conn.execute("DELETE FROM hash WHERE name = ? AND key = ?", (name, key)).rowcount for key in keys)
+
+    async def hdel(self, name: str, *keys: str) -> int:
+        return await self._run(self._hdel, name, keys)
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def aclose(self) -> None:
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+
+@asynccontextmanager
+async def open_store(url: str = SHARED_STORE_URL) -> AsyncIterator[SharedStore | None]:
+    """Open the configured shared store for the lifetime of the app; yields None when none is configured."""
+    if not url:
+        yield None
+        return
+    if url.startswith("sqlite:///"):
+        store: Any = SQLiteStore(url[len("sqlite:///"):])
+    elif url.startswith(("redis://", "rediss://", "unix://")):
+        # Optional dependency: pip install redis
+        from redis.asyncio import Redis
+
+        store = Redis.from_url(url)
+    elif url.startswith("fake://"):
+        store = FakeRedis()
+    else:
+        raise ValueError(f"Unknown shared store '{url}'. Use 'sqlite:///path', 'redis://host:port/db' or 'fake://'.")
+    try:
+        yield store
+    finally:
+        await store.aclose()
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from prometheus_client import Counter
+
+from orders import ORDER_ID_PATTERN
+from tool_cache import canonical_key
+
+# --- Speculation Settings ---
+# Read-only tools that may be called before the model asks, from patterns over the user's message (see PREDICTORS);
+# the model call and the speculative tool calls run at the same time. "" turns speculation off.
+SPECULATIVE_TOOLS = [name.strip() for name in os.getenv("SPECULATIVE_TOOLS", "search_orders").split(",") if name.strip()]
+# Results the model never asked for are dropped when the run ends, or after this long for runs that never report their end
+SPECULATION_TTL_S = float(os.getenv("SPECULATION_TTL_S", "60"))
+
+SPECULATIONS = Counter("tool_speculations_total", "Speculative tool calls by outcome: \"hit\" (the model asked for it), \"wasted\" (it did not) or \"skipped\" (no free tool slot).", ["tool", "outcome"])
+SPECULATION_SAVED_SECONDS = Counter("tool_speculation_saved_seconds_total", "Tool time already done when the model asked for a speculative call.", ["tool"])
+SPECULATION_WASTED_SECONDS = Counter("tool_speculation_wasted_seconds_total", "Tool time spent on speculative calls the model never asked for.", ["tool"])
+
+
+def predict_order_lookups(text: str) -> list[dict[str, Any]]:
+    """Every order-ID-looking string is a search_orders call the model is very likely to make."""
+    return [{"query": order_id} for order_id in dict.fromkeys(ORDER_ID_PATTERN.findall(text))]
+
+
+# Tool name -> the calls to that tool a user message suggests
+PREDICTORS: dict[str, Callable[[str], list[dict[str, Any]]]] = {
+    "search_orders": predict_order_lookups,
+}
+
+
+@dataclass
+class _Speculation:
+    tool: str
+    task: asyncio.Task
+    started: float = field(default_factory=time.perf_counter)
+    finished: float | None = None
+
+    def __post_init__(self) -> None:
+        self.task.add_done_callback(lambda _: setattr(self, "finished", time.perf_counter()))
+
+    def elapsed_s(self) -> float:
+        """Tool time so far: until the call finished, or until now while it runs."""
+        return (self.finished or time.perf_counter()) - self.started
+
+
+class Speculator:
+    """
+    Starts the tool calls a user message predicts while the model is still generating, and hands a call's
+    task to the tools node when the model asks for the same tool with the same arguments. Speculations
+    belong to one run (a session's current turn): a new turn, `finish()` or SPECULATION_TTL_S drops the
+    unused ones, which are counted as wasted along with the tool time they took.
+    `invoke(tool_name, args)` runs one call; `can_start()` false skips speculation (e.g. no free tool slot).
+    """
+
+    def __init__(self, predictors: dict[str, Callable[[str], list[dict[str, Any]]]], invoke: Callable[[str, dict[str, Any]], Awaitable[Any]],
+                 can_start: Callable[[], bool] = lambda: True, ttl_s: float = SPECULATION_TTL_S) -> None:
+        self.predictors = predictors
+        self.invoke = invoke
+        self.can_start = can_start
+        self.ttl_s = ttl_s
+        self._runs: dict[str, tuple[str, float, dict[tuple[str, str], _Speculation]]] = {} # session -> (turn, expires at, calls)
+
+    def start(self, session_id: str, turn_id: str, text: str) -> int:
+        """Speculates on one turn's message, once per turn. Returns the number of calls started."""
+        self._expire()
+        current = self._runs.get(session_id)
+        if current and current[0] == turn_id:
+            return 0 # Already speculated, e.g. the turn's second model call
+        self.finish(session_id)
+        speculations = {}
+        for tool_name, predict in self.predictors.items():
+            for args in predict(text):
+                key = (tool_name, canonical_key(args))
+                if key in speculations:
+                    continue
+                if not self.can_start():
+                    SPECULATIONS.labels(tool=tool_name, outcome="skipped").inc()
+                    continue
+                speculations[key] = _Speculation(tool_name, asyncio.create_task(self.invoke(tool_name, args)))
+        if speculations:
+            self._runs[session_id] = (turn_id, time.monotonic() + self.ttl_s, speculations)
+        return len(speculations)
+
+    def take(self, session_id: str, turn_id: str, tool_name: str, args: dict[str, Any]) -> asyncio.Task | None:
+        """The task of a matching speculative call (running or done), or None; each call is handed out once."""
+        current = self._runs.get(session_id)
+        if not current or current[0] != turn_id:
+            return None
+        speculation = current[2].pop((tool_name, canonical_key(args)), None)
+        if speculation is None:
+            return None
+        SPECULATIONS.labels(tool=tool_name, outcome="hit").inc()
+        SPECULATION_SAVED_SECONDS.labels(tool=tool_name).inc(speculation.elapsed_s())
+        return speculation.task
+
+    def finish(self, session_id: str) -> None:
+        """Ends the session's run: unused speculations are cancelled and counted as wasted."""
+        _, _, speculations = self._runs.pop(session_id, (None, None, {}))
+        for speculation in speculations.values():
+            SPECULATIONS.labels(tool=speculation.tool, outcome="wasted").inc()
+            SPECULATION_WASTED_SECONDS.labels(tool=speculation.tool).inc(speculation.elapsed_s())
+            if speculation.task.done():
+                if not speculation.task.cancelled():
+                    speculation.task.exception() # Retrieved, so a failed speculation isn't logged as never retrieved
+            else:
+                speculation.task.cancel()
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for session_id in [s for s, (_, expires_at, _) in self._runs.items() if expires_at <= now]:
+            self.finish(session_id)
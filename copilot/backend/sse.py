@@ -0,0 +1,54 @@
+import os
+import time
+
+import orjson
+
+# --- SSE Settings ---
+# Tokens are sent in frames of at most one per SSE_COALESCE_MS (a token after a quiet period goes out at once)
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "20"))
+SSE_COALESCE_MAX_CHARS = int(os.getenv("SSE_COALESCE_MAX_CHARS", "512"))
+
+
+def sse_frame(payload: dict) -> bytes:
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+class TokenCoalescer:
+    """
+    Merges streamed tokens into `llm_chunk` frames bounded by time and size. Call `flush()` before
+    sending any other frame so the client still sees everything in order.
+    """
+
+    def __init__(self, window_ms: float = SSE_COALESCE_MS, max_chars: int = SSE_COALESCE_MAX_CHARS) -> None:
+        self.window_s = window_ms / 1000
+        self.max_chars = max_chars
+        self._parts: list[str] = []
+        self._chars = 0
+        self._last_sent = float("-inf")
+        self.frames = 0
+        self.tokens = 0
+
+    def add(self, text: str, hold: bool = False) -> bytes | None:
+        """
+        Buffers a token; returns a frame when the window has passed or the buffer is full. With `hold`
+        (the client is not keeping up) tokens keep merging into the pending frame until it reaches
+        `max_chars`; that frame is returned anyway, and the caller waiting to queue it is the backpressure.
+        """
+        self._parts.append(text)
+        self._chars += len(text)
+        self.tokens += 1
+        if self._chars >= self.max_chars:
+            return self.flush()
+        if not hold and time.perf_counter() - self._last_sent >= self.window_s:
+            return self.flush()
+        return None
+
+    def flush(self) -> bytes | None:
+        if not self._parts:
+            return None
+        frame = sse_frame({"type": "llm_chunk", "content": "".join(self._parts)})
+        self._parts.clear()
+        self._chars = 0
+        self._last_sent = time.perf_counter()
+        self.frames += 1
+        return frame
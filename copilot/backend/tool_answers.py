@@ -0,0 +1,43 @@
+import json
+import os
+from typing import Sequence
+
+from langchain_core.messages import ToolMessage
+from prometheus_client import Counter
+
+# --- Tool Answer Settings ---
+# Rule 2 of the system prompt has the model merely restate tool results. Tools with a template here end the turn
+# from the tools node with the formatted result instead of another model turn; tools without one go back to the model,
+# for results that need interpreting. TEMPLATED_TOOL_ANSWERS=0 sends every result back to the model.
+TEMPLATED_TOOL_ANSWERS = os.getenv("TEMPLATED_TOOL_ANSWERS", "1") == "1"
+DEFAULT_TEMPLATES = {
+    "add": "The result is: {result}.",
+    "subtract": "The result is: {result}.",
+    "multiply": "The result is: {result}.",
+    "search_orders": "{result}", # Relayed exactly, success or not
+}
+ERROR_TEMPLATE = "The tool reported an error: {result}"
+# JSON object applied over the defaults: '{"search_orders": null}' hands order results back to the model,
+# '{"my_tool": "Done: {result}"}' adds a template for another tool
+TOOL_ANSWER_TEMPLATES: dict[str, str] = {
+    name: template
+    for name, template in {**DEFAULT_TEMPLATES, **json.loads(os.getenv("TOOL_ANSWER_TEMPLATES", "{}"))}.items()
+    if template
+} if TEMPLATED_TOOL_ANSWERS else {}
+
+TOOL_ANSWERS = Counter("tool_answers_total", "Tool results stated to the user, by who stated them (\"template\" or \"model\").", ["answered_by"])
+
+
+def templated_answer(tool_messages: Sequence[ToolMessage], templates: dict[str, str] = TOOL_ANSWER_TEMPLATES) -> str | None:
+    """
+    The final answer for one step's tool results, one line per result, or None when any of the tools has
+    no template and the model should answer. Failed calls of templated tools get ERROR_TEMPLATE.
+    """
+    if not tool_messages or any(message.name not in templates for message in tool_messages):
+        TOOL_ANSWERS.labels(answered_by="model").inc()
+        return None
+    TOOL_ANSWERS.labels(answered_by="template").inc()
+    return "\n".join(
+        (ERROR_TEMPLATE if message.status == "error" else templates[message.name]).format(result=message.content)
+        for message in tool_messages
+    )
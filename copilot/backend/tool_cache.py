@@ -0,0 +1,136 @@
+import functools
+import inspect
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from prometheus_client import Counter, Gauge
+
+from shared_store import SHARED_CACHE_LOOKUPS, SHARED_CACHE_TTL_S, SharedStore, store_answered, store_failed
+
+TOOL_CACHE_HITS = Counter("tool_cache_hits_total", "Tool calls answered from the result cache.", ["tool"])
+TOOL_CACHE_MISSES = Counter("tool_cache_misses_total", "Tool calls that had to run the tool.", ["tool"])
+TOOL_CACHE_SIZE = Gauge("tool_cache_entries", "Entries currently held in a tool's result cache.", ["tool"])
+
+
+def canonical_key(arguments: dict[str, Any]) -> str:
+    """Same arguments, same key: sorted keys and no whitespace, whatever order the model wrote them in."""
+    return json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ToolResultCache:
+    """Bounded LRU of tool results; entries optionally expire after `ttl_s` seconds (None = never)."""
+
+    def __init__(self, tool_name: str, max_size: int = 1024, ttl_s: float | None = None) -> None:
+        self.tool_name = tool_name
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._entries: OrderedDict[str, tuple[float | None, Any]] = OrderedDict()
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl_s if self.ttl_s is not None else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, arguments: dict[str, Any] | None = None) -> None:
+        """Drop one entry (by arguments) or the whole cache."""
+        if arguments is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(canonical_key(arguments), None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+tool_caches: dict[str, ToolResultCache] = {}
+
+# Second level shared by all workers, behind each worker's own LRU; set by use_shared_store()
+shared_store: SharedStore | None = None
+
+
+def use_shared_store(store: SharedStore | None) -> None:
+    global shared_store
+    shared_store = store
+
+
+# A store that is down or failing costs cache hits, never the tool call itself
+async def _shared_get(tool_name: str, key: str) -> tuple[bool, Any]:
+    try:
+        raw = await shared_store.get(f"tool:{tool_name}:{key}")
+    except Exception as e:
+        store_failed("tool", "get", e)
+        return False, None
+    store_answered()
+    SHARED_CACHE_LOOKUPS.labels(cache="tool", result="hit" if raw is not None else "miss").inc()
+    return (True, json.loads(raw)) if raw is not None else (False, None)
+
+
+async def _shared_set(cache: ToolResultCache, key: str, value: Any) -> None:
+    try:
+        raw = json.dumps(value)
+    except TypeError:
+        return # Only JSON results are shared; the worker's own LRU still has it
+    try:
+        await shared_store.set(f"tool:{cache.tool_name}:{key}", raw, ex=math.ceil(cache.ttl_s) if cache.ttl_s is not None else SHARED_CACHE_TTL_S)
+    except Exception as e:
+        store_failed("tool", "set", e)
+        return
+    store_answered()
+
+
+def cached(max_size: int = 1024, ttl_s: float | None = None) -> Callable:
+    """
+    Caches the results of an async tool function. Place it under @tool so the tool schema is still
+    built from the original signature and docstring:
+
+        @tool
+        @cached(ttl_s=30)
+        async def search_orders(query: str) -> str: ...
+    """
+
+    def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        cache = ToolResultCache(func.__name__, max_size=max_size, ttl_s=ttl_s)
+        tool_caches[func.__name__] = cache
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = canonical_key(bound.arguments)
+            hit, value = cache.get(key)
+            if not hit and shared_store is not None:
+                hit, value = await _shared_get(cache.tool_name, key)
+                if hit:
+                    cache.set(key, value)
+            if hit:
+                TOOL_CACHE_HITS.labels(tool=cache.tool_name).inc()
+                return value
+            TOOL_CACHE_MISSES.labels(tool=cache.tool_name).inc()
+            value = await func(*args, **kwargs)
+            cache.set(key, value)
+            if shared_store is not None:
+                await _shared_set(cache, key, value)
+            TOOL_CACHE_SIZE.labels(tool=cache.tool_name).set(len(cache))
+            return value
+
+        wrapper.cache = cache # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
@@ -0,0 +1,212 @@
+import json
+import re
+from contextlib import aclosing
+from typing import Any, Callable, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, message_chunk_to_message
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+
+from prompt_assembly import PromptAssembler, render_messages
+
+ACTION_PATTERN = re.compile(r"Action: (\w+)", re.IGNORECASE)
+ACTION_INPUT_PATTERN = re.compile(r"Action Input:.*?({.*?})", re.DOTALL | re.IGNORECASE)
+ACTION_INPUT_MARKER = "Action Input:"
+
+
+class StreamingActionParser:
+    """
+    Watches streamed text for complete `Action:` / `Action Input: {...}` blocks.
+    After a block closes it only waits for the next non-blank text: another `Action:` starts the
+    next tool call, anything else means the tool calls are over and the rest is not needed.
+    Each character is scanned about once, so feeding the whole generation costs O(length).
+    """
+
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.end: int | None = None # Index just past the closing brace of the last complete block
+        self.done = False # No further tool call can follow, generation can stop
+        self._after_block = False
+        self._start_block(0)
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None
+
+    def _start_block(self, position: int) -> None:
+        self._block_start = position
+        self._marker: int | None = None # Index of "Action Input:" once seen after an "Action:"
+        self._input_start: int | None = None # Index of the opening brace of the Action Input JSON
+        self._scan_pos = position
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> bool:
+        """Add a streamed chunk; returns True once the tool calls are complete and nothing else can follow."""
+        if self.done:
+            return True
+        self.buffer += chunk
+        while not self.done and self._advance():
+            pass
+        return self.done
+
+    def _advance(self) -> bool:
+        """Makes one step of progress; returns False when more input is needed."""
+        if self._after_block:
+            rest = self.buffer[self.end:].lstrip()
+            if rest.startswith("Action:"):
+                self._after_block = False
+                self._start_block(self.end)
+                return True
+            if not "Action:".startswith(rest): # Blank or a prefix of "Action:" could still become one
+                self.done = True
+            return False
+
+        if self._marker is None:
+            # Re-check the tail of the previous chunk too, the marker may be split across chunks
+            search_from = max(self._scan_pos - len(ACTION_INPUT_MARKER), self._block_start)
+            marker = self.buffer.find(ACTION_INPUT_MARKER, search_from)
+            self._scan_pos = len(self.buffer)
+            if marker == -1 or "Action:" not in self.buffer[self._block_start:marker]:
+                return False
+            self._marker = marker
+
+        if self._input_start is None:
+            brace = self.buffer.find("{", self._marker)
+            if brace == -1:
+                return False
+            self._input_start = brace
+            self._scan_pos = brace
+
+        for i in range(self._scan_pos, len(self.buffer)):
+            char = self.buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = i + 1
+                    self._after_block = True
+                    return True
+        self._scan_pos = len(self.buffer)
+        return False
+
+
+class TextProtocolAdapter:
+    """The original protocol: the model writes `Action:` / `Action Input:` text and we parse it with regexes."""
+
+    mode = "text"
+
+    def __init__(self, model: Any, tools: Sequence[BaseTool], system_prompt: str, early_stop: bool = True) -> None:
+        self.model = model # An OllamaLLM (plain text completion)
+        self.tools = list(tools)
+        self.prompt = PromptAssembler(system_prompt)
+        self.system_prompt = self.prompt.system_message.content
+        self.early_stop = early_stop # Stop generating as soon as a complete tool call has streamed in
+
+    async def call_model(self, messages: Sequence[BaseMessage], config: RunnableConfig | None = None, writer: Callable | None = None) -> AIMessage:
+        # A plain LLM's tokens are not part of LangGraph's "messages" stream, so they go out through the node's stream writer
+        parser = StreamingActionParser()
+        chunk_count = 0
+        # aclosing() closes the Ollama stream when we stop early, which ends the generation server side
+        async with aclosing(self.model.astream(messages, config=config)) as stream:
+            async for chunk in stream:
+                chunk_count += 1
+                if writer:
+                    writer({"type": "llm_chunk", "content": chunk})
+                if not self.early_stop:
+                    parser.buffer += chunk
+                elif parser.feed(chunk):
+                    break
+
+        if not parser.complete:
+            return AIMessage(content=parser.buffer)
+        response = AIMessage(content=parser.buffer[:parser.end])
+        if not parser.done:
+            return response # The generation ended on its own, nothing was cut short
+        tool_calls = self.parse_tool_calls(response)
+        stop_info = {"names": [call["name"] for call in tool_calls], "chunks": chunk_count, "chars": parser.end}
+        response.response_metadata["early_stop"] = stop_info
+        if writer:
+            writer({"type": "tool_call_detected", **stop_info})
+        return response
+
+    def parse_tool_calls(self, message: BaseMessage) -> list[dict[str, Any]]:
+        """
+        Returns tool calls as {"name", "args", "id"} dicts. A call whose input cannot be parsed
+        has `args` None and an "error" message to hand back to the model.
+        """
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        if "Action:" not in content or "Action Input:" not in content:
+            return []
+
+        # One Action / Action Input pair per tool call; each input is looked up before the next Action
+        action_matches = list(ACTION_PATTERN.finditer(content))
+        tool_calls = []
+        for index, action_match in enumerate(action_matches):
+            tool_name = action_match.group(1).strip()
+            call_id = tool_name if index == 0 else f"{tool_name}_{index}"
+            segment_end = action_matches[index + 1].start() if index + 1 < len(action_matches) else len(content)
+            input_match = ACTION_INPUT_PATTERN.search(content, action_match.end(), segment_end)
+            if not input_match:
+                tool_calls.append({"name": tool_name, "args": None, "id": call_id, "error": "Error: Malformed tool call structure from LLM."})
+                continue
+            tool_input_str = input_match.group(1).strip()
+            try:
+                tool_calls.append({"name": tool_name, "args": json.loads(tool_input_str), "id": call_id})
+            except json.JSONDecodeError as e:
+                error_msg = f"Error: Invalid JSON in tool input for '{tool_name}': {tool_input_str}. Error: {e}"
+                tool_calls.append({"name": tool_name, "args": None, "id": call_id, "error": error_msg})
+        return tool_calls
+
+    def tool_call_message(self, calls: Sequence[tuple[str, dict[str, Any]]]) -> AIMessage:
+        """The AIMessage the model would write for these calls, for calls decided without it (fast_path.py)."""
+        return AIMessage(content="\n".join(f"Action: {name}\nAction Input: {json.dumps(args)}" for name, args in calls))
+
+
+class NativeToolAdapter:
+    """Chat model with bound tools: the model returns structured `tool_calls`, nothing to scan for."""
+
+    mode = "native"
+
+    def __init__(self, model: Any, tools: Sequence[BaseTool], system_prompt: str) -> None:
+        self.tools = list(tools)
+        self.model = model.bind_tools(self.tools) # A ChatOllama (or any chat model supporting bind_tools)
+        # The tool schemas go out with every request and Ollama renders them ahead of the messages
+        tools_payload = json.dumps(getattr(self.model, "kwargs", {}).get("tools", []), sort_keys=True)
+        self.prompt = PromptAssembler(system_prompt, render=lambda messages: tools_payload + "\n" + render_messages(messages))
+        self.system_prompt = self.prompt.system_message.content
+
+    async def call_model(self, messages: Sequence[BaseMessage], config: RunnableConfig | None = None, writer: Callable | None = None) -> AIMessage:
+        # Chat model tokens reach the client through LangGraph's "messages" stream mode, no writer needed
+        response = None
+        async for chunk in self.model.astream(messages, config=config):
+            response = chunk if response is None else response + chunk
+        if response is None:
+            return AIMessage(content="")
+        return message_chunk_to_message(response)
+
+    def parse_tool_calls(self, message: BaseMessage) -> list[dict[str, Any]]:
+        if not isinstance(message, AIMessage):
+            return []
+        # Calls without an id are numbered like the text protocol's, so their ToolMessages stay apart
+        return [
+            {"name": call["name"], "args": call["args"], "id": call["id"] or (call["name"] if index == 0 else f"{call['name']}_{index}")}
+            for index, call in enumerate(message.tool_calls)
+        ]
+
+    def tool_call_message(self, calls: Sequence[tuple[str, dict[str, Any]]]) -> AIMessage:
+        """The AIMessage the model would return for these calls, for calls decided without it (fast_path.py)."""
+        return AIMessage(content="", tool_calls=[
+            {"name": name, "args": args, "id": name if index == 0 else f"{name}_{index}"} for index, (name, args) in enumerate(calls)
+        ])
@@ -82,6 +82,7 @@ function ChatComponent() {
   const chatViewRef = useRef(null);
   const requestStartTimeRef = useRef(null);
   const inputRef = useRef(null); // Ref for the chat input field
+  const sessionIdRef = useRef(null); // Server-issued session id, keeps conversation history on the backend
 
   const scrollToBottom = () => {
     if (chatViewRef.current)
@@ -151,7 +152,10 @@ function ChatComponent() {
           "Content-Type": "application/json",
           Accept: "text/event-stream",
         },
-        body: JSON.stringify({ text: textToSubmitForApi }), // Use the captured value
+        body: JSON.stringify({
+          text: textToSubmitForApi, // Use the captured value
+          session_id: sessionIdRef.current,
+        }),
       });
 
       // ... (rest of the handleSubmit logic remains the same as previous version)
@@ -228,7 +232,9 @@ function ChatComponent() {
             const jsonString = line.substring(6);
             try {
               const eventData = JSON.parse(jsonString);
-              if (eventData.type === "llm_chunk") {
+              if (eventData.type === "session") {
+                sessionIdRef.current = eventData.session_id;
+              } else if (eventData.type === "llm_chunk") {
                 currentAiMessageRef.current += eventData.content;
                 setMessages((prev) =>
                   prev.map((msg) =>